@@ -0,0 +1,265 @@
+"""
+Shared gateway for every Groq chat completion the app makes.
+
+Wraps `client.chat.completions.create` with:
+  - a per-call deadline covering all attempts,
+  - jittered exponential-backoff retries on timeouts, 429s and 5xx,
+  - a circuit breaker that fails fast (callers then use their fallbacks),
+  - a bounded semaphore limiting concurrent Groq calls per process,
+  - optional hedging: a second request fired if the first is slow,
+and records latency/outcome counters per calling function (also passed to
+listeners registered with add_listener, e.g. the /metrics histograms).
+"""
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+class AIUnavailable(Exception):
+    """Raised instead of calling Groq when the breaker is open, the pool is saturated or the deadline passed."""
+
+
+def _retryable(error):
+    status = getattr(error, 'status_code', None)
+    return status is None or status == 429 or status >= 500
+
+
+class CircuitBreaker:
+    def __init__(self, threshold=5, cooldown=30.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return 'closed'
+            return 'half-open' if time.monotonic() - self.opened_at >= self.cooldown else 'open'
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            # After the cooldown, let exactly one trial call through.
+            if time.monotonic() - self.opened_at >= self.cooldown and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_in_flight or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+    def release_trial(self):
+        """Gives back a half-open trial that never reached Groq, so the next call can take it."""
+        with self._lock:
+            self._trial_in_flight = False
+
+
+class AIGateway:
+    def __init__(self, client, timeout=15.0, retries=2, backoff_base=0.25, backoff_cap=4.0,
+                 max_concurrency=8, breaker_threshold=5, breaker_cooldown=30.0, hedge_after=0.0):
+        self.client = client
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.hedge_after = hedge_after
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_cooldown)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._hedge_pool = ThreadPoolExecutor(max_workers=max_concurrency * 2, thread_name_prefix='ai-hedge')
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+        self._listeners = []
+
+    # --- metrics ------------------------------------------------------------
+
+    def add_listener(self, listener):
+        """Calls listener(function, outcome, seconds) for every finished or rejected call."""
+        self._listeners.append(listener)
+
+    def _record(self, function, outcome, seconds=None, **counters):
+        with self._stats_lock:
+            stats = self._stats.setdefault(function, {
+                'calls': 0, 'ok': 0, 'failed': 0, 'rejected': 0, 'cancelled': 0, 'retries': 0, 'hedged': 0,
+                'latency_total': 0.0, 'latency_max': 0.0, 'streams': 0, 'first_token_total': 0.0,
+            })
+            if outcome:
+                stats['calls'] += 1
+                stats[outcome] += 1
+            for name, value in counters.items():
+                stats[name] += value
+            if seconds is not None:
+                stats['latency_total'] += seconds
+                stats['latency_max'] = max(stats['latency_max'], seconds)
+        if outcome:
+            for listener in self._listeners:
+                listener(function, outcome, seconds)
+
+    def info(self):
+        with self._stats_lock:
+            return {function: dict(stats) for function, stats in self._stats.items()}
+
+    # --- calls --------------------------------------------------------------
+
+    def _attempt(self, timeout, kwargs):
+        return self.client.chat.completions.create(timeout=timeout, **kwargs)
+
+    def _hedged(self, function, timeout, kwargs):
+        """
+        Takes over the caller's slot: it is released when `first` finishes,
+        which may be after a winning hedge has already returned.
+        """
+        started = time.monotonic()
+        first = self._hedge_pool.submit(self._attempt, timeout, kwargs)
+        first.add_done_callback(lambda _: self._slots.release())
+        done, _ = wait([first], timeout=self.hedge_after)
+        if done or not self._slots.acquire(blocking=False):
+            return first.result()
+
+        self._record(function, None, hedged=1)
+        second = self._hedge_pool.submit(self._attempt, max(0.1, timeout - (time.monotonic() - started)), kwargs)
+        second.add_done_callback(lambda _: self._slots.release())
+        pending, error = {first, second}, None
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, started + timeout - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                raise AIUnavailable(f"{function}: deadline exceeded")
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def _admit(self, function, deadline_at):
+        if not self.breaker.allow():
+            self._record(function, 'rejected')
+            raise AIUnavailable(f"{function}: circuit open")
+        if not self._slots.acquire(timeout=max(0.0, deadline_at - time.monotonic())):
+            self.breaker.release_trial()
+            self._record(function, 'rejected')
+            raise AIUnavailable(f"{function}: too many concurrent AI calls")
+
+    def _backoff(self, function, attempt, deadline_at):
+        """Sleeps before retry number `attempt`; returns False if the deadline would pass first."""
+        self._record(function, None, retries=1)
+        backoff = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+        if time.monotonic() + backoff >= deadline_at:
+            return False
+        time.sleep(backoff)
+        return True
+
+    def _record_failure(self, function, error, started):
+        if _retryable(error):
+            self.breaker.record_failure()
+        else:
+            # A 4xx means Groq answered; it says nothing about its health.
+            self.breaker.record_success()
+        self._record(function, 'failed', time.monotonic() - started)
+
+    def complete(self, function, deadline=None, hedge=False, **kwargs):
+        """
+        Runs one chat completion for `function` (used only for metrics) within
+        `deadline` seconds in total. Raises on failure; callers keep their fallbacks.
+        """
+        started = time.monotonic()
+        deadline_at = started + (deadline or self.timeout)
+
+        self._admit(function, deadline_at)
+
+        attempt, holding_slot = 0, True
+        try:
+            while True:
+                remaining = deadline_at - time.monotonic()
+                if remaining <= 0:
+                    raise AIUnavailable(f"{function}: deadline exceeded")
+                try:
+                    if hedge and self.hedge_after > 0:
+                        # A retry needs the slot back from the previous attempt's `first`.
+                        if not holding_slot and not self._slots.acquire(timeout=remaining):
+                            raise AIUnavailable(f"{function}: too many concurrent AI calls")
+                        holding_slot = False
+                        response = self._hedged(function, remaining, kwargs)
+                    else:
+                        response = self._attempt(remaining, kwargs)
+                    break
+                except Exception as e:
+                    if attempt >= self.retries or not _retryable(e):
+                        raise
+                    attempt += 1
+                    if not self._backoff(function, attempt, deadline_at):
+                        raise
+        except Exception as e:
+            self._record_failure(function, e, started)
+            raise
+        finally:
+            if holding_slot:
+                self._slots.release()
+
+        self.breaker.record_success()
+        self._record(function, 'ok', time.monotonic() - started)
+        return response
+
+    def stream(self, function, deadline=None, **kwargs):
+        """
+        Streaming variant of `complete`: yields content deltas as Groq sends
+        them. Retries only happen before the first token; after that an error
+        propagates to the consumer.
+        """
+        started = time.monotonic()
+        deadline_at = started + (deadline or self.timeout)
+        self._admit(function, deadline_at)
+
+        attempt, first_token_at = 0, None
+        try:
+            while True:
+                remaining = deadline_at - time.monotonic()
+                if remaining <= 0:
+                    raise AIUnavailable(f"{function}: deadline exceeded")
+                try:
+                    for chunk in self.client.chat.completions.create(stream=True, timeout=remaining, **kwargs):
+                        delta = chunk.choices[0].delta.content if chunk.choices else None
+                        if delta:
+                            if first_token_at is None:
+                                first_token_at = time.monotonic()
+                                self._record(function, None, streams=1, first_token_total=first_token_at - started)
+                            yield delta
+                    break
+                except Exception as e:
+                    if first_token_at is not None or attempt >= self.retries or not _retryable(e):
+                        raise
+                    attempt += 1
+                    if not self._backoff(function, attempt, deadline_at):
+                        raise
+        except Exception as e:
+            self._record_failure(function, e, started)
+            raise
+        except GeneratorExit:
+            # Closed by the consumer (e.g. the browser left mid-SSE). That can only
+            # happen at a yield, i.e. after Groq sent tokens, so it was healthy.
+            self.breaker.record_success()
+            self._record(function, 'cancelled', time.monotonic() - started)
+            raise
+        except BaseException:
+            # Worker shutdown and the like say nothing about Groq; just free the trial.
+            self.breaker.release_trial()
+            raise
+        finally:
+            self._slots.release()
+
+        self.breaker.record_success()
+        self._record(function, 'ok', time.monotonic() - started)
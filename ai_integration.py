@@ -1,32 +1,33 @@
 import os
 from groq import Groq
+from ai_gateway import AIGateway
+import analytics
 from datetime import datetime, timedelta
 from config import Config
 from database import db
+import queries
 import json
 import markdown2
 
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+# Retries are owned by the gateway, so the SDK's own retry loop is disabled.
+client = Groq(api_key=os.getenv("GROQ_API_KEY"), max_retries=0)
+gateway = AIGateway(
+    client,
+    timeout=Config.AI_TIMEOUT,
+    retries=Config.AI_RETRIES,
+    max_concurrency=Config.AI_MAX_CONCURRENCY,
+    breaker_threshold=Config.AI_BREAKER_THRESHOLD,
+    breaker_cooldown=Config.AI_BREAKER_COOLDOWN,
+    hedge_after=Config.AI_HEDGE_AFTER,
+)
 
 def get_recent_meals(user_id):
     """Helper function to get meals from the database."""
-    return db.execute_query(
-        """SELECT name, calories FROM meal_logs 
-           WHERE user_id = %s AND date >= %s 
-           ORDER BY date DESC LIMIT 10""",
-        (user_id, datetime.utcnow() - timedelta(days=3)),
-        fetch_all=True
-    ) or []
+    return queries.recent_meal_names(user_id, days=3)
 
 def get_recent_workouts(user_id):
     """Helper function to get workouts from the database."""
-    return db.execute_query(
-        """SELECT type, duration FROM workout_logs 
-           WHERE user_id = %s AND date >= %s 
-           ORDER BY date DESC LIMIT 10""",
-        (user_id, datetime.utcnow() - timedelta(days=7)),
-        fetch_all=True
-    ) or []
+    return queries.recent_workout_types(user_id, days=7)
 
 def get_ai_diet_suggestion(user, prompt=""):
     try:
@@ -52,7 +53,8 @@ def get_ai_diet_suggestion(user, prompt=""):
         Breakfast:Oatmeal with Berries:350;Lunch:Grilled Chicken Salad:450;Dinner:Salmon with Quinoa:550
         """
         
-        response = client.chat.completions.create(
+        response = gateway.complete(
+            'diet', deadline=20,
             model="llama3-8b-8192",
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -65,7 +67,7 @@ def get_ai_diet_suggestion(user, prompt=""):
 
     except Exception as e:
         print(f"AI Diet Suggestion Error: {str(e)}")
-        return ""
+        raise
 
 def get_ai_workout_plan(user, prompt=""):
     try:
@@ -88,7 +90,8 @@ def get_ai_workout_plan(user, prompt=""):
         **EXAMPLE RESPONSE:**
         Cardio:Treadmill Run:300;Strength:Push-ups:100;Flexibility:Stretching:50
         """
-        response = client.chat.completions.create(
+        response = gateway.complete(
+            'workout', deadline=20,
             model="llama3-8b-8192",
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -100,12 +103,13 @@ def get_ai_workout_plan(user, prompt=""):
         return response.choices[0].message.content.strip()
     except Exception as e:
         print(f"AI Workout Plan Error: {str(e)}")
-        return ""
+        raise
 
 def get_nutrition_info(food_name: str) -> dict:
     system_prompt = """Your only task is to analyze a food description and respond with a valid JSON object containing "calories", "protein", "carbs", and "fat". The values must be numbers. Example: {"calories": 260, "protein": 13.5, "carbs": 28.0, "fat": 11.2}"""
     try:
-        response = client.chat.completions.create(
+        response = gateway.complete(
+            'nutrition', deadline=8, hedge=True,
             model="llama3-8b-8192",
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -129,7 +133,8 @@ def get_workout_calories(workout_description: str) -> dict:
     Example for "weight lifting 1 hour": {"calories_burned": 250}
     """
     try:
-        response = client.chat.completions.create(
+        response = gateway.complete(
+            'workout_calories', deadline=8, hedge=True,
             model="llama3-8b-8192",
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -144,49 +149,42 @@ def get_workout_calories(workout_description: str) -> dict:
         print(f"Error getting workout calories from AI: {str(e)}")
         return {}
 
-def get_weekly_summary(user):
+def _fmt(value, unit=""):
+    return "N/A" if value is None else f"{value}{unit}"
+
+def get_weekly_summary(user, days=7):
+    """AI feedback on the last `days` days (7 for weekly, 30 for monthly), built from analytics stats."""
     try:
-        end_date = datetime.utcnow()
-        start_date = end_date - timedelta(days=7)
-        
-        meals = db.execute_query(
-            """SELECT * FROM meal_logs WHERE user_id = %s AND date >= %s AND date <= %s""",
-            (user.id, start_date, end_date), fetch_all=True
-        ) or []
-        workouts = db.execute_query(
-            """SELECT * FROM workout_logs WHERE user_id = %s AND date >= %s AND date <= %s""",
-            (user.id, start_date, end_date), fetch_all=True
-        ) or []
-        weights = db.execute_query(
-            """SELECT * FROM weight_logs WHERE user_id = %s AND date >= %s AND date <= %s ORDER BY date""",
-            (user.id, start_date, end_date), fetch_all=True
-        ) or []
-        
-        total_calories = sum(float(meal.get('calories', 0)) for meal in meals)
-        avg_daily_calories = total_calories / 7 if meals else 0
-        calorie_goal_met = (avg_daily_calories / float(user.daily_calories) * 100) if user.daily_calories else 0
-        total_workout_minutes = sum(float(workout.get('duration', 0)) for workout in workouts)
-        total_calories_burned = sum(float(workout.get('calories_burned', 0)) for workout in workouts)
-        weight_change = float(weights[-1].get('weight', 0)) - float(weights[0].get('weight', 0)) if len(weights) >= 2 else 0
-        
+        end_day = queries.ist_today()
+        stats = analytics.summarize(user.id, end_day - timedelta(days=days - 1), end_day, user.daily_calories)
+        adherence = stats['adherence'] or {}
+        weekdays = ", ".join(f"{day} {_fmt(kcal)}" for day, kcal in stats['weekday_intake'].items())
+        workout_days = ", ".join(f"{day} {_fmt(rate, '%')}" for day, rate in stats['weekday_workout_rate'].items())
+
         context = f"""
-        Weekly Fitness Summary for {user.name}:
+        {days}-Day Fitness Summary for {user.name} ({stats['logged_days']} of {stats['days']} days logged):
         Nutrition:
-        - Total Calories Consumed: {total_calories}
-        - Average Daily Calories: {avg_daily_calories:.0f}
-        - Daily Calorie Goal: {user.daily_calories}
-        - Goal Met: {calorie_goal_met:.1f}%
+        - Average Daily Calories (logged days): {_fmt(stats['calories_in_avg'])}
+        - 7-Day Rolling Average: {_fmt(stats['calories_in_7day_avg_start'])} at the start, {_fmt(stats['calories_in_7day_avg_end'])} now
+        - Daily Calorie Goal: {_fmt(user.daily_calories)}
+        - Days On Goal (within 10%): {_fmt(adherence.get('on_goal_pct'), '%')}; over: {adherence.get('over_days', 0)}, under: {adherence.get('under_days', 0)}
+        - Average Intake vs Goal: {_fmt(adherence.get('mean_pct_of_goal'), '%')}
+        - Average Protein: {_fmt(stats['protein_avg'], ' g')}
+        - Average Intake by Weekday: {weekdays}
         Exercise:
-        - Total Workout Time: {total_workout_minutes} minutes
-        - Total Calories Burned: {total_calories_burned}
+        - Workouts: {stats['workouts']} on {stats['workout_days']} days, {_fmt(stats['workout_minutes'])} minutes
+        - Total Calories Burned: {_fmt(stats['calories_burned_total'])}
+        - Share of Days With a Workout by Weekday: {workout_days}
         Weight:
-        - Starting Weight: {weights[0].get('weight', 'N/A') if weights else 'N/A'} kg
-        - Ending Weight: {weights[-1].get('weight', 'N/A') if weights else 'N/A'} kg
-        - Change: {weight_change:.1f} kg
+        - Weigh-ins: {stats['weigh_ins']}; first {_fmt(stats['weight_first'], ' kg')}, last {_fmt(stats['weight_last'], ' kg')}
+        - Trend: {_fmt(stats['weight_trend_kg_per_week'], ' kg/week')} (fit R² {_fmt(stats['weight_trend_r2'])})
+        - Maintenance Calories Implied by Intake and Trend: {_fmt(stats['implied_maintenance'])}
+        - Correlation of Weekly Net Intake With Weight Change: {_fmt(stats['net_vs_weight_correlation'])}
         """
-        system_prompt = """You are a fitness coach AI assistant. Analyze the user's weekly summary and provide encouraging feedback and actionable tips for the next week. Keep it concise and positive."""
+        system_prompt = """You are a fitness coach AI assistant. Analyze the user's summary statistics and provide encouraging feedback and actionable tips for the coming week. If the implied maintenance or the intake/weight correlation suggest meals are going unlogged, mention it gently. Keep it concise and positive."""
         
-        response = client.chat.completions.create(
+        response = gateway.complete(
+            'weekly_summary', deadline=30,
             model="llama3-70b-8192",
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -202,19 +200,22 @@ def get_weekly_summary(user):
     
 import markdown2 # Add this import at the top of the file
 
+# FIX: The system prompt now asks for Markdown formatting
+CHAT_SYSTEM_PROMPT = """You are a friendly and knowledgeable fitness assistant named FitBot. Your goal is to help users with their diet, workout, and general health questions.
+    **IMPORTANT**: Format your answers using Markdown. Use lists, bold text, and paragraphs to make the response easy to read.
+    """
+
+CHAT_FALLBACK_REPLY = "Sorry, I'm having trouble connecting right now. Please try again in a moment."
+
 def get_ai_chat_response(message_history: list) -> str:
     """
     Gets a conversational response from the AI and formats it as HTML.
     """
-    # FIX: The system prompt now asks for Markdown formatting
-    system_prompt = """You are a friendly and knowledgeable fitness assistant named FitBot. Your goal is to help users with their diet, workout, and general health questions.
-    **IMPORTANT**: Format your answers using Markdown. Use lists, bold text, and paragraphs to make the response easy to read.
-    """
-    
-    messages_to_send = [{"role": "system", "content": system_prompt}] + message_history
+    messages_to_send = [{"role": "system", "content": CHAT_SYSTEM_PROMPT}] + message_history
     
     try:
-        response = client.chat.completions.create(
+        response = gateway.complete(
+            'chat', deadline=15, hedge=True,
             model="llama3-8b-8192",
             messages=messages_to_send,
             temperature=0.7,
@@ -230,13 +231,61 @@ def get_ai_chat_response(message_history: list) -> str:
 
     except Exception as e:
         print(f"AI Chat Error: {str(e)}")
-        return "<p>Sorry, I'm having trouble connecting right now. Please try again in a moment.</p>"
+        return f"<p>{CHAT_FALLBACK_REPLY}</p>"
+
+def stream_ai_chat_response(message_history: list):
+    """
+    Streams the AI's Markdown reply chunk by chunk. If the stream fails before
+    anything was sent, the fallback reply is yielded instead.
+    """
+    messages_to_send = [{"role": "system", "content": CHAT_SYSTEM_PROMPT}] + message_history
+    sent_any = False
+    try:
+        for delta in gateway.stream(
+            'chat', deadline=30,
+            model="llama3-8b-8192",
+            messages=messages_to_send,
+            temperature=0.7,
+            max_tokens=500
+        ):
+            sent_any = True
+            yield delta
+    except Exception as e:
+        print(f"AI Chat Stream Error: {str(e)}")
+        if not sent_any:
+            yield CHAT_FALLBACK_REPLY
+
+def summarize_chat(previous_summary: str, turns: list) -> str:
+    """
+    Folds older chat turns into a short running summary. Returns "" on failure
+    so the caller keeps the previous summary.
+    """
+    transcript = "\n".join(f"{turn['role']}: {turn['content']}" for turn in turns)
+    system_prompt = "You maintain a compact memory of a conversation between a user and FitBot, a fitness assistant. Merge the existing summary with the new messages into at most 120 words. Keep the user's goals, constraints, preferences and any numbers they gave; drop pleasantries. Reply with the summary only."
+    try:
+        response = gateway.complete(
+            'chat_summary', deadline=20,
+            model="llama3-8b-8192",
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": f"Existing summary:\n{previous_summary or '(none)'}\n\nNew messages:\n{transcript}"}
+            ],
+            temperature=0.2,
+            max_tokens=200
+        )
+        return response.choices[0].message.content.strip()
+    except Exception as e:
+        print(f"AI Chat Summary Error: {str(e)}")
+        return ""
      
+QUOTE_FALLBACK = "The only bad workout is the one that didn't happen."
+
 def get_daily_quote():
     """Gets a short, motivational fitness quote from the AI."""
     try:
         system_prompt = "You are a motivational coach. Your only task is to provide one short, powerful, and inspiring fitness or health-related quote. Do not include quotation marks or any other text."
-        response = client.chat.completions.create(
+        response = gateway.complete(
+            'quote', deadline=5,
             model="llama3-8b-8192",
             messages=[{"role": "system", "content": system_prompt}],
             temperature=1.2, # Make it creative
@@ -246,4 +295,4 @@ def get_daily_quote():
     except Exception as e:
         print(f"AI Quote Error: {str(e)}")
         # Provide a fallback quote in case the AI fails
-        return "The only bad workout is the one that didn't happen."
\ No newline at end of file
+        return QUOTE_FALLBACK
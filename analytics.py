@@ -0,0 +1,182 @@
+"""
+Vectorised statistics over a user's daily history, for the AI summaries.
+
+`load` reads the daily_summaries rollup for any window into one NumPy array
+per column, with one slot per calendar day so gaps stay explicit (weight is
+NaN on days without a weigh-in). `summarize` reduces those arrays to a small
+dict of numbers: rolling averages, goal adherence, a least-squares weight
+trend, how well logged intake explains the weight change, and weekday
+patterns. All of it is O(days) array arithmetic, so multi-year windows take
+milliseconds.
+"""
+import numpy as np
+
+import queries
+from database import db
+
+KCAL_PER_KG = 7700.0
+# A logged day counts as on-goal within this fraction of the calorie goal.
+ADHERENCE_TOLERANCE = 0.10
+WEEKDAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+
+SUMMED_COLUMNS = ('calories_in', 'calories_burned', 'protein', 'carbs', 'fat', 'meal_count', 'workout_count')
+
+
+def load(user_id, first_day, last_day):
+    """Returns {column: ndarray} with one slot per day first_day..last_day, plus 'weekday'."""
+    n = (last_day - first_day).days + 1
+    columns = {column: np.zeros(n) for column in SUMMED_COLUMNS + ('workout_minutes',)}
+    columns['weight'] = np.full(n, np.nan)
+    columns['weekday'] = (first_day.weekday() + np.arange(n)) % 7
+
+    rows = db.execute_query(
+        f"""SELECT day, {', '.join(SUMMED_COLUMNS)}, last_weight FROM daily_summaries
+            WHERE user_id = %s AND day BETWEEN %s AND %s""",
+        (user_id, first_day, last_day), fetch_all=True
+    ) or []
+    if rows:
+        index = np.fromiter(((row['day'] - first_day).days for row in rows), dtype=np.int64, count=len(rows))
+        for column in SUMMED_COLUMNS:
+            columns[column][index] = np.fromiter((float(row[column] or 0) for row in rows), dtype=float, count=len(rows))
+        columns['weight'][index] = np.fromiter(
+            (np.nan if row['last_weight'] is None else float(row['last_weight']) for row in rows),
+            dtype=float, count=len(rows)
+        )
+
+    minutes = queries.workout_minutes_by_day(user_id, first_day, last_day)
+    if minutes:
+        index = np.fromiter(((row['day'] - first_day).days for row in minutes), dtype=np.int64, count=len(minutes))
+        columns['workout_minutes'][index] = np.fromiter((float(row['minutes'] or 0) for row in minutes),
+                                                        dtype=float, count=len(minutes))
+    return columns
+
+
+def rolling_mean(values, window, mask=None):
+    """
+    Trailing `window`-day mean at every day, over the days where `mask` is true
+    (default: non-NaN values). NaN where the window holds no such day.
+    """
+    valid = ~np.isnan(values) if mask is None else mask
+    sums = np.concatenate(([0.0], np.cumsum(np.where(valid, values, 0.0))))
+    counts = np.concatenate(([0], np.cumsum(valid)))
+    end = np.arange(1, len(values) + 1)
+    start = np.maximum(end - window, 0)
+    count = counts[end] - counts[start]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(count > 0, (sums[end] - sums[start]) / count, np.nan)
+
+
+def weight_trend(weight):
+    """Least-squares line through the weigh-ins: {'kg_per_week', 'start', 'end', 'r2'} or None."""
+    days = np.flatnonzero(~np.isnan(weight))
+    if len(days) < 2 or days[0] == days[-1]:
+        return None
+    y = weight[days]
+    slope, intercept = np.polyfit(days, y, 1)
+    residual = y - (slope * days + intercept)
+    spread = np.sum((y - y.mean()) ** 2)
+    return {
+        'kg_per_week': slope * 7,
+        'start': intercept,
+        'end': slope * (len(weight) - 1) + intercept,
+        'r2': 1 - np.sum(residual ** 2) / spread if spread else 1.0,
+    }
+
+
+def _weekly_means(values, mask):
+    weeks = len(values) // 7
+    values, mask = values[-weeks * 7:].reshape(weeks, 7), mask[-weeks * 7:].reshape(weeks, 7)
+    counts = mask.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts > 0, np.where(mask, values, 0.0).sum(axis=1) / counts, np.nan)
+
+
+def energy_balance(columns, trend):
+    """
+    Compares logged intake with the observed weight change. Returns the daily
+    maintenance implied by the two, and the correlation between each week's
+    net intake and the following change in weekly mean weight (positive is
+    consistent; near zero or negative suggests under-logging).
+    """
+    logged = columns['meal_count'] > 0
+    if not logged.any() or trend is None:
+        return {'implied_maintenance': None, 'net_vs_weight_correlation': None}
+    net = columns['calories_in'] - columns['calories_burned']
+    implied = net[logged].mean() - trend['kg_per_week'] / 7 * KCAL_PER_KG
+
+    correlation = None
+    if len(net) >= 28:
+        weekly_net = _weekly_means(net, logged)
+        weekly_weight = _weekly_means(columns['weight'], ~np.isnan(columns['weight']))
+        pairs = ~np.isnan(weekly_net[1:]) & ~np.isnan(np.diff(weekly_weight))
+        if pairs.sum() >= 3:
+            x, y = weekly_net[1:][pairs], np.diff(weekly_weight)[pairs]
+            if x.std() and y.std():
+                correlation = float(np.corrcoef(x, y)[0, 1])
+    return {'implied_maintenance': float(implied), 'net_vs_weight_correlation': correlation}
+
+
+def weekday_patterns(columns):
+    """Per-weekday mean intake (logged days) and share of days with a workout."""
+    weekday, logged = columns['weekday'], columns['meal_count'] > 0
+    days = np.bincount(weekday, minlength=7)
+    logged_days = np.bincount(weekday[logged], minlength=7)
+    intake = np.bincount(weekday[logged], weights=columns['calories_in'][logged], minlength=7)
+    trained = np.bincount(weekday, weights=(columns['workout_count'] > 0).astype(float), minlength=7)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return {
+            'intake': np.where(logged_days > 0, intake / logged_days, np.nan),
+            'workout_rate': np.where(days > 0, trained / days, np.nan),
+        }
+
+
+def _number(value, digits=1):
+    return None if value is None or np.isnan(value) else round(float(value), digits)
+
+
+def summarize(user_id, first_day, last_day, calorie_goal=None):
+    """Compact statistics for first_day..last_day (inclusive), ready to be put in a prompt."""
+    columns = load(user_id, first_day, last_day)
+    days = len(columns['weekday'])
+    logged = columns['meal_count'] > 0
+    intake = columns['calories_in']
+    rolling = rolling_mean(intake, 7, logged)
+    trend = weight_trend(columns['weight'])
+    weights = columns['weight'][~np.isnan(columns['weight'])]
+
+    adherence = None
+    if calorie_goal and logged.any():
+        ratio = intake[logged] / float(calorie_goal)
+        adherence = {
+            'on_goal_pct': _number(np.mean(np.abs(ratio - 1) <= ADHERENCE_TOLERANCE) * 100),
+            'over_days': int(np.sum(ratio > 1 + ADHERENCE_TOLERANCE)),
+            'under_days': int(np.sum(ratio < 1 - ADHERENCE_TOLERANCE)),
+            'mean_pct_of_goal': _number(ratio.mean() * 100),
+        }
+
+    patterns = weekday_patterns(columns)
+    balance = energy_balance(columns, trend)
+    return {
+        'days': days,
+        'logged_days': int(logged.sum()),
+        'calories_in_total': _number(intake.sum(), 0),
+        'calories_in_avg': _number(intake[logged].mean(), 0) if logged.any() else None,
+        'calories_in_7day_avg_start': _number(rolling[min(6, days - 1)], 0),
+        'calories_in_7day_avg_end': _number(rolling[-1], 0),
+        'protein_avg': _number(columns['protein'][logged].mean()) if logged.any() else None,
+        'calorie_goal': calorie_goal,
+        'adherence': adherence,
+        'workouts': int(columns['workout_count'].sum()),
+        'workout_days': int(np.count_nonzero(columns['workout_count'])),
+        'workout_minutes': _number(columns['workout_minutes'].sum(), 0),
+        'calories_burned_total': _number(columns['calories_burned'].sum(), 0),
+        'weigh_ins': len(weights),
+        'weight_first': _number(weights[0]) if len(weights) else None,
+        'weight_last': _number(weights[-1]) if len(weights) else None,
+        'weight_trend_kg_per_week': _number(trend['kg_per_week'], 2) if trend else None,
+        'weight_trend_r2': _number(trend['r2'], 2) if trend else None,
+        'implied_maintenance': _number(balance['implied_maintenance'], 0),
+        'net_vs_weight_correlation': _number(balance['net_vs_weight_correlation'], 2),
+        'weekday_intake': {WEEKDAYS[i]: _number(v, 0) for i, v in enumerate(patterns['intake'])},
+        'weekday_workout_rate': {WEEKDAYS[i]: _number(v * 100, 0) for i, v in enumerate(patterns['workout_rate'])},
+    }
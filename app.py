@@ -1,26 +1,48 @@
-import os
+import hmac
 import json
 from datetime import datetime, timedelta
 from io import BytesIO
 
-import pytz  # <-- Required for timezone handling
 from config import Config
 from database import db
-from export_utils import create_plan_pdf, create_daily_plan_excel#
-from flask import (Flask, flash, jsonify, redirect, render_template,
-                   request, send_file, session, url_for)
-from flask_login import (LoginManager, UserMixin, current_user, login_required,
+from export_utils import create_daily_plan_excel, create_history_excel, create_plan_pdf, stream_history_csv
+from flask import (Flask, Response, flash, jsonify, redirect, render_template,
+                   request, send_file, send_from_directory, session, stream_with_context, url_for)
+from flask_login import (LoginManager, current_user, login_required,
                          login_user, logout_user)
 from graph_utils import create_plot
-from werkzeug.security import check_password_hash, generate_password_hash
-from werkzeug.utils import secure_filename
-
-from ai_integration import (get_ai_chat_response, get_ai_diet_suggestion,
-                            get_ai_workout_plan, get_daily_quote,
-                            get_nutrition_info, get_workout_calories)
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+import markdown2
+from models import User
+from nutrition_cache import nutrition_cache
+from plan_jobs import plan_queue
+from quotes import quote_store
+import assets
+import charts
+import chat_context
+import compression
+import importer
+import metrics
+import photos
+import plans
+import queries
+import server_session
+import streaks
+import summaries
+import tdee
+import workout_calories
+
+from ai_integration import (gateway, get_ai_chat_response, get_nutrition_info,
+                            get_workout_calories, stream_ai_chat_response)
 
 app = Flask(__name__)
 app.config.from_object(Config)
+db.init_app(app)
+metrics.init_app(app, db, gateway)
+server_session.init_app(app)
+photos.init_app(app)
+assets.init_app(app)
+compression.init_app(app)
 
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -30,11 +52,11 @@ login_manager.login_view = 'login'
 # All date/time logic will now use these functions to ensure consistency.
 def get_current_ist_date():
     """Returns the current DATE in the Asia/Kolkata timezone."""
-    return datetime.now(pytz.timezone('Asia/Kolkata')).date()
+    return queries.ist_today()
 
 def get_current_ist_datetime():
     """Returns the current DATETIME in the Asia/Kolkata timezone."""
-    return datetime.now(pytz.timezone('Asia/Kolkata'))
+    return queries.ist_now()
 
 @app.context_processor
 def inject_now():
@@ -42,163 +64,50 @@ def inject_now():
     return {'now': datetime.utcnow}
 
 
-class User(UserMixin):
-    def __init__(self, user_dict):
-        self.id = user_dict.get('id')
-        self.email = user_dict.get('email')
-        self.name = user_dict.get('name')
-        self.password = user_dict.get('password')
-        self.profile_photo = user_dict.get('profile_photo', 'default.png')
-        self.age = user_dict.get('age')
-        self.gender = user_dict.get('gender')
-        self.height = user_dict.get('height')
-        self.weight = user_dict.get('weight')
-        self.goal_weight = user_dict.get('goal_weight')
-        self.diet_preference = user_dict.get('diet_preference')
-        self.fitness_goal = user_dict.get('fitness_goal')
-        self.activity_level = user_dict.get('activity_level')
-        self.daily_calories = user_dict.get('daily_calories')
-        self.dark_mode = user_dict.get('dark_mode', False)
-        self.created_at = user_dict.get('created_at')
-        self.medical_conditions = user_dict.get('medical_conditions')
-        self.past_surgeries = user_dict.get('past_surgeries')
-
-    def get_id(self):
-        return str(self.id)
-
-    def save(self):
-        if self.id:
-            query = """
-                UPDATE users SET
-                name = %s, email = %s, gender = %s, age = %s, height = %s,
-                weight = %s, goal_weight = %s, diet_preference = %s,
-                fitness_goal = %s, activity_level = %s, daily_calories = %s,
-                profile_photo = %s, medical_conditions = %s, past_surgeries = %s, dark_mode = %s
-                WHERE id = %s
-            """
-            params = (
-                self.name, self.email, self.gender, self.age, self.height,
-                self.weight, self.goal_weight, self.diet_preference,
-                self.fitness_goal, self.activity_level, self.daily_calories,
-                self.profile_photo, self.medical_conditions, self.past_surgeries, self.dark_mode,
-                self.id
-            )
-            db.execute_query(query, params, commit=True)
-
-    @staticmethod
-    def get(user_id):
-        user_data = db.execute_query("SELECT * FROM users WHERE id = %s", (user_id,), fetch_one=True)
-        return User(user_data) if user_data else None
-
-    @staticmethod
-    def get_by_email(email):
-        user_data = db.execute_query("SELECT * FROM users WHERE email = %s", (email,), fetch_one=True)
-        return User(user_data) if user_data else None
-
-
 @login_manager.user_loader
 def load_user(user_id):
     return User.get(user_id)
 
 
+plan_queue.init_app(app, user_loader=User.get)
+
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in Config.ALLOWED_EXTENSIONS
 
 
 def calculate_daily_calories(user):
-    if not all([user.age, user.height, user.weight, user.gender, user.activity_level, user.fitness_goal]):
+    maintenance = tdee.formula_maintenance(user)
+    if maintenance is None or not user.fitness_goal:
         return 2000
-    if user.gender.lower() == 'male':
-        bmr = 88.362 + (13.397 * float(user.weight)) + (4.799 * float(user.height)) - (5.677 * int(user.age))
-    else:
-        bmr = 447.593 + (9.247 * float(user.weight)) + (3.098 * float(user.height)) - (4.330 * int(user.age))
-    
-    activity_multipliers = {'sedentary': 1.2, 'light': 1.375, 'moderate': 1.55, 'active': 1.725, 'very_active': 1.9}
-    tdee = bmr * activity_multipliers.get(user.activity_level, 1.2)
-
-    goal_adjustments = {'lose': -500, 'maintain': 0, 'gain': 500}
-    final_calories = tdee + goal_adjustments.get(user.fitness_goal, 0)
-    return int(final_calories)
+    if user.adaptive_calories:
+        # Opted in: follow the estimate fitted from the user's own logs once it has enough data.
+        maintenance = tdee.adaptive_maintenance(user.id) or maintenance
+    return tdee.daily_target(maintenance, user.fitness_goal)
 
 
 def calculate_streak(user_id):
-    query = """
-        (SELECT DISTINCT DATE(date) as log_date FROM meal_logs WHERE user_id = %s)
-        UNION
-        (SELECT DISTINCT DATE(date) as log_date FROM workout_logs WHERE user_id = %s)
-        ORDER BY log_date DESC;
-    """
-    dates_data = db.execute_query(query, (user_id, user_id), fetch_all=True)
-    
-    if not dates_data:
-        return 0
-
-    dates = [row['log_date'] for row in dates_data]
-    
-    today = get_current_ist_date() # FIX: Use correct timezone for today's date
-    yesterday = today - timedelta(days=1)
-    
-    if dates[0] < yesterday:
-        return 0
-        
-    streak = 0
-    if dates[0] == today or dates[0] == yesterday:
-        streak = 1
-        current_day = dates[0] - timedelta(days=1)
-        for log_date in dates[1:]:
-            if log_date == current_day:
-                streak += 1
-                current_day -= timedelta(days=1)
-            else:
-                break
-            
-    return streak
+    """Current activity streak in IST days, read from the stored streak state."""
+    return streaks.get_streak(user_id, get_current_ist_date())
 
 
-def get_or_create_plan_html(user, date, plan_type):
+def get_export_plan_items(user, date):
     """
-    Checks for a cached daily plan. If not found, generates a new one
-    using the simple AI format and saves it.
+    Returns (diet_items, workout_items, pending) for the exports. Missing plans
+    are queued through plan_jobs like the dashboard's, never generated inline,
+    so an export cannot race a pending job for the same plan.
     """
-    query = "SELECT html_content FROM daily_plans WHERE user_id = %s AND date = %s AND plan_type = %s"
-    existing_plan = db.execute_query(query, (user.id, date, plan_type), fetch_one=True)
-
-    if existing_plan and existing_plan['html_content']:
-        return existing_plan['html_content']
-
-    html_content = ""
-    try:
-        if plan_type == 'diet':
-            ai_response_str = get_ai_diet_suggestion(user) or ""
-            # FIX: Reverted to parse the simple 3-part format
-            for item in ai_response_str.split(';'):
-                if ':' in item and len(item.split(':')) == 3:
-                    meal_type, food, cals = item.split(':')
-                    html_content += f"""<li class="plan-item" data-name="{meal_type}: {food}" data-calories="{float(cals)}" data-type="meal">
-                        <input type="checkbox"><div class="item-details">
-                        <div class="item-name">{meal_type}: {food}</div>
-                        <div class="item-info">{float(cals):.0f} kcal</div></div></li>"""
-        
-        elif plan_type == 'workout':
-            ai_response_str = get_ai_workout_plan(user) or ""
-            # FIX: Reverted to parse the simple 3-part format
-            for item in ai_response_str.split(';'):
-                if ':' in item and len(item.split(':')) == 3:
-                    cat, ex, cals = item.split(':')
-                    html_content += f"""<li class="plan-item" data-name="{cat}: {ex}" data-calories="{float(cals)}" data-type="workout">
-                        <input type="checkbox"><div class="item-details">
-                        <div class="item-name">{cat}: {ex}</div>
-                        <div class="item-info">{float(cals):.0f} kcal burned</div></div></li>"""
-        
-        if html_content:
-            save_query = "INSERT INTO daily_plans (user_id, date, plan_type, html_content) VALUES (%s, %s, %s, %s) ON DUPLICATE KEY UPDATE html_content = VALUES(html_content)"
-            db.execute_query(save_query, (user.id, date, plan_type, html_content), commit=True)
+    diet_status, diet_items = plan_queue.request(user, date, 'diet')
+    workout_status, workout_items = plan_queue.request(user, date, 'workout')
+    return diet_items or [], workout_items or [], 'pending' in (diet_status, workout_status)
 
-    except Exception as e:
-        print(f"CRITICAL ERROR generating AI {plan_type} plan: {e}")
-        return ""
 
-    return html_content
+def _no_plan_to_export(pending):
+    if pending:
+        flash("Today's plan is still being generated. Try the export again in a moment.", "warning")
+    else:
+        flash("No plan is available to export for today.", "warning")
+    return redirect(url_for('dashboard'))
 
 @app.route('/export/excel')
 @login_required
@@ -206,15 +115,11 @@ def export_excel():
     try:
         today = get_current_ist_date()
 
-        # Get the plan from the cache (or generate if needed)
-        diet_plan_html = get_or_create_plan_html(current_user, today, 'diet')
-        workout_plan_html = get_or_create_plan_html(current_user, today, 'workout')
-
-        if not diet_plan_html and not workout_plan_html:
-            flash("No plan is available to export for today.", "warning")
-            return redirect(url_for('dashboard'))
+        diet_items, workout_items, pending = get_export_plan_items(current_user._get_current_object(), today)
+        if not diet_items and not workout_items:
+            return _no_plan_to_export(pending)
 
-        excel_file = create_daily_plan_excel(diet_plan_html, workout_plan_html)
+        excel_file = create_daily_plan_excel(diet_items, workout_items)
 
         return send_file(
             excel_file,
@@ -226,6 +131,32 @@ def export_excel():
         flash(f"Error creating Excel file: {str(e)}", "error")
         return redirect(url_for('dashboard'))
 
+@app.route('/export/history/<kind>.csv')
+@login_required
+def export_history_csv(kind):
+    """Streams one kind of log history as CSV without holding it in memory."""
+    if kind not in importer.KINDS:
+        return jsonify({'success': False, 'error': f"Unknown export '{kind}'"}), 404
+    response = Response(stream_with_context(stream_history_csv(current_user.id, kind)), mimetype='text/csv')
+    response.headers['Content-Disposition'] = f'attachment; filename=FitTrack_{kind}_{get_current_ist_date()}.csv'
+    return response
+
+
+@app.route('/export/history.xlsx')
+@login_required
+def export_history_excel():
+    try:
+        excel_file = create_history_excel(current_user.id)
+        return send_file(
+            excel_file,
+            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            as_attachment=True,
+            download_name=f'FitTrack_History_{get_current_ist_date()}.xlsx'
+        )
+    except Exception as e:
+        flash(f"Error creating Excel file: {str(e)}", "error")
+        return redirect(url_for('dashboard'))
+
 @app.route('/')
 def index():
     if current_user.is_authenticated:
@@ -238,8 +169,9 @@ def login():
     if current_user.is_authenticated:
         return redirect(url_for('dashboard'))
     if request.method == 'POST':
-        user = User.get_by_email(request.form['email'])
-        if user and check_password_hash(user.password, request.form['password']):
+        user = User.authenticate(request.form['email'], request.form['password'])
+        if user:
+            server_session.regenerate()
             login_user(user, remember=request.form.get('remember'))
             return redirect(url_for('dashboard'))
         flash('Invalid email or password', 'error')
@@ -254,12 +186,7 @@ def register():
         if User.get_by_email(request.form.get('email')):
             flash('Email address already exists.', 'error')
             return redirect(url_for('register'))
-        hashed_password = generate_password_hash(request.form['password'])
-        db.execute_query(
-            "INSERT INTO users (name, email, password, created_at) VALUES (%s, %s, %s, %s)",
-            (request.form['name'], request.form['email'], hashed_password, get_current_ist_datetime()), # FIX: Use IST datetime
-            commit=True
-        )
+        User.create(request.form['email'], request.form['name'], request.form['password'])
         flash('Account created successfully! Please log in.', 'success')
         return redirect(url_for('login'))
     return render_template('auth/register.html')
@@ -269,6 +196,7 @@ def register():
 @login_required
 def logout():
     logout_user()
+    server_session.regenerate()
     return redirect(url_for('login'))
 
 
@@ -282,45 +210,38 @@ def dashboard():
             flash('Please complete your profile for a personalized experience.', 'warning')
             return redirect(url_for('profile'))
 
-        user_meals_today = db.execute_query("SELECT * FROM meal_logs WHERE user_id = %s AND DATE(date) = %s", (current_user.id, today), fetch_all=True) or []
-        user_workouts_today = db.execute_query("SELECT * FROM workout_logs WHERE user_id = %s AND DATE(date) = %s", (current_user.id, today), fetch_all=True) or []
-        
-        total_calories = sum(float(meal.get('calories', 0)) for meal in user_meals_today)
-        workout_calories = sum(float(workout.get('calories_burned', 0)) for workout in user_workouts_today)
+        user_meals_today = queries.meals_between(current_user.id, today)
+        user_workouts_today = queries.workouts_between(current_user.id, today)
+
+        # In 'client' mode the browser fetches /api/charts/<series> and draws with Chart.js,
+        # so only today's rollup is needed here. 'server' mode keeps the matplotlib PNGs.
+        chart_mode = app.config['CHART_RENDER_MODE']
+        first_day = today - timedelta(days=29) if chart_mode == 'server' else today
+        daily = summaries.get_range(current_user.id, first_day, today)
+        today_summary = daily.get(today, summaries.empty_summary())
+
+        total_calories = float(today_summary['calories_in'])
+        workout_calories = float(today_summary['calories_burned'])
         streak = calculate_streak(current_user.id)
 
-        thirty_days_ago = today - timedelta(days=29)
-        seven_days_ago = today - timedelta(days=6)
-        weight_data = db.execute_query("SELECT date, weight FROM weight_logs WHERE user_id = %s AND DATE(date) >= %s ORDER BY date", (current_user.id, thirty_days_ago), fetch_all=True) or []
-        calorie_trend_data = db.execute_query("SELECT DATE(date) as log_date, SUM(calories) as total_calories FROM meal_logs WHERE user_id = %s AND DATE(date) >= %s GROUP BY DATE(date) ORDER BY log_date", (current_user.id, seven_days_ago), fetch_all=True) or []
-
-        weight_graph_img = None
-        if weight_data and len(weight_data) > 1:
-            weight_dates = [entry['date'].strftime('%b %d') for entry in weight_data]
-            weights = [float(entry['weight']) for entry in weight_data]
-            weight_graph_img = create_plot(weight_dates, weights, "Weight Progress (30 Days)", "Weight (kg)", "#4f46e5")
-
-        calorie_graph_img = None
-        date_map = { (seven_days_ago + timedelta(days=i)).strftime('%b %d'): 0 for i in range(7) }
-        for row in calorie_trend_data:
-            date_map[row['log_date'].strftime('%b %d')] = float(row['total_calories'])
-        if any(v > 0 for v in date_map.values()):
-             calorie_graph_img = create_plot(list(date_map.keys()), list(date_map.values()), "Calorie Trend (7 Days)", "Calories (kcal)", "#10b981")
-
-        today_str = today.isoformat()
-        if session.get('quote_date') != today_str:
-            session['daily_quote'] = get_daily_quote()
-            session['quote_date'] = today_str
-        daily_quote = session.get('daily_quote')
+        weight_graph_img = calorie_graph_img = None
+        if chart_mode == 'server':
+            weight_graph_img = render_chart_img(charts.build_series(current_user.id, 'weight', today, daily=daily))
+            calorie_graph_img = render_chart_img(charts.build_series(current_user.id, 'calories', today, daily=daily))
+
+        daily_quote = quote_store.quote_for(current_user.id, today)
         
-        diet_plan_html = get_or_create_plan_html(current_user, today, 'diet')
-        workout_plan_html = get_or_create_plan_html(current_user, today, 'workout')
+        # Missing plans are generated in the background; the page polls /api/plans/<type>.
+        user = current_user._get_current_object()
+        diet_status, diet_plan_items = plan_queue.request(user, today, 'diet')
+        workout_status, workout_plan_items = plan_queue.request(user, today, 'workout')
 
         return render_template('dashboard.html',
+            diet_plan_pending=diet_status == 'pending', workout_plan_pending=workout_status == 'pending',
             total_calories=total_calories, workout_calories=workout_calories,
             weight_graph_img=weight_graph_img, calorie_graph_img=calorie_graph_img,
-            streak=streak, daily_goal=current_user.daily_calories,
-            diet_plan_html=diet_plan_html, workout_plan_html=workout_plan_html,
+            streak=streak, daily_goal=current_user.daily_calories, chart_mode=chart_mode,
+            diet_plan_items=diet_plan_items or [], workout_plan_items=workout_plan_items or [],
             user_meals_today=user_meals_today, user_workouts_today=user_workouts_today,
             daily_quote=daily_quote
         )
@@ -330,6 +251,48 @@ def dashboard():
         return redirect(url_for('profile'))
 
 
+def render_chart_img(chart):
+    """Server-side fallback: draws a chart payload from charts.build_series as a PNG data URI."""
+    if chart['empty']:
+        return None
+    _, label, color, _, _ = charts.SERIES[chart['series']]
+    dataset = chart['data']['datasets'][0]
+    return create_plot(chart['data']['labels'], dataset['data'], chart['title'], label, color)
+
+
+def _chart_version(series):
+    # Everything a chart depends on; the summaries stamp moves on every log and rebuild.
+    return (current_user.id, series, request.args.get('days', type=int), get_current_ist_date(),
+            summaries.last_updated(current_user.id))
+
+
+@app.route('/api/charts/<series>')
+@login_required
+@compression.conditional(_chart_version)
+def api_chart(series):
+    if series not in charts.SERIES:
+        return jsonify({'success': False, 'error': 'Unknown chart series'}), 404
+    try:
+        chart = charts.build_series(current_user.id, series, get_current_ist_date(), request.args.get('days', type=int))
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+    body = json.dumps(chart, separators=(',', ':'))
+    response = app.response_class(body, mimetype='application/json')
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@app.route('/api/plans/<plan_type>')
+@login_required
+def api_plan(plan_type):
+    if plan_type not in plans.PLAN_TYPES:
+        return jsonify({'success': False, 'error': 'Unknown plan type'}), 404
+    status, items = plan_queue.request(current_user._get_current_object(), get_current_ist_date(), plan_type)
+    html = render_template('components/plan_items.html', items=items) if items else ''
+    return jsonify({'success': True, 'status': status, 'html': html}), (200 if status != 'pending' else 202)
+
+
 @app.route('/profile', methods=['GET', 'POST'])
 @login_required
 def profile():
@@ -338,9 +301,12 @@ def profile():
             if 'profile_photo' in request.files:
                 file = request.files['profile_photo']
                 if file and file.filename != '' and allowed_file(file.filename):
-                    filename = secure_filename(f"user_{current_user.id}_{datetime.now().timestamp()}.{file.filename.rsplit('.', 1)[1].lower()}")
-                    file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-                    current_user.profile_photo = filename
+                    # Encoded in the background; profile_photo switches over once the files exist.
+                    try:
+                        photos.submit(current_user.id, file)
+                        flash('Your new photo is being processed and will appear shortly.', 'success')
+                    except ValueError as e:
+                        flash(str(e), 'error')
             
             current_user.name = request.form.get('name')
             current_user.email = request.form.get('email')
@@ -354,6 +320,7 @@ def profile():
             current_user.activity_level = request.form.get('activity_level')
             current_user.medical_conditions = request.form.get('medical_conditions')
             current_user.past_surgeries = request.form.get('past_surgeries')
+            current_user.adaptive_calories = request.form.get('adaptive_calories') == 'on'
             
             current_user.daily_calories = calculate_daily_calories(current_user)
             current_user.save()
@@ -364,22 +331,44 @@ def profile():
     return render_template('profile.html', user=current_user)
 
 
+@app.route('/assets/<path:filename>')
+def asset(filename):
+    # Fingerprinted build output (python assets.py build); see assets.serve_asset.
+    return assets.serve_asset(filename)
+
+
+@app.route('/photos/<filename>')
+def profile_photo_file(filename):
+    # Processed variants are content-hashed, so a given URL never changes.
+    if not photos.is_variant(filename):
+        return ('', 404)
+    response = send_from_directory(app.config['UPLOAD_FOLDER'], filename, max_age=photos.CACHE_MAX_AGE)
+    response.cache_control.immutable = True
+    return response
+
+
 @app.route('/log/meal', methods=['GET', 'POST'])
 @login_required
 def log_meal():
     if request.method == 'POST':
         try:
+            log_time = get_current_ist_datetime() # FIX: Use IST datetime
+            calories, protein = float(request.form.get('calories', 0)), float(request.form.get('protein', 0))
+            carbs, fat = float(request.form.get('carbs', 0)), float(request.form.get('fat', 0))
             db.execute_query(
                 "INSERT INTO meal_logs (user_id, name, calories, protein, carbs, fat, notes, date) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
-                (current_user.id, request.form.get('name'), float(request.form.get('calories', 0)), float(request.form.get('protein', 0)), float(request.form.get('carbs', 0)), float(request.form.get('fat', 0)), request.form.get('notes'), get_current_ist_datetime()), # FIX: Use IST datetime
+                (current_user.id, request.form.get('name'), calories, protein, carbs, fat, request.form.get('notes'), log_time),
                 commit=True
             )
+            summaries.record_meal(current_user.id, log_time, calories, protein, carbs, fat)
+            streaks.record_activity(current_user.id, log_time.date())
+            tdee.record_log(current_user.id, log_time.date())
             flash('Meal logged successfully!', 'success')
             return redirect(url_for('dashboard'))
         except Exception as e:
             flash(f'Error logging meal: {str(e)}', 'error')
     
-    recent_meals = db.execute_query("SELECT * FROM meal_logs WHERE user_id = %s ORDER BY date DESC LIMIT 5", (current_user.id,), fetch_all=True)
+    recent_meals = queries.latest_logs('meal_logs', current_user.id)
     return render_template('logs/meals.html', recent_meals=recent_meals)
 
 
@@ -388,17 +377,21 @@ def log_meal():
 def log_workout():
     if request.method == 'POST':
         try:
+            log_time = get_current_ist_datetime() # FIX: Use IST datetime
+            calories_burned = float(request.form.get('calories_burned', 0))
             db.execute_query(
                 "INSERT INTO workout_logs (user_id, type, duration, calories_burned, notes, date) VALUES (%s, %s, %s, %s, %s, %s)",
-                (current_user.id, request.form.get('type'), int(request.form.get('duration', 0)), float(request.form.get('calories_burned', 0)), request.form.get('notes'), get_current_ist_datetime()), # FIX: Use IST datetime
+                (current_user.id, request.form.get('type'), int(request.form.get('duration', 0)), calories_burned, request.form.get('notes'), log_time),
                 commit=True
             )
+            summaries.record_workout(current_user.id, log_time, calories_burned)
+            streaks.record_activity(current_user.id, log_time.date())
             flash('Workout logged successfully!', 'success')
             return redirect(url_for('dashboard'))
         except Exception as e:
             flash(f'Error logging workout: {str(e)}', 'error')
 
-    recent_workouts = db.execute_query("SELECT * FROM workout_logs WHERE user_id = %s ORDER BY date DESC LIMIT 5", (current_user.id,), fetch_all=True)
+    recent_workouts = queries.latest_logs('workout_logs', current_user.id)
     return render_template('logs/workouts.html', recent_workouts=recent_workouts)
 
 
@@ -408,7 +401,10 @@ def log_weight():
     if request.method == 'POST':
         try:
             weight_today = float(request.form.get('weight', 0))
-            db.execute_query("INSERT INTO weight_logs (user_id, weight, notes, date) VALUES (%s, %s, %s, %s)", (current_user.id, weight_today, request.form.get('notes'), get_current_ist_datetime()), commit=True) # FIX: Use IST datetime
+            log_time = get_current_ist_datetime() # FIX: Use IST datetime
+            db.execute_query("INSERT INTO weight_logs (user_id, weight, notes, date) VALUES (%s, %s, %s, %s)", (current_user.id, weight_today, request.form.get('notes'), log_time), commit=True)
+            summaries.record_weight(current_user.id, log_time, weight_today)
+            tdee.record_log(current_user.id, log_time.date())
             current_user.weight = weight_today
             current_user.daily_calories = calculate_daily_calories(current_user)
             current_user.save()
@@ -416,23 +412,32 @@ def log_weight():
             return redirect(url_for('dashboard'))
         except Exception as e:
             flash(f'Error logging weight: {str(e)}', 'error')
-    recent_weights = db.execute_query("SELECT * FROM weight_logs WHERE user_id = %s ORDER BY date DESC LIMIT 5", (current_user.id,), fetch_all=True)
+    recent_weights = queries.latest_logs('weight_logs', current_user.id)
     return render_template('logs/weight.html', recent_weights=recent_weights)
 
 
 @app.route('/log_item_from_dashboard', methods=['POST'])
 @login_required
 def log_item_from_dashboard():
+    """Checks off an AI plan item and logs it as a meal or workout (once)."""
     try:
-        data = request.get_json()
-        item_type, name, calories = data.get('type'), data.get('name'), data.get('calories')
-        log_time = get_current_ist_datetime() # FIX: Use IST datetime
+        item = plans.get_item(current_user.id, (request.get_json() or {}).get('item_id'))
+        if not item:
+            return jsonify({'success': False, 'error': 'Plan item not found'}), 404
+        if not plans.check_item(current_user.id, item['id']):
+            return jsonify({'success': True, 'already_logged': True})
 
-        if item_type == 'meal':
-            db.execute_query("INSERT INTO meal_logs (user_id, name, calories, date) VALUES (%s, %s, %s, %s)", (current_user.id, name, calories, log_time), commit=True)
-        elif item_type == 'workout':
-            workout_type, workout_name = name.split(': ', 1) if ': ' in name else (name, '')
-            db.execute_query("INSERT INTO workout_logs (user_id, type, calories_burned, date) VALUES (%s, %s, %s, %s)", (current_user.id, workout_type, calories, log_time), commit=True)
+        calories = float(item['calories'])
+        log_time = get_current_ist_datetime() # FIX: Use IST datetime
+        if plans.ITEM_TYPES[item['plan_type']] == 'meal':
+            db.execute_query("INSERT INTO meal_logs (user_id, name, calories, date) VALUES (%s, %s, %s, %s)", (current_user.id, f"{item['category']}: {item['name']}", calories, log_time), commit=True)
+            summaries.record_meal(current_user.id, log_time, calories)
+            streaks.record_activity(current_user.id, log_time.date())
+            tdee.record_log(current_user.id, log_time.date())
+        else:
+            db.execute_query("INSERT INTO workout_logs (user_id, type, calories_burned, date) VALUES (%s, %s, %s, %s)", (current_user.id, item['category'], calories, log_time), commit=True)
+            summaries.record_workout(current_user.id, log_time, calories)
+            streaks.record_activity(current_user.id, log_time.date())
         
         return jsonify({'success': True})
     except Exception as e:
@@ -446,7 +451,7 @@ def api_get_nutrition_info():
     if not description:
         return jsonify({'success': False, 'error': 'Description is required'}), 400
     
-    nutrition_data = get_nutrition_info(description)
+    nutrition_data = nutrition_cache.lookup(description, get_nutrition_info)
     if not nutrition_data:
         return jsonify({'success': False, 'error': 'Could not analyze food item'}), 500
         
@@ -460,11 +465,45 @@ def api_get_workout_calories():
     if not description:
         return jsonify({'success': False, 'error': 'Description is required'}), 400
     
+    # Common activities are answered locally from the MET table; the AI is only
+    # asked when the description cannot be parsed with confidence.
+    estimate = workout_calories.estimate(description, current_user.weight)
+    if estimate['confidence'] >= workout_calories.CONFIDENT:
+        return jsonify({'success': True, 'source': 'local', 'data': {'calories_burned': estimate['calories_burned'], 'source': 'local'}})
+
     calorie_data = get_workout_calories(description)
     if not calorie_data:
         return jsonify({'success': False, 'error': 'Could not calculate calories'}), 500
-        
-    return jsonify({'success': True, 'data': calorie_data})
+
+    calorie_data['source'] = 'ai'
+    return jsonify({'success': True, 'source': 'ai', 'data': calorie_data})
+
+
+@app.route('/api/import/<kind>', methods=['POST'])
+@login_required
+def api_import(kind):
+    """
+    Bulk-imports history: a multipart `file` (CSV, JSON array or JSON Lines,
+    by extension or the `format` field) or a JSON array body. Returns the
+    import report with per-row errors.
+    """
+    if kind not in importer.KINDS:
+        return jsonify({'success': False, 'error': f"Unknown import kind '{kind}'"}), 404
+    try:
+        upload = request.files.get('file')
+        if upload:
+            fmt = (request.form.get('format') or upload.filename.rsplit('.', 1)[-1]).lower()
+            if fmt not in importer.FORMATS:
+                return jsonify({'success': False, 'error': 'Unsupported file format'}), 400
+            report = importer.import_stream(current_user.id, kind, upload.stream, fmt)
+        else:
+            rows = request.get_json(silent=True)
+            if not isinstance(rows, list):
+                return jsonify({'success': False, 'error': 'Send a file or a JSON array of rows'}), 400
+            report = importer.import_records(current_user.id, kind, enumerate(rows, 1))
+        return jsonify({'success': True, **report})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
 
 
 @app.route('/api/chat', methods=['POST'])
@@ -474,16 +513,78 @@ def api_chat():
         prompt = request.json.get('prompt')
         if not prompt:
             return jsonify({'reply': 'Please enter a message.'})
-        chat_history = session.get('chat_history', [])
-        chat_history.append({"role": "user", "content": prompt})
-        ai_reply = get_ai_chat_response(chat_history)
-        chat_history.append({"role": "assistant", "content": ai_reply})
-        session['chat_history'] = chat_history
-        return jsonify({'reply': ai_reply})
+        window = _chat_window(prompt)
+        ai_reply = get_ai_chat_response(window['messages'])
+        session['chat_history'] = window['history'] + [{"role": "assistant", "content": ai_reply}]
+        return jsonify({'reply': ai_reply, 'prompt_tokens_saved': window['tokens_saved']})
     except Exception as e:
         return jsonify({'reply': f'An error occurred: {str(e)}'}), 500
 
 
+def _chat_window(prompt):
+    """Adds the prompt to the session history and returns the token-budgeted window to send."""
+    chat_history = session.get('chat_history', [])
+    chat_history.append({"role": "user", "content": prompt})
+    if 'chat_key' not in session:
+        session['chat_key'] = chat_context.new_chat_key()
+        session.pop('chat_offset', None)
+    window = chat_context.build_window(current_user.id, session['chat_key'], chat_history,
+                                       session.get('chat_offset'), app.config['CHAT_CONTEXT_TOKENS'])
+    session['chat_history'] = window['history']
+    session['chat_offset'] = window['offset']
+    return window
+
+
+def _chat_receipts():
+    return URLSafeTimedSerializer(app.secret_key, salt='chat-reply')
+
+
+@app.route('/api/chat/stream', methods=['POST'])
+@login_required
+def api_chat_stream():
+    """
+    Streams the reply as Server-Sent Events: `data: {"token": ...}` per chunk,
+    then `event: done` with the rendered HTML and a signed receipt. The session
+    cookie has already been sent by then, so the browser posts the receipt to
+    /api/chat/history to store the reply.
+    """
+    prompt = (request.json or {}).get('prompt')
+    if not prompt:
+        return jsonify({'reply': 'Please enter a message.'}), 400
+    window = _chat_window(prompt)
+    history_length = window['offset'] + len(window['history'])
+
+    def events():
+        parts = []
+        for delta in stream_ai_chat_response(window['messages']):
+            parts.append(delta)
+            yield f"data: {json.dumps({'token': delta})}\n\n"
+        html = markdown2.markdown(''.join(parts))
+        receipt = _chat_receipts().dumps({'n': history_length, 'reply': html})
+        yield f"event: done\ndata: {json.dumps({'html': html, 'receipt': receipt, 'prompt_tokens_saved': window['tokens_saved']})}\n\n"
+
+    response = Response(stream_with_context(events()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@app.route('/api/chat/history', methods=['POST'])
+@login_required
+def api_chat_history():
+    """Appends a streamed reply to the chat history, given the receipt from /api/chat/stream."""
+    try:
+        receipt = _chat_receipts().loads((request.json or {}).get('receipt', ''), max_age=600)
+    except BadSignature:
+        return jsonify({'success': False, 'error': 'Invalid receipt'}), 400
+    chat_history = session.get('chat_history', [])
+    # Only the reply to the latest prompt is accepted, and only once.
+    if session.get('chat_offset', 0) + len(chat_history) == receipt['n'] and chat_history and chat_history[-1]['role'] == 'user':
+        chat_history.append({"role": "assistant", "content": receipt['reply']})
+        session['chat_history'] = chat_history
+    return jsonify({'success': True})
+
+
 @app.route('/toggle-dark-mode', methods=['POST'])
 @login_required
 def toggle_dark_mode():
@@ -500,15 +601,28 @@ def toggle_dark_mode():
 def export_pdf():
     try:
         today = get_current_ist_date() # FIX: Use IST date
-        diet_plan_html = get_or_create_plan_html(current_user, today, 'diet')
-        workout_plan_html = get_or_create_plan_html(current_user, today, 'workout')
-        pdf_bytes = create_plan_pdf(current_user, diet_plan_html, workout_plan_html)
+        diet_items, workout_items, pending = get_export_plan_items(current_user._get_current_object(), today)
+        if not diet_items and not workout_items:
+            return _no_plan_to_export(pending)
+        pdf_bytes = create_plan_pdf(current_user, diet_items, workout_items)
         return send_file(BytesIO(pdf_bytes), mimetype='application/pdf', as_attachment=True, download_name=f'FitTrack_Plan_{today}.pdf')
     except Exception as e:
         flash(f"Error creating PDF: {str(e)}", "error")
         return redirect(url_for('dashboard'))
 
 
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus scrape target for this worker process; disabled until METRICS_TOKEN is set."""
+    token = app.config.get('METRICS_TOKEN')
+    if not token:
+        # Not loopback-only either: behind a reverse proxy every request is local.
+        return ('', 404)
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}"):
+        return ('', 403)
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
 
 
 if __name__ == '__main__':
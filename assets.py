@@ -0,0 +1,273 @@
+"""
+Fingerprinted, precompressed static assets.
+
+The build step copies everything under static/css, static/js and
+static/images into static/dist with the first 12 hex digits of each file's
+SHA-256 in its name (css/style.css -> css/style.3f9a0c1d2e4b.css), minified,
+plus .gz and .br siblings for text assets when they are smaller; JPEG/PNG
+images are re-encoded progressive/optimised without metadata. CSS url()
+references are rewritten to the fingerprinted names. static/dist/manifest.json
+maps source paths to built ones:
+
+    python assets.py build
+
+Templates link assets with `asset_url('css/style.css')`, which takes the same
+filename as `url_for('static', ...)`. With a manifest it points at
+/assets/<fingerprinted name>, served with the encoding the browser accepts
+and `Cache-Control: immutable`; without one (no build yet) it falls back to
+the plain static URL. Brotli variants need the optional `brotli` package.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+from io import BytesIO
+
+from flask import abort, request, send_file, url_for
+from PIL import Image
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+BUILD_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST_PATH = os.path.join(BUILD_DIR, 'manifest.json')
+SOURCE_DIRS = ('images', 'css', 'js')  # images first: CSS references them
+TEXT_EXTENSIONS = {'.css', '.js', '.svg', '.json'}
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png'}
+CACHE_MAX_AGE = 365 * 24 * 3600
+# Preferred order; the first one the client accepts and that was built wins.
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+_manifest = {}
+_built = set()
+
+
+# --- Minifiers -------------------------------------------------------------
+# Deliberately conservative: comments and indentation go, line breaks stay,
+# so automatic semicolon insertion in the JS is never affected.
+
+_CSS_COMMENT = re.compile(r'/\*.*?\*/', re.S)
+_CSS_STRING = re.compile(r'''("(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')''')
+_CSS_URL = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+
+
+def minify_css(text):
+    text = _CSS_COMMENT.sub('', text)
+    parts = _CSS_STRING.split(text)
+    for i in range(0, len(parts), 2):  # odd indexes are string literals
+        code = re.sub(r'\s+', ' ', parts[i])
+        code = re.sub(r'\s*([{};,>])\s*', r'\1', code)
+        code = re.sub(r':\s+', ':', code)  # only after: a space before ':' is a descendant combinator
+        parts[i] = code.replace(';}', '}')
+    return ''.join(parts).strip() + '\n'
+
+
+# A '/' after one of these (or at the start) begins a regex literal, not a division.
+_REGEX_PRECEDERS = set('(,=:[!&|?{};+-*%<>~^')
+_REGEX_KEYWORDS = ('return', 'typeof', 'case', 'do', 'else', 'in', 'of', 'void', 'yield', 'await')
+
+
+def _regex_allowed(out):
+    code = ''.join(out[-64:]).rstrip()
+    if not code:
+        return True
+    if code[-1] in _REGEX_PRECEDERS:
+        return True
+    return re.search(r'(?:^|[^\w$])(?:' + '|'.join(_REGEX_KEYWORDS) + r')$', code) is not None
+
+
+def minify_js(text):
+    """Strips comments, indentation and blank lines. Strings, templates and regexes are copied verbatim."""
+    out, i, n = [], 0, len(text)
+    while i < n:
+        c = text[i]
+        if c in '"\'`':
+            j = i + 1
+            while j < n and text[j] != c:
+                j += 2 if text[j] == '\\' else 1
+            out.append(text[i:j + 1])
+            i = j + 1
+        elif text.startswith('//', i):
+            j = text.find('\n', i)
+            i = n if j == -1 else j
+        elif text.startswith('/*', i):
+            j = text.find('*/', i + 2)
+            i = n if j == -1 else j + 2
+            out.append(' ')
+        elif c == '/' and _regex_allowed(out):
+            j, in_class = i + 1, False
+            while j < n and text[j] != '\n' and (in_class or text[j] != '/'):
+                if text[j] == '\\':
+                    j += 1
+                elif text[j] == '[':
+                    in_class = True
+                elif text[j] == ']':
+                    in_class = False
+                j += 1
+            out.append(text[i:j + 1])
+            i = j + 1
+        else:
+            out.append(c)
+            i += 1
+    lines = (line.strip() for line in ''.join(out).split('\n'))
+    return '\n'.join(line for line in lines if line) + '\n'
+
+
+# --- Build -------------------------------------------------------------------
+
+def _fingerprint(path, content):
+    base, ext = posixpath.splitext(path)
+    return f"{base}.{hashlib.sha256(content).hexdigest()[:12]}{ext}"
+
+
+def _rewrite_css_urls(text, source_path, manifest):
+    directory = posixpath.dirname(source_path)
+
+    def replace(match):
+        target = match.group(2).strip()
+        if re.match(r'^(?:[a-z]+:|//|#|/)', target):
+            return match.group(0)
+        resolved = posixpath.normpath(posixpath.join(directory, target))
+        if resolved not in manifest:
+            return match.group(0)
+        return f"url('{posixpath.relpath(manifest[resolved], directory)}')"
+
+    return _CSS_URL.sub(replace, text)
+
+
+def optimize_image(content, ext):
+    """
+    Re-encodes JPEG (same quantisation, progressive, Huffman-optimised) and PNG
+    (optimised deflate) without metadata. Returns whichever bytes are smaller.
+    """
+    try:
+        with Image.open(BytesIO(content)) as image:
+            out = BytesIO()
+            if ext in ('.jpg', '.jpeg'):
+                image.save(out, 'JPEG', quality='keep', optimize=True, progressive=True)
+            else:
+                image.save(out, 'PNG', optimize=True)
+    except Exception as e:
+        print(f"Could not optimize image: {e}")
+        return content
+    return out.getvalue() if len(out.getvalue()) < len(content) else content
+
+
+def _write(relative, content):
+    path = os.path.join(BUILD_DIR, *relative.split('/'))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(content)
+    return path
+
+
+def _precompress(relative, content):
+    """Writes .gz/.br siblings where they actually save bytes. Returns the suffixes written."""
+    written = []
+    variants = [('.gz', gzip.compress(content, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(content, quality=11)))
+    for suffix, compressed in variants:
+        if len(compressed) < len(content) * 0.9:
+            _write(relative + suffix, compressed)
+            written.append(suffix)
+    return written
+
+
+def build():
+    """Rebuilds static/dist from scratch. Returns the manifest."""
+    if os.path.isdir(BUILD_DIR):
+        shutil.rmtree(BUILD_DIR)
+    manifest = {}
+    for directory in SOURCE_DIRS:
+        root = os.path.join(STATIC_DIR, directory)
+        for dirpath, dirnames, filenames in os.walk(root):
+            # User uploads are not build inputs.
+            dirnames[:] = [name for name in sorted(dirnames) if name != 'profile_photos']
+            for filename in sorted(filenames):
+                relative = posixpath.relpath(os.path.join(dirpath, filename).replace(os.sep, '/'),
+                                             STATIC_DIR.replace(os.sep, '/'))
+                with open(os.path.join(dirpath, filename), 'rb') as f:
+                    content = f.read()
+                ext = posixpath.splitext(filename)[1].lower()
+                if ext == '.css':
+                    text = _rewrite_css_urls(content.decode('utf-8'), relative, manifest)
+                    content = minify_css(text).encode('utf-8')
+                elif ext == '.js':
+                    content = minify_js(content.decode('utf-8')).encode('utf-8')
+                elif ext in IMAGE_EXTENSIONS:
+                    content = optimize_image(content, ext)
+                built = _fingerprint(relative, content)
+                _write(built, content)
+                if ext in TEXT_EXTENSIONS:
+                    _precompress(built, content)
+                manifest[relative] = built
+    _write('manifest.json', json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+    return manifest
+
+
+# --- Runtime -----------------------------------------------------------------
+
+def load_manifest():
+    global _manifest, _built
+    try:
+        with open(MANIFEST_PATH, encoding='utf-8') as f:
+            _manifest = json.load(f)
+    except (OSError, ValueError):
+        _manifest = {}
+    _built = set(_manifest.values())
+    return _manifest
+
+
+def asset_url(filename):
+    """Drop-in for url_for('static', filename=...) that prefers the built, fingerprinted file."""
+    built = _manifest.get(filename)
+    if built is None:
+        return url_for('static', filename=filename)
+    return url_for('asset', filename=built)
+
+
+def serve_asset(filename):
+    if filename not in _built:
+        abort(404)
+    path = os.path.join(BUILD_DIR, *filename.split('/'))
+    chosen, encoding = path, None
+    for name, suffix in ENCODINGS:
+        if request.accept_encodings[name] and os.path.exists(path + suffix):
+            chosen, encoding = path + suffix, name
+            break
+    response = send_file(chosen, mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+                         max_age=CACHE_MAX_AGE, conditional=True, etag=True)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def init_app(app):
+    load_manifest()
+    app.add_template_global(asset_url)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build fingerprinted, precompressed static assets.")
+    parser.add_argument('command', choices=['build'])
+    parser.parse_args()
+
+    manifest = build()
+    print(f"Built {len(manifest)} assets into {BUILD_DIR}" +
+          ("" if brotli else " (brotli not installed: gzip only)") + ".")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Chart series for the dashboard, built from the daily_summaries rollups.
+
+The same series feed both the JSON chart API (rendered in the browser by
+Chart.js) and the legacy server-rendered PNG mode.
+"""
+from datetime import timedelta
+
+import summaries
+
+SERIES = {
+    # name: (title, y-axis label, colour, default window in days, summary column)
+    'weight': ("Weight Progress", "Weight (kg)", "#4f46e5", 30, 'last_weight'),
+    'calories': ("Calorie Trend", "Calories (kcal)", "#10b981", 7, 'calories_in'),
+    'burn': ("Calories Burned", "Calories (kcal)", "#f59e0b", 7, 'calories_burned'),
+    'macros': ("Macros", "Grams", None, 7, None),
+}
+
+MACRO_COLORS = {'protein': "#6366f1", 'carbs': "#14b8a6", 'fat': "#f43f5e"}
+
+MAX_DAYS = 365
+
+
+def build_series(user_id, series, today, days=None, daily=None):
+    """
+    Returns a Chart.js-ready payload: {'series', 'title', 'type', 'empty', 'data'}.
+    Raises KeyError for an unknown series. `daily` may carry summary rows the
+    caller already fetched for a range covering the window.
+    """
+    title, label, color, default_days, column = SERIES[series]
+    days = max(1, min(int(days or default_days), MAX_DAYS))
+    first_day = today - timedelta(days=days - 1)
+    if daily is None:
+        daily = summaries.get_range(user_id, first_day, today)
+    all_days = [first_day + timedelta(days=i) for i in range(days)]
+
+    if series == 'weight':
+        # Only days with a weigh-in are plotted; a flat line through gaps would be misleading.
+        points = [(day, float(daily[day]['last_weight'])) for day in all_days
+                  if day in daily and daily[day]['weight_count']]
+        labels = [day.strftime('%b %d') for day, _ in points]
+        datasets = [{'label': label, 'data': [value for _, value in points], 'borderColor': color}]
+        empty = len(points) < 2
+        chart_type = 'line'
+    elif series == 'macros':
+        labels = [day.strftime('%b %d') for day in all_days]
+        datasets = [
+            {'label': macro.title(), 'data': [float(daily[day][macro]) if day in daily else 0 for day in all_days],
+             'backgroundColor': macro_color}
+            for macro, macro_color in MACRO_COLORS.items()
+        ]
+        empty = not any(value for dataset in datasets for value in dataset['data'])
+        chart_type = 'bar'
+    else:
+        labels = [day.strftime('%b %d') for day in all_days]
+        values = [float(daily[day][column]) if day in daily else 0 for day in all_days]
+        datasets = [{'label': label, 'data': values, 'borderColor': color}]
+        empty = not any(values)
+        chart_type = 'line'
+
+    return {
+        'series': series,
+        'title': f"{title} ({days} Days)",
+        'type': chart_type,
+        'empty': empty,
+        'data': {'labels': labels, 'datasets': datasets},
+    }
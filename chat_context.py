@@ -0,0 +1,140 @@
+"""
+Token-budgeted context windows for the FitBot chat.
+
+Only the newest turns that fit in CHAT_CONTEXT_TOKENS are sent to the model.
+Older turns are folded into a rolling summary (the chat_summaries table) by a
+background thread and sent as one short system message instead, so long
+conversations cost about the same per message as short ones. Turns covered by
+the summary are also dropped from the session, which keeps the cookie small.
+
+Session keys: `chat_key` (this chat's id), `chat_history` (uncovered turns)
+and `chat_offset` (turn number of chat_history[0]). Turns are numbered per
+chat session, so the summary cursor is too: chat_summaries has one row per
+(user_id, chat_key), and two devices never move each other's cursor. A new
+chat starts from the user's most recent summary, so FitBot keeps its memory
+of the user across logins. Rows idle for SUMMARY_KEEP_DAYS are pruned.
+"""
+import re
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from ai_integration import summarize_chat
+from database import db
+
+_TAGS = re.compile(r'<[^>]+>')
+
+SUMMARY_KEEP_DAYS = 30
+
+_fold_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='chat-fold')
+_folding = set()  # (user_id, chat_key) with a fold in flight
+_folding_lock = threading.Lock()
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (~4 characters per token, HTML tags ignored)."""
+    return len(_TAGS.sub('', text or '')) // 4 + 4
+
+
+def new_chat_key():
+    return secrets.token_hex(16)
+
+
+def _load_summary(user_id, chat_key):
+    """This chat's summary row; a chat without one starts from the user's latest summary, covering nothing."""
+    row = db.execute_query(
+        "SELECT summary, covered_until, covered_tokens FROM chat_summaries WHERE user_id = %s AND chat_key = %s",
+        (user_id, chat_key), fetch_one=True
+    )
+    if row:
+        return row
+    latest = db.execute_query(
+        "SELECT summary FROM chat_summaries WHERE user_id = %s ORDER BY updated_at DESC LIMIT 1",
+        (user_id,), fetch_one=True
+    )
+    return {'summary': latest['summary'] if latest else '', 'covered_until': 0, 'covered_tokens': 0}
+
+
+def _fold(user_id, chat_key, turns, start, end, covered_tokens):
+    """Background job: merges turns [start, end) into this chat's rolling summary."""
+    try:
+        previous = _load_summary(user_id, chat_key)
+        if previous['covered_until'] != start:
+            return  # another worker already folded this range
+        summary = summarize_chat(previous['summary'], turns)
+        if not summary:
+            return
+        db.execute_query(
+            """INSERT INTO chat_summaries (user_id, chat_key, summary, covered_until, covered_tokens)
+               VALUES (%s, %s, %s, %s, %s)
+               ON DUPLICATE KEY UPDATE
+                   summary = IF(covered_until = %s, VALUES(summary), summary),
+                   covered_tokens = IF(covered_until = %s, VALUES(covered_tokens), covered_tokens),
+                   covered_until = IF(covered_until = %s, VALUES(covered_until), covered_until)""",
+            (user_id, chat_key, summary, end, covered_tokens, start, start, start), commit=True
+        )
+        db.execute_query(
+            "DELETE FROM chat_summaries WHERE user_id = %s AND updated_at < NOW() - INTERVAL %s DAY",
+            (user_id, SUMMARY_KEEP_DAYS), commit=True
+        )
+    except Exception as e:
+        print(f"Chat summary fold failed: {e}")
+    finally:
+        with _folding_lock:
+            _folding.discard((user_id, chat_key))
+
+
+def build_window(user_id, chat_key, history, offset, budget):
+    """
+    Returns a dict with:
+      messages      - what to send after the system prompt
+      history       - the session's chat_history with summarised turns removed
+      offset        - the new chat_offset
+      tokens_saved  - prompt tokens avoided versus sending the whole conversation
+    """
+    state = _load_summary(user_id, chat_key)
+    covered_until = state['covered_until']
+    if offset is None or covered_until >= offset + len(history):
+        # A new session: its turns follow whatever the summary already covers.
+        offset = covered_until
+    elif covered_until < offset:
+        # The chat's summary row was pruned; nothing the session holds is summarised.
+        covered_until, state = offset, {'summary': '', 'covered_until': offset, 'covered_tokens': 0}
+    if covered_until > offset:
+        history = history[covered_until - offset:]
+        offset = covered_until
+
+    summary_message = []
+    if state['summary']:
+        summary_message = [{"role": "system", "content": f"Summary of the earlier conversation: {state['summary']}"}]
+    remaining = budget - sum(estimate_tokens(m['content']) for m in summary_message)
+
+    # Newest turns first; the latest user message is always kept.
+    kept = 0
+    for turn in reversed(history):
+        cost = estimate_tokens(turn['content'])
+        if kept and cost > remaining:
+            break
+        remaining -= cost
+        kept += 1
+    recent = history[len(history) - kept:]
+    overflow = history[:len(history) - kept]
+
+    overflow_tokens = sum(estimate_tokens(turn['content']) for turn in overflow)
+    if overflow:
+        with _folding_lock:
+            schedule = (user_id, chat_key) not in _folding
+            if schedule:
+                _folding.add((user_id, chat_key))
+        if schedule:
+            _fold_pool.submit(_fold, user_id, chat_key, list(overflow), offset, offset + len(overflow),
+                              state['covered_tokens'] + overflow_tokens)
+
+    summary_tokens = sum(estimate_tokens(m['content']) for m in summary_message)
+    tokens_saved = max(0, state['covered_tokens'] + overflow_tokens - summary_tokens)
+    return {
+        'messages': summary_message + recent,
+        'history': history,
+        'offset': offset,
+        'tokens_saved': tokens_saved,
+    }
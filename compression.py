@@ -0,0 +1,154 @@
+"""
+Response compression and conditional GETs.
+
+`init_app` installs an after_request hook that, for compressible types
+(HTML, JSON, CSS, JS, CSV, plain text):
+
+  * gives buffered 200 GET responses without an ETag a weak ETag over the
+    uncompressed body and answers a matching If-None-Match with 304;
+  * compresses bodies of at least COMPRESS_MIN_SIZE bytes with brotli (when
+    the optional `brotli` package is installed) or gzip, whichever the client
+    prefers; streamed responses (the CSV exports) are compressed chunk by
+    chunk without buffering.
+
+Server-sent events (text/event-stream), files from send_file and responses
+that already carry a Content-Encoding (the prebuilt /assets) pass through
+untouched.
+
+A 304 computed from the body still costs the full render. Views whose output
+is a function of cheap inputs can skip the work instead with
+`@conditional(key_func)`: key_func(**view_args) returns those inputs (e.g. a
+data stamp), and a matching If-None-Match is answered before the view runs.
+"""
+import hashlib
+import zlib
+from functools import wraps
+
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = {
+    'text/html', 'text/css', 'text/plain', 'text/csv', 'text/javascript',
+    'application/json', 'application/javascript', 'image/svg+xml',
+}
+
+
+class _GzipStream:
+    def __init__(self, level):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31: gzip container
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class _BrotliStream:
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+def _choose_encoding():
+    accepted = request.accept_encodings
+    candidates = [('br', accepted['br'])] if brotli is not None else []
+    candidates.append(('gzip', accepted['gzip']))
+    encoding, quality = max(candidates, key=lambda candidate: candidate[1])
+    return encoding if quality > 0 else None
+
+
+def _compressor(encoding, config):
+    if encoding == 'br':
+        return _BrotliStream(config.get('COMPRESS_BROTLI_QUALITY', 4))
+    return _GzipStream(config.get('COMPRESS_LEVEL', 6))
+
+
+def _compressible(response):
+    if response.direct_passthrough or 'Content-Encoding' in response.headers:
+        return False
+    if response.status_code < 200 or response.status_code in (204, 206, 304):
+        return False
+    if 'no-transform' in (response.headers.get('Cache-Control') or ''):
+        return False
+    return response.mimetype in COMPRESSIBLE_TYPES
+
+
+def _stream(body, compressor, charset):
+    try:
+        for chunk in body:
+            if isinstance(chunk, str):
+                chunk = chunk.encode(charset)
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.finish()
+    finally:
+        if hasattr(body, 'close'):
+            body.close()
+
+
+def compress_response(response):
+    if not _compressible(response):
+        return response
+    response.vary.add('Accept-Encoding')
+    config = current_app.config
+
+    if not response.is_streamed:
+        if response.status_code == 200 and request.method in ('GET', 'HEAD'):
+            if 'ETag' not in response.headers:
+                response.add_etag(weak=True)
+            response.make_conditional(request)
+        if response.status_code == 304 or request.method == 'HEAD':
+            return response
+        if response.content_length is not None and response.content_length < config.get('COMPRESS_MIN_SIZE', 500):
+            return response
+
+    encoding = _choose_encoding()
+    if encoding is None:
+        return response
+    compressor = _compressor(encoding, config)
+    if response.is_streamed:
+        response.response = _stream(response.response, compressor, getattr(response, 'charset', 'utf-8'))
+        response.headers.pop('Content-Length', None)
+    else:
+        response.set_data(compressor.compress(response.get_data()) + compressor.finish())
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def conditional(key_func):
+    """
+    Lets a GET view answer If-None-Match before doing its work. The weak ETag
+    is a hash of key_func(**view_args), which must change whenever the
+    response would.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = repr(key_func(**kwargs)).encode('utf-8')
+            etag = hashlib.sha1(key).hexdigest()
+            if request.if_none_match.contains_weak(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            response.headers.setdefault('Cache-Control', 'private, no-cache')
+            return response
+        return wrapper
+    return decorator
+
+
+def init_app(app):
+    app.after_request(compress_response)
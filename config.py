@@ -13,8 +13,61 @@ class Config:
     DB_PASSWORD = os.getenv('DB_PASSWORD', '')
     
     UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'images', 'profile_photos')
-    ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+    ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
     GROQ_API_KEY = os.getenv('GROQ_API_KEY')
+
+    # 'client' draws dashboard charts in the browser from /api/charts/<series>;
+    # 'server' embeds matplotlib PNGs in the page.
+    CHART_RENDER_MODE = os.getenv('CHART_RENDER_MODE', 'client')
+
+    # Daily plan generation: 'inprocess' thread pool, or 'external' to leave
+    # jobs in the plan_jobs table for `python plan_jobs.py worker`.
+    PLAN_QUEUE_MODE = os.getenv('PLAN_QUEUE_MODE', 'inprocess')
+    PLAN_WORKERS = int(os.getenv('PLAN_WORKERS', 4))
+
+    # Groq gateway: default per-call deadline (seconds, all retries included),
+    # retry count, concurrent calls per process, circuit breaker and hedging
+    # (seconds before a duplicate request is sent; 0 disables).
+    AI_TIMEOUT = float(os.getenv('AI_TIMEOUT', 15))
+    AI_RETRIES = int(os.getenv('AI_RETRIES', 2))
+    AI_MAX_CONCURRENCY = int(os.getenv('AI_MAX_CONCURRENCY', 8))
+    AI_BREAKER_THRESHOLD = int(os.getenv('AI_BREAKER_THRESHOLD', 5))
+    AI_BREAKER_COOLDOWN = float(os.getenv('AI_BREAKER_COOLDOWN', 30))
+    AI_HEDGE_AFTER = float(os.getenv('AI_HEDGE_AFTER', 0))
+
+    # Estimated prompt tokens of chat history sent per message; older turns
+    # are replaced by a rolling summary.
+    CHAT_CONTEXT_TOKENS = int(os.getenv('CHAT_CONTEXT_TOKENS', 1500))
+
+    # Session storage: 'cookie' (Flask's signed cookie), 'sqlite' (single node)
+    # or 'mysql' (shared `sessions` table). SESSION_TTL is the idle lifetime
+    # of server-side sessions, in seconds.
+    SESSION_BACKEND = os.getenv('SESSION_BACKEND', 'cookie')
+    SESSION_SQLITE_PATH = (os.getenv('SESSION_SQLITE_PATH')
+                           or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sessions.sqlite3'))
+    SESSION_TTL = int(os.getenv('SESSION_TTL', 7 * 24 * 3600))
+
+    # Quotes generated per IST day; users are spread across them by id.
+    QUOTE_POOL_SIZE = int(os.getenv('QUOTE_POOL_SIZE', 5))
+
+    # Seconds a loaded user row is reused by the login user_loader (0 disables).
+    USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', 30))
+
+    # Profile photo uploads: size limit and background encoding threads.
+    PHOTO_MAX_BYTES = int(os.getenv('PHOTO_MAX_BYTES', 10 * 1024 * 1024))
+    PHOTO_WORKERS = int(os.getenv('PHOTO_WORKERS', 2))
+
+    # Response compression: bodies smaller than COMPRESS_MIN_SIZE bytes are
+    # sent as-is; brotli is used when installed and accepted, else gzip.
+    COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 500))
+    COMPRESS_LEVEL = int(os.getenv('COMPRESS_LEVEL', 6))
+    COMPRESS_BROTLI_QUALITY = int(os.getenv('COMPRESS_BROTLI_QUALITY', 4))
+
+    # /metrics (Prometheus text format) requires "Authorization: Bearer
+    # <METRICS_TOKEN>" and returns 404 while it is unset. Requests slower than
+    # SLOW_REQUEST_SECONDS are logged with their queries (0 disables).
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+    SLOW_REQUEST_SECONDS = float(os.getenv('SLOW_REQUEST_SECONDS', 0))
     
     @staticmethod
     def init_app(app):
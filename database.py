@@ -2,40 +2,213 @@ import mysql.connector
 from mysql.connector import Error
 from contextlib import contextmanager
 import os
+import queue
+import threading
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
 
+
+class PoolTimeout(Error):
+    """Raised when no pooled connection frees up within the checkout timeout."""
+
+
+class ConnectionPool:
+    """
+    A fixed-size, thread-safe pool of MySQL connections.
+
+    Connections are opened lazily up to `size`. A checkout waits at most
+    `timeout` seconds for a free connection, and any connection that has been
+    idle for longer than `ping_interval` seconds is pinged (and reconnected if
+    the server dropped it) before being handed out.
+    """
+
+    def __init__(self, size=5, timeout=10, ping_interval=30, **connect_args):
+        self.size = size
+        self.timeout = timeout
+        self.ping_interval = ping_interval
+        self.connect_args = connect_args
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._opened = 0
+
+    def _open(self):
+        return mysql.connector.connect(**self.connect_args)
+
+    def acquire(self):
+        try:
+            connection, last_used = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_open = self._opened < self.size
+                if can_open:
+                    self._opened += 1
+            if can_open:
+                try:
+                    return self._open()
+                except Exception:
+                    with self._lock:
+                        self._opened -= 1
+                    raise
+            try:
+                connection, last_used = self._idle.get(timeout=self.timeout)
+            except queue.Empty:
+                raise PoolTimeout(f"No database connection available after {self.timeout}s (pool size {self.size})")
+
+        if time.monotonic() - last_used >= self.ping_interval:
+            try:
+                connection.ping(reconnect=True, attempts=3, delay=0.5)
+            except Exception:
+                self._discard(connection)
+                return self.acquire()
+        return connection
+
+    def release(self, connection):
+        try:
+            # A read leaves a transaction (and its snapshot) open; end it so the
+            # next borrower sees fresh data and no half-finished writes.
+            if connection.in_transaction:
+                connection.rollback()
+        except Exception:
+            self._discard(connection)
+            return
+        self._idle.put((connection, time.monotonic()))
+
+    def _discard(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._opened -= 1
+
+    def close_all(self):
+        while True:
+            try:
+                connection, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(connection)
+
+
 class Database:
     def __init__(self):
-        self.connection = None
-        self.connect()
-
-    def connect(self):
-        self.connection = mysql.connector.connect(
+        self.pool = ConnectionPool(
+            size=int(os.getenv('DB_POOL_SIZE', 5)),
+            timeout=float(os.getenv('DB_POOL_TIMEOUT', 10)),
+            ping_interval=float(os.getenv('DB_PING_INTERVAL', 30)),
             host=os.getenv('DB_HOST', 'localhost'),
             database=os.getenv('DB_NAME', 'fitness_tracker'),
             user=os.getenv('DB_USER', 'root'),
             password=os.getenv('DB_PASSWORD', '')
         )
+        self._local = threading.local()
+        self._query_listeners = []
+
+    def add_query_listener(self, listener):
+        """Calls listener(query, seconds) after every execute_query/stream query (used by metrics)."""
+        self._query_listeners.append(listener)
+
+    def _notify(self, query, started):
+        seconds = time.perf_counter() - started
+        for listener in self._query_listeners:
+            listener(query, seconds)
+
+    def init_app(self, app):
+        """Reuse one pooled connection per request and return it on teardown."""
+        @app.before_request
+        def _bind_request_connection():
+            self._local.request_scoped = True
+
+        @app.teardown_request
+        def _release_request_connection(exc=None):
+            self._local.request_scoped = False
+            connection = getattr(self._local, 'connection', None)
+            self._local.connection = None
+            if connection is not None:
+                self.pool.release(connection)
 
     @contextmanager
-    def get_cursor(self):
-        cursor = self.connection.cursor(dictionary=True)
+    def connection(self):
+        """
+        Yields a connection. Inside a request the same connection is reused for
+        every query; outside one (scripts, background threads) each block checks
+        a connection out of the pool and returns it afterwards.
+        """
+        if getattr(self._local, 'request_scoped', False):
+            if getattr(self._local, 'connection', None) is None:
+                self._local.connection = self.pool.acquire()
+            yield self._local.connection
+            return
+
+        connection = self.pool.acquire()
         try:
-            yield cursor
+            yield connection
         finally:
-            cursor.close()
+            self.pool.release(connection)
+
+    @contextmanager
+    def get_cursor(self):
+        with self.connection() as connection:
+            cursor = connection.cursor(dictionary=True, buffered=True)
+            try:
+                yield cursor
+            except Exception:
+                connection.rollback()
+                raise
+            finally:
+                cursor.close()
 
     def execute_query(self, query, params=None, fetch_one=False, fetch_all=False, commit=False):
-        with self.get_cursor() as cursor:
+        started = time.perf_counter() if self._query_listeners else None
+        with self.connection() as connection:
+            cursor = connection.cursor(dictionary=True, buffered=True)
+            try:
+                cursor.execute(query, params or ())
+                if commit: connection.commit()
+                if fetch_one: return cursor.fetchone()
+                if fetch_all: return cursor.fetchall()
+            except Exception:
+                connection.rollback()
+                raise
+            finally:
+                cursor.close()
+                if started is not None:
+                    self._notify(query, started)
+
+    def stream(self, query, params=None, batch_size=1000):
+        """
+        Yields rows from an unbuffered cursor, `batch_size` at a time from the
+        server, so memory stays flat however many rows match. Uses its own
+        pooled connection, since an unbuffered result blocks its connection
+        until fully read.
+        """
+        connection = self.pool.acquire()
+        cursor = connection.cursor(dictionary=True, buffered=False)
+        finished = False
+        try:
+            started = time.perf_counter() if self._query_listeners else None
             cursor.execute(query, params or ())
-            if commit: self.connection.commit()
-            if fetch_one: return cursor.fetchone()
-            if fetch_all: return cursor.fetchall()
+            if started is not None:
+                # Time to the first result only; the rest is paced by the consumer.
+                self._notify(query, started)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield from rows
+            finished = True
+        finally:
+            if finished:
+                cursor.close()
+                self.pool.release(connection)
+            else:
+                # Closed early (e.g. the client went away): draining the rest of
+                # the result would defeat the point, so drop the connection.
+                self.pool._discard(connection)
 
     def close(self):
-        if self.connection and self.connection.is_connected():
-            self.connection.close()
+        self.pool.close_all()
 
 db = Database()
@@ -1,9 +1,18 @@
 from fpdf import FPDF
+import csv
+import tempfile
 import openpyxl
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font, Alignment, PatternFill
-from io import BytesIO
+from openpyxl.utils import get_column_letter
+from io import BytesIO, StringIO
 
-def create_plan_pdf(user, diet_plan_html, workout_plan_html):
+import metrics
+from database import db
+from importer import KINDS
+
+@metrics.EXPORT_SECONDS.time(format='pdf')
+def create_plan_pdf(user, diet_items, workout_items):
     """Generates a PDF of the simple AI-generated daily plans."""
     pdf = FPDF()
     pdf.add_page()
@@ -14,89 +23,112 @@ def create_plan_pdf(user, diet_plan_html, workout_plan_html):
     pdf.set_font("Arial", 'B', 14)
     pdf.cell(0, 10, "Today's Diet Plan", 0, 1)
     pdf.set_font("Arial", '', 12)
-    for item in diet_plan_html.split('</li>'):
-        if 'plan-item' in item:
-            try:
-                name = item.split('<div class="item-name">')[1].split('</div>')[0]
-                info = item.split('<div class="item-info">')[1].split('</div>')[0]
-                pdf.cell(0, 8, f"- {name.strip()} ({info.strip()})", 0, 1)
-            except IndexError:
-                continue
+    for item in diet_items or []:
+        pdf.cell(0, 8, f"- {item['category']}: {item['name']} ({float(item['calories']):.0f} kcal)", 0, 1)
     pdf.ln(10)
 
     pdf.set_font("Arial", 'B', 14)
     pdf.cell(0, 10, "Today's Workout Plan", 0, 1)
     pdf.set_font("Arial", '', 12)
-    for item in workout_plan_html.split('</li>'):
-        if 'plan-item' in item:
-            try:
-                name = item.split('<div class="item-name">')[1].split('</div>')[0]
-                info = item.split('<div class="item-info">')[1].split('</div>')[0]
-                pdf.cell(0, 8, f"- {name.strip()} ({info.strip()})", 0, 1)
-            except IndexError:
-                continue
+    for item in workout_items or []:
+        pdf.cell(0, 8, f"- {item['category']}: {item['name']} ({float(item['calories']):.0f} kcal burned)", 0, 1)
 
     return pdf.output(dest='S').encode('latin-1')
 
 
-def create_daily_plan_excel(diet_plan_html, workout_plan_html):
+@metrics.EXPORT_SECONDS.time(format='xlsx')
+def create_daily_plan_excel(diet_items, workout_items):
     """Generates an Excel file of the simple AI-generated daily plan."""
     workbook = openpyxl.Workbook()
-    
-    diet_sheet = workbook.active
-    diet_sheet.title = "Today's Diet Plan"
-    diet_headers = ["Meal", "To Be Eaten", "Calories"]
-    diet_sheet.append(diet_headers)
-
-    for item in diet_plan_html.split('</li>'):
-        if 'plan-item' in item:
-            try:
-                full_name = item.split('<div class="item-name">')[1].split('</div>')[0].strip()
-                calories = item.split('<div class="item-info">')[1].split(' kcal</div>')[0].strip()
-                parts = full_name.split(': ', 1)
-                meal_type = parts[0]
-                food_name = parts[1] if len(parts) > 1 else ''
-                diet_sheet.append([meal_type, food_name, int(calories)])
-            except (IndexError, ValueError):
-                continue
-
-    workout_sheet = workbook.create_sheet("Today's Workout Plan")
-    workout_headers = ["Category", "Exercise", "Calories Burned"]
-    workout_sheet.append(workout_headers)
-
-    for item in workout_plan_html.split('</li>'):
-        if 'plan-item' in item:
-            try:
-                full_name = item.split('<div class="item-name">')[1].split('</div>')[0].strip()
-                calories = item.split('<div class="item-info">')[1].split(' kcal burned</div>')[0].strip()
-                parts = full_name.split(': ', 1)
-                category = parts[0]
-                exercise = parts[1] if len(parts) > 1 else ''
-                workout_sheet.append([category, exercise, int(calories)])
-            except (IndexError, ValueError):
-                continue
-
-    # --- THIS IS THE COMPLETE STYLING CODE ---
+    sheets = [
+        (workbook.active, "Today's Diet Plan", ["Meal", "To Be Eaten", "Calories"], diet_items),
+        (workbook.create_sheet(), "Today's Workout Plan", ["Category", "Exercise", "Calories Burned"], workout_items),
+    ]
+
     header_font = Font(bold=True, color="FFFFFF")
     header_fill = PatternFill(start_color="14B8A6", end_color="14B8A6", fill_type="solid")
-    for sheet in workbook.worksheets:
+    for sheet, title, headers, items in sheets:
+        sheet.title = title
+        sheet.append(headers)
+        # Column widths are tracked while appending instead of rescanning every cell.
+        widths = [len(header) for header in headers]
+        for item in items or []:
+            row = [item['category'], item['name'], int(item['calories'])]
+            sheet.append(row)
+            widths = [max(width, len(str(value))) for width, value in zip(widths, row)]
         for cell in sheet[1]:
             cell.font = header_font
             cell.fill = header_fill
             cell.alignment = Alignment(horizontal='center')
-        for col in sheet.columns:
-            max_length = 0
-            column = col[0].column_letter
-            for cell in col:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = (max_length + 2)
-            sheet.column_dimensions[column].width = adjusted_width
+        for index, width in enumerate(widths, 1):
+            sheet.column_dimensions[get_column_letter(index)].width = width + 2
 
     excel_file = BytesIO()
     workbook.save(excel_file)
     excel_file.seek(0)
-    return excel_file
\ No newline at end of file
+    return excel_file
+
+
+# --- Full-history exports ---------------------------------------------------
+# Columns match importer.KINDS, so an exported CSV can be imported elsewhere.
+# Widths are fixed up front: write-only sheets cannot be measured after writing.
+
+HISTORY_SHEETS = {'meals': "Meals", 'workouts': "Workouts", 'weights': "Weights"}
+COLUMN_WIDTHS = {'date': 20, 'name': 40, 'type': 30, 'notes': 50}
+DEFAULT_COLUMN_WIDTH = 14
+CSV_CHUNK_BYTES = 64 * 1024
+
+
+def _history_rows(user_id, kind):
+    table, _, columns = KINDS[kind]
+    return db.stream(
+        f"SELECT {', '.join(columns)} FROM {table} WHERE user_id = %s ORDER BY date",
+        (user_id,)
+    )
+
+
+def stream_history_csv(user_id, kind):
+    """Yields one kind of log history as CSV text in ~64 KB chunks."""
+    columns = KINDS[kind][2]
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    # Includes time spent waiting on the client, since generation is paced by it.
+    with metrics.EXPORT_SECONDS.time(format='history_csv'):
+        for row in _history_rows(user_id, kind):
+            writer.writerow([row[column] for column in columns])
+            if buffer.tell() >= CSV_CHUNK_BYTES:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+
+@metrics.EXPORT_SECONDS.time(format='history_xlsx')
+def create_history_excel(user_id):
+    """
+    Writes every meal, workout and weight log to a write-only workbook (one
+    sheet each) in a temporary file, which is deleted once closed.
+    """
+    workbook = openpyxl.Workbook(write_only=True)
+    header_font = Font(bold=True, color="FFFFFF")
+    header_fill = PatternFill(start_color="14B8A6", end_color="14B8A6", fill_type="solid")
+
+    for kind, title in HISTORY_SHEETS.items():
+        columns = KINDS[kind][2]
+        sheet = workbook.create_sheet(title)
+        for index, column in enumerate(columns, 1):
+            sheet.column_dimensions[get_column_letter(index)].width = COLUMN_WIDTHS.get(column, DEFAULT_COLUMN_WIDTH)
+        header = []
+        for column in columns:
+            cell = WriteOnlyCell(sheet, value=column.replace('_', ' ').title())
+            cell.font, cell.fill, cell.alignment = header_font, header_fill, Alignment(horizontal='center')
+            header.append(cell)
+        sheet.append(header)
+        for row in _history_rows(user_id, kind):
+            sheet.append([row[column] for column in columns])
+
+    excel_file = tempfile.TemporaryFile()
+    workbook.save(excel_file)
+    excel_file.seek(0)
+    return excel_file
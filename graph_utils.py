@@ -4,11 +4,146 @@ import matplotlib
 matplotlib.use('Agg')
 
 import matplotlib.pyplot as plt
+import hashlib
 import io
 import base64
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
 
-def create_plot(dates, data, title, label, color):
-    """Creates a plot and returns it as a base64 encoded image string."""
+import metrics
+
+# Bump when the styling below changes so cached images are not reused.
+PLOT_STYLE_VERSION = 1
+
+
+class ChartCache:
+    """
+    Content-addressed cache for rendered charts.
+
+    Keys are a hash of everything that affects the image, so identical data
+    always maps to the same entry. The in-memory tier is an LRU bounded by total
+    bytes; the optional disk tier (a directory of <key>.png files) is shared by
+    every worker on the host and is trimmed oldest-first when it outgrows its
+    byte budget.
+    """
+
+    def __init__(self, max_memory_bytes=8 * 1024 * 1024, disk_dir=None, max_disk_bytes=64 * 1024 * 1024):
+        self.max_memory_bytes = max_memory_bytes
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._entries = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(*parts):
+        payload = json.dumps(parts, default=str, separators=(',', ':'))
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            png = self._entries.get(key)
+            if png is not None:
+                self._entries.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                return png
+
+        png = self._read_disk(key)
+        with self._lock:
+            if png is None:
+                self.stats['misses'] += 1
+                return None
+            self.stats['disk_hits'] += 1
+        self._remember(key, png)
+        return png
+
+    def put(self, key, png):
+        self._remember(key, png)
+        self._write_disk(key, png)
+
+    def _remember(self, key, png):
+        if len(png) > self.max_memory_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return
+            self._entries[key] = png
+            self._memory_bytes += len(png)
+            while self._memory_bytes > self.max_memory_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._memory_bytes -= len(evicted)
+                self.stats['evictions'] += 1
+
+    def _path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.png")
+
+    def _read_disk(self, key):
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self._path(key), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _write_disk(self, key, png):
+        if not self.disk_dir:
+            return
+        try:
+            tmp_path = f"{self._path(key)}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(png)
+            os.replace(tmp_path, self._path(key))
+            self._trim_disk()
+        except OSError as e:
+            print(f"Chart cache write failed: {e}")
+
+    def _trim_disk(self):
+        files = []
+        for name in os.listdir(self.disk_dir):
+            if name.endswith('.png'):
+                stat = os.stat(os.path.join(self.disk_dir, name))
+                files.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in files)
+        for _, size, name in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.disk_dir, name))
+                total -= size
+            except OSError:
+                pass
+
+    def info(self):
+        with self._lock:
+            return dict(self.stats, entries=len(self._entries), memory_bytes=self._memory_bytes)
+
+
+chart_cache = ChartCache(
+    max_memory_bytes=int(os.getenv('CHART_CACHE_MEMORY_BYTES', 8 * 1024 * 1024)),
+    disk_dir=os.getenv('CHART_CACHE_DIR') or None,
+    max_disk_bytes=int(os.getenv('CHART_CACHE_DISK_BYTES', 64 * 1024 * 1024)),
+)
+
+
+# pyplot keeps global state, so renders from concurrent request threads must not interleave.
+_render_lock = threading.Lock()
+
+
+def render_plot_png(dates, data, title, label, color):
+    """Renders the chart and returns the raw PNG bytes."""
+    with _render_lock:
+        return _render(dates, data, title, label, color)
+
+
+def _render(dates, data, title, label, color):
     plt.style.use('dark_background')
     fig, ax = plt.subplots(figsize=(8, 4))
 
@@ -31,7 +166,20 @@ def create_plot(dates, data, title, label, color):
     buf = io.BytesIO()
     fig.savefig(buf, format='png', bbox_inches='tight')
     plt.close(fig)
-    buf.seek(0)
-    
-    image_base64 = base64.b64encode(buf.read()).decode('utf-8')
-    return f"data:image/png;base64,{image_base64}"
\ No newline at end of file
+    return buf.getvalue()
+
+
+def create_plot(dates, data, title, label, color):
+    """Creates a plot and returns it as a base64 encoded image string."""
+    started = time.perf_counter()
+    key = ChartCache.make_key(PLOT_STYLE_VERSION, list(dates), list(data), title, label, color)
+    png = chart_cache.get(key)
+    cache = 'hit'
+    if png is None:
+        png = render_plot_png(dates, data, title, label, color)
+        chart_cache.put(key, png)
+        cache = 'miss'
+
+    image_base64 = base64.b64encode(png).decode('utf-8')
+    metrics.CHART_RENDER_SECONDS.observe(time.perf_counter() - started, cache=cache)
+    return f"data:image/png;base64,{image_base64}"
@@ -0,0 +1,231 @@
+"""
+Bulk import of meal, workout and weight history from other trackers.
+
+Rows arrive as CSV (header row), a JSON array or JSON Lines. They are
+validated and normalised one at a time while the file is read, and valid
+rows are written in batches of BATCH_SIZE with one multi-row INSERT and one
+commit per batch. Invalid rows are reported by line number and skipped.
+
+Imports are idempotent: each row carries a dedupe key (the `key` column, or
+a hash of the normalised row when absent) stored in `import_key`, and
+`INSERT IGNORE` against UNIQUE (user_id, import_key) skips rows that were
+already imported. Afterwards the user's daily summaries, streak and TDEE
+state are rebuilt once.
+
+    python importer.py meals export.csv --user 42 [--format csv|json|jsonl]
+"""
+import argparse
+import csv
+import hashlib
+import io
+import json
+from datetime import datetime
+
+import queries
+import streaks
+import summaries
+import tdee
+from database import db
+from migrations import migrate
+
+BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 200
+FORMATS = ('csv', 'json', 'jsonl')
+
+
+def _text(value, field, required=False, limit=255):
+    value = (str(value).strip() if value is not None else '')
+    if not value:
+        if required:
+            raise ValueError(f"{field} is required")
+        return None
+    return value[:limit]
+
+
+def _number(value, field, low, high, required=False):
+    if value is None or str(value).strip() == '':
+        if required:
+            raise ValueError(f"{field} is required")
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field} must be a number, got {value!r}")
+    if not low <= number <= high:
+        raise ValueError(f"{field} must be between {low} and {high}")
+    return round(number, 2)
+
+
+def _timestamp(value, now):
+    """Accepts ISO dates/datetimes; aware values are converted to IST wall-clock time."""
+    text = _text(value, 'date', required=True)
+    try:
+        moment = datetime.fromisoformat(text.replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError(f"date must be ISO formatted (YYYY-MM-DD[ HH:MM]), got {text!r}")
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(queries.IST).replace(tzinfo=None)
+    if moment > now:
+        raise ValueError("date is in the future")
+    return moment
+
+
+def _meal(row, now):
+    return {
+        'date': _timestamp(row.get('date'), now),
+        'name': _text(row.get('name'), 'name', required=True),
+        'calories': _number(row.get('calories'), 'calories', 0, 20000, required=True),
+        'protein': _number(row.get('protein'), 'protein', 0, 2000),
+        'carbs': _number(row.get('carbs'), 'carbs', 0, 2000),
+        'fat': _number(row.get('fat'), 'fat', 0, 2000),
+        'notes': _text(row.get('notes'), 'notes', limit=2000),
+    }
+
+
+def _workout(row, now):
+    duration = _number(row.get('duration'), 'duration', 0, 1440)
+    return {
+        'date': _timestamp(row.get('date'), now),
+        'type': _text(row.get('type'), 'type', required=True),
+        'duration': None if duration is None else int(duration),
+        'calories_burned': _number(row.get('calories_burned'), 'calories_burned', 0, 10000),
+        'notes': _text(row.get('notes'), 'notes', limit=2000),
+    }
+
+
+def _weight(row, now):
+    return {
+        'date': _timestamp(row.get('date'), now),
+        'weight': _number(row.get('weight'), 'weight', 20, 500, required=True),
+        'notes': _text(row.get('notes'), 'notes', limit=2000),
+    }
+
+
+# kind -> (table, validator, columns in insert order)
+KINDS = {
+    'meals': ('meal_logs', _meal, ('date', 'name', 'calories', 'protein', 'carbs', 'fat', 'notes')),
+    'workouts': ('workout_logs', _workout, ('date', 'type', 'duration', 'calories_burned', 'notes')),
+    'weights': ('weight_logs', _weight, ('date', 'weight', 'notes')),
+}
+
+
+def _dedupe_key(kind, row, values):
+    key = _text(row.get('key') or row.get('import_key'), 'key', limit=64)
+    if key:
+        return key
+    # No client key: identical rows (same kind, time and values) are the same entry.
+    canonical = json.dumps([kind] + [str(value) for value in values.values()])
+    return hashlib.sha1(canonical.encode()).hexdigest()
+
+
+def read_records(stream, fmt):
+    """Yields (line_number, dict) from a text stream without loading CSV/JSONL files whole."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == 'jsonl':
+        for number, line in enumerate(stream, 1):
+            if line.strip():
+                yield number, json.loads(line)
+    elif fmt == 'json':
+        for number, row in enumerate(json.load(stream), 1):
+            yield number, row
+    else:
+        raise ValueError(f"Unknown format: {fmt}")
+
+
+def _insert_batch(table, columns, batch):
+    with db.connection() as connection:
+        cursor = connection.cursor()
+        try:
+            cursor.executemany(
+                f"""INSERT IGNORE INTO {table} (user_id, import_key, {', '.join(columns)})
+                    VALUES ({', '.join(['%s'] * (len(columns) + 2))})""",
+                batch
+            )
+            connection.commit()
+            return cursor.rowcount
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            cursor.close()
+
+
+def import_records(user_id, kind, records, batch_size=BATCH_SIZE):
+    """
+    Imports (line_number, dict) records for one user. Returns a report:
+    {'kind', 'rows', 'inserted', 'duplicates', 'error_count', 'errors': [{'line', 'error'}]}.
+    """
+    table, validate, columns = KINDS[kind]
+    now = queries.ist_now().replace(tzinfo=None)
+    report = {'kind': kind, 'rows': 0, 'inserted': 0, 'duplicates': 0, 'error_count': 0, 'errors': []}
+    batch, valid = [], 0
+
+    def error(line, message):
+        report['error_count'] += 1
+        if len(report['errors']) < MAX_REPORTED_ERRORS:
+            report['errors'].append({'line': line, 'error': message})
+
+    try:
+        for line, row in records:
+            report['rows'] += 1
+            if not isinstance(row, dict):
+                error(line, "row is not an object")
+                continue
+            try:
+                values = validate(row, now)
+            except ValueError as e:
+                error(line, str(e))
+                continue
+            batch.append((user_id, _dedupe_key(kind, row, values)) + tuple(values[column] for column in columns))
+            valid += 1
+            if len(batch) >= batch_size:
+                report['inserted'] += _insert_batch(table, columns, batch)
+                batch = []
+    except (csv.Error, json.JSONDecodeError, UnicodeDecodeError) as e:
+        error(report['rows'] + 1, f"unreadable input: {e}")
+    if batch:
+        report['inserted'] += _insert_batch(table, columns, batch)
+    report['duplicates'] = valid - report['inserted']
+
+    if report['inserted']:
+        # Imported rows are back-dated, so rebuild derived state once rather than per row.
+        summaries.rebuild(user_id)
+        streaks.recompute(user_id)
+        tdee.recompute(user_id)
+    return report
+
+
+def import_stream(user_id, kind, stream, fmt, batch_size=BATCH_SIZE):
+    """Imports from a binary or text file object in the given format."""
+    if isinstance(stream.read(0), bytes):
+        stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    return import_records(user_id, kind, read_records(stream, fmt), batch_size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import meal, workout or weight history for a user.")
+    parser.add_argument('kind', choices=list(KINDS))
+    parser.add_argument('path')
+    parser.add_argument('--user', type=int, required=True)
+    parser.add_argument('--format', choices=FORMATS, help="Default: from the file extension")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    fmt = args.format or args.path.rsplit('.', 1)[-1].lower()
+    if fmt not in FORMATS:
+        parser.error("cannot tell the format from the file name; pass --format")
+    migrate()
+    with open(args.path, encoding='utf-8-sig', newline='') as f:
+        report = import_records(args.user, args.kind, read_records(f, fmt), args.batch_size)
+    for item in report.pop('errors'):
+        print(f"line {item['line']}: {item['error']}")
+    print(json.dumps(report))
+    if report['error_count']:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+"""
+Request-level performance metrics in the Prometheus text format.
+
+What is measured:
+  * latency of every request, by route, method and status;
+  * database queries per request and the time spent in them (via the query
+    listener hook in Database.execute_query / Database.stream);
+  * chart rendering in graph_utils.create_plot, by chart-cache hit or miss;
+  * export generation in export_utils, by format;
+  * Groq calls by ai_integration function and outcome (via the gateway's
+    call listener).
+
+`init_app` wires the hooks and the app serves `metrics.render()` at /metrics,
+which is disabled (404) until METRICS_TOKEN is set and then requires it as a
+bearer token. Values are per process: with several gunicorn workers each one
+reports its own counters.
+
+When SLOW_REQUEST_SECONDS is above zero, requests slower than that are
+printed with their queries and per-query times.
+"""
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+SLOW_QUERY_TEXT = 200  # characters of each query kept in the slow-request log
+
+_SPACE = re.compile(r'\s+')
+_registry = []
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (f'{name}="{_escape(value)}"' for name, value in pairs)
+    return '{' + ','.join(escaped) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name, self.documentation, self.labelnames = name, documentation, tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name, self.documentation, self.labelnames = name, documentation, tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observes the duration of a `with` block; also usable as a function decorator."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    labels = _format_labels(self.labelnames, key, [('le', _number(bound))])
+                    lines.append(f"{self.name}_bucket{labels} {count}")
+                labels = _format_labels(self.labelnames, key, [('le', '+Inf')])
+                lines.append(f"{self.name}_bucket{labels} {series[-1]}")
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {_number(series[-2])}")
+                lines.append(f"{self.name}_count{labels} {series[-1]}")
+        return lines
+
+
+REQUEST_SECONDS = Histogram('fittrack_http_request_duration_seconds', "Request latency.",
+                            ('route', 'method', 'status'))
+REQUEST_QUERIES = Histogram('fittrack_http_request_db_queries', "Database queries per request.",
+                            ('route',), buckets=COUNT_BUCKETS)
+REQUEST_DB_SECONDS = Histogram('fittrack_http_request_db_seconds', "Time spent in database queries per request.",
+                               ('route',))
+DB_QUERY_SECONDS = Histogram('fittrack_db_query_duration_seconds', "Database query latency by statement type.",
+                             ('statement',))
+CHART_RENDER_SECONDS = Histogram('fittrack_chart_render_seconds', "create_plot time by chart cache result.",
+                                 ('cache',))
+EXPORT_SECONDS = Histogram('fittrack_export_duration_seconds', "Export generation time by format.", ('format',))
+AI_CALL_SECONDS = Histogram('fittrack_ai_call_duration_seconds', "Groq call latency (all attempts).",
+                            ('function', 'outcome'))
+AI_CALLS = Counter('fittrack_ai_calls_total', "Groq calls by outcome (rejected calls never reach Groq).",
+                   ('function', 'outcome'))
+
+_slow_request_seconds = 0.0
+
+
+def render():
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def record_query(query, seconds):
+    """Database query listener: global histogram plus the current request's tally."""
+    statement = query.lstrip().split(None, 1)[0].lower() if query.strip() else ''
+    DB_QUERY_SECONDS.observe(seconds, statement=statement)
+    if has_request_context() and 'metrics_started' in g:
+        g.metrics_query_count += 1
+        g.metrics_query_seconds += seconds
+        if _slow_request_seconds > 0:
+            g.metrics_queries.append((_SPACE.sub(' ', query).strip()[:SLOW_QUERY_TEXT], seconds))
+
+
+def record_ai_call(function, outcome, seconds):
+    """AIGateway call listener."""
+    AI_CALLS.inc(function=function, outcome=outcome)
+    if seconds is not None:
+        AI_CALL_SECONDS.observe(seconds, function=function, outcome=outcome)
+
+
+def _start_request():
+    g.metrics_started = time.perf_counter()
+    g.metrics_query_count = 0
+    g.metrics_query_seconds = 0.0
+    g.metrics_queries = []
+
+
+def _remember_status(response):
+    g.metrics_status = response.status_code
+    return response
+
+
+def _finish_request(exc=None):
+    # Runs at teardown, i.e. after a streamed body has been sent.
+    started = g.pop('metrics_started', None)
+    if started is None:
+        return
+    seconds = time.perf_counter() - started
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    status = g.get('metrics_status', 500 if exc else 200)
+    REQUEST_SECONDS.observe(seconds, route=route, method=request.method, status=status)
+    REQUEST_QUERIES.observe(g.metrics_query_count, route=route)
+    REQUEST_DB_SECONDS.observe(g.metrics_query_seconds, route=route)
+
+    if 0 < _slow_request_seconds <= seconds:
+        print(f"Slow request: {request.method} {request.path} {status} took {seconds * 1000:.0f} ms "
+              f"({g.metrics_query_count} queries, {g.metrics_query_seconds * 1000:.0f} ms in DB)")
+        for query, query_seconds in g.metrics_queries:
+            print(f"    {query_seconds * 1000:8.1f} ms  {query}")
+
+
+def init_app(app, db, gateway):
+    global _slow_request_seconds
+    _slow_request_seconds = float(app.config.get('SLOW_REQUEST_SECONDS', 0) or 0)
+    db.add_query_listener(record_query)
+    gateway.add_listener(record_ai_call)
+    app.before_request(_start_request)
+    app.after_request(_remember_status)
+    app.teardown_request(_finish_request)
@@ -0,0 +1,371 @@
+"""
+Versioned schema for the FitTrack database.
+
+Each migration runs once and is recorded in `schema_migrations`, so the
+command below is safe to re-run on every deploy:
+
+    python migrations.py migrate     # apply pending migrations
+    python migrations.py status      # list applied / pending versions
+    python migrations.py explain     # fail if a hot query falls back to a full scan
+"""
+import argparse
+import html
+import re
+
+from database import db
+
+
+def add_index(table, name, columns, unique=False):
+    """Creates an index unless one with that name already exists (older hand-made schemas)."""
+    exists = db.execute_query(
+        """SELECT 1 FROM information_schema.statistics
+           WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s LIMIT 1""",
+        (table, name), fetch_one=True
+    )
+    if not exists:
+        db.execute_query(f"CREATE {'UNIQUE ' if unique else ''}INDEX {name} ON {table} ({columns})", commit=True)
+
+
+def add_column(table, name, definition):
+    exists = db.execute_query(
+        """SELECT 1 FROM information_schema.columns
+           WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s LIMIT 1""",
+        (table, name), fetch_one=True
+    )
+    if not exists:
+        db.execute_query(f"ALTER TABLE {table} ADD COLUMN {name} {definition}", commit=True)
+
+
+CORE_TABLES = [
+    """CREATE TABLE IF NOT EXISTS users (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        email VARCHAR(255) NOT NULL UNIQUE,
+        name VARCHAR(255) NOT NULL,
+        password VARCHAR(255) NOT NULL,
+        profile_photo VARCHAR(255) DEFAULT 'default.png',
+        age INT NULL,
+        gender VARCHAR(20) NULL,
+        height DECIMAL(5,2) NULL,
+        weight DECIMAL(5,2) NULL,
+        goal_weight DECIMAL(5,2) NULL,
+        diet_preference VARCHAR(50) NULL,
+        fitness_goal VARCHAR(50) NULL,
+        activity_level VARCHAR(50) NULL,
+        daily_calories INT NULL,
+        dark_mode BOOLEAN NOT NULL DEFAULT FALSE,
+        medical_conditions TEXT NULL,
+        past_surgeries TEXT NULL,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )""",
+    """CREATE TABLE IF NOT EXISTS meal_logs (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        user_id INT NOT NULL,
+        name VARCHAR(255) NOT NULL,
+        calories DECIMAL(8,2) NOT NULL DEFAULT 0,
+        protein DECIMAL(8,2) NULL,
+        carbs DECIMAL(8,2) NULL,
+        fat DECIMAL(8,2) NULL,
+        notes TEXT NULL,
+        date DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+    )""",
+    """CREATE TABLE IF NOT EXISTS workout_logs (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        user_id INT NOT NULL,
+        type VARCHAR(255) NOT NULL,
+        duration INT NULL,
+        calories_burned DECIMAL(8,2) NULL,
+        notes TEXT NULL,
+        date DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+    )""",
+    """CREATE TABLE IF NOT EXISTS weight_logs (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        user_id INT NOT NULL,
+        weight DECIMAL(5,2) NOT NULL,
+        notes TEXT NULL,
+        date DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+    )""",
+    """CREATE TABLE IF NOT EXISTS daily_plans (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        user_id INT NOT NULL,
+        date DATE NOT NULL,
+        plan_type VARCHAR(20) NOT NULL,
+        html_content MEDIUMTEXT NULL,
+        UNIQUE KEY uq_daily_plans_user_date_type (user_id, date, plan_type),
+        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+    )""",
+]
+
+
+def log_date_indexes():
+    # Every hot log query is `user_id = ? AND date in [start, end)`, optionally
+    # ORDER BY date, which this composite index answers with a range scan.
+    for table in ('meal_logs', 'workout_logs', 'weight_logs'):
+        add_index(table, f"idx_{table}_user_date", "user_id, date")
+
+
+def adaptive_calories_column():
+    add_column('users', 'adaptive_calories', "TINYINT(1) NOT NULL DEFAULT 0")
+
+
+def import_key_columns():
+    # Bulk imports dedupe on (user_id, import_key); rows logged through the
+    # forms leave it NULL, which a UNIQUE index never treats as a duplicate.
+    for table in ('meal_logs', 'workout_logs', 'weight_logs'):
+        add_column(table, 'import_key', "VARCHAR(64) NULL")
+        add_index(table, f"uq_{table}_user_import_key", "user_id, import_key", unique=True)
+
+
+def summary_updated_at_column():
+    # Per-user change stamp for conditional GETs: MAX(updated_at) is one index probe.
+    add_column('daily_summaries', 'updated_at',
+               "DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6)")
+    add_index('daily_summaries', 'idx_daily_summaries_user_updated', 'user_id, updated_at')
+
+
+def chat_summary_sessions():
+    # One rolling summary per chat session: each session numbers its own turns,
+    # so a per-user cursor let one device's fold cut another's unsummarised turns.
+    # Existing rows keep chat_key '' and seed the summary of new sessions.
+    add_column('chat_summaries', 'chat_key', "VARCHAR(32) NOT NULL DEFAULT ''")
+    keyed = db.execute_query(
+        """SELECT 1 FROM information_schema.statistics
+           WHERE table_schema = DATABASE() AND table_name = 'chat_summaries'
+             AND index_name = 'PRIMARY' AND column_name = 'chat_key' LIMIT 1""",
+        fetch_one=True
+    )
+    if not keyed:
+        db.execute_query("ALTER TABLE chat_summaries DROP PRIMARY KEY, ADD PRIMARY KEY (user_id, chat_key)",
+                         commit=True)
+
+
+DAILY_SUMMARIES = """
+    CREATE TABLE IF NOT EXISTS daily_summaries (
+        user_id INT NOT NULL,
+        day DATE NOT NULL,
+        calories_in DECIMAL(10,2) NOT NULL DEFAULT 0,
+        calories_burned DECIMAL(10,2) NOT NULL DEFAULT 0,
+        protein DECIMAL(10,2) NOT NULL DEFAULT 0,
+        carbs DECIMAL(10,2) NOT NULL DEFAULT 0,
+        fat DECIMAL(10,2) NOT NULL DEFAULT 0,
+        meal_count INT NOT NULL DEFAULT 0,
+        workout_count INT NOT NULL DEFAULT 0,
+        weight_count INT NOT NULL DEFAULT 0,
+        last_weight DECIMAL(6,2) NULL,
+        PRIMARY KEY (user_id, day)
+    )
+"""
+
+USER_STREAKS = """
+    CREATE TABLE IF NOT EXISTS user_streaks (
+        user_id INT NOT NULL PRIMARY KEY,
+        current_streak INT NOT NULL DEFAULT 0,
+        longest_streak INT NOT NULL DEFAULT 0,
+        last_active_date DATE NULL
+    )
+"""
+
+PLAN_JOBS = """
+    CREATE TABLE IF NOT EXISTS plan_jobs (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        user_id INT NOT NULL,
+        date DATE NOT NULL,
+        plan_type VARCHAR(20) NOT NULL,
+        status VARCHAR(10) NOT NULL DEFAULT 'queued',
+        worker VARCHAR(100) NULL,
+        updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        UNIQUE KEY uq_plan_jobs_user_date_type (user_id, date, plan_type),
+        KEY idx_plan_jobs_status (status, id)
+    )
+"""
+
+NUTRITION_CACHE = """
+    CREATE TABLE IF NOT EXISTS nutrition_cache (
+        cache_key VARCHAR(255) NOT NULL PRIMARY KEY,
+        calories DECIMAL(10,4) NOT NULL,
+        protein DECIMAL(10,4) NOT NULL,
+        carbs DECIMAL(10,4) NOT NULL,
+        fat DECIMAL(10,4) NOT NULL,
+        description VARCHAR(255) NULL,
+        hits INT NOT NULL DEFAULT 0,
+        expires_at DATETIME NOT NULL,
+        KEY idx_nutrition_cache_expires (expires_at)
+    )
+"""
+
+CHAT_SUMMARIES = """
+    CREATE TABLE IF NOT EXISTS chat_summaries (
+        user_id INT NOT NULL PRIMARY KEY,
+        summary TEXT NOT NULL,
+        covered_until INT NOT NULL DEFAULT 0,
+        covered_tokens INT NOT NULL DEFAULT 0,
+        updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+    )
+"""
+
+SESSIONS = """
+    CREATE TABLE IF NOT EXISTS sessions (
+        sid VARCHAR(64) NOT NULL PRIMARY KEY,
+        data MEDIUMTEXT NOT NULL,
+        expires_at DATETIME NOT NULL,
+        KEY idx_sessions_expires (expires_at)
+    )
+"""
+
+DAILY_QUOTES = """
+    CREATE TABLE IF NOT EXISTS daily_quotes (
+        quote_date DATE NOT NULL,
+        slot TINYINT NOT NULL,
+        quote VARCHAR(500) NOT NULL,
+        PRIMARY KEY (quote_date, slot)
+    )
+"""
+
+TDEE_STATE = """
+    CREATE TABLE IF NOT EXISTS tdee_state (
+        user_id INT NOT NULL PRIMARY KEY,
+        maintenance DECIMAL(7,1) NOT NULL,
+        trend_weight DECIMAL(6,2) NULL,
+        last_day DATE NOT NULL,
+        logged_days INT NOT NULL DEFAULT 0,
+        updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+    )
+"""
+
+DAILY_PLAN_ITEMS = """
+    CREATE TABLE IF NOT EXISTS daily_plan_items (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        user_id INT NOT NULL,
+        date DATE NOT NULL,
+        plan_type VARCHAR(20) NOT NULL,
+        position SMALLINT NOT NULL,
+        category VARCHAR(100) NOT NULL,
+        name VARCHAR(255) NOT NULL,
+        calories DECIMAL(8,2) NOT NULL DEFAULT 0,
+        checked BOOLEAN NOT NULL DEFAULT FALSE,
+        UNIQUE KEY uq_daily_plan_items_position (user_id, date, plan_type, position),
+        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+    )
+"""
+
+_LEGACY_PLAN_ITEM = re.compile(r'data-name="([^"]*)" data-calories="([^"]*)"')
+
+
+def legacy_plan_items():
+    # One-time conversion of the old daily_plans.html_content blobs. The HTML
+    # was generated by a fixed template, so its data-* attributes are reliable.
+    plans = db.execute_query(
+        """SELECT p.user_id, p.date, p.plan_type, p.html_content FROM daily_plans p
+           WHERE p.html_content IS NOT NULL AND p.html_content <> ''
+             AND NOT EXISTS (SELECT 1 FROM daily_plan_items i
+                             WHERE i.user_id = p.user_id AND i.date = p.date AND i.plan_type = p.plan_type)""",
+        fetch_all=True
+    ) or []
+    rows = []
+    for plan in plans:
+        for position, (full_name, calories) in enumerate(_LEGACY_PLAN_ITEM.findall(plan['html_content'])):
+            category, _, name = html.unescape(full_name).partition(': ')
+            try:
+                rows.append((plan['user_id'], plan['date'], plan['plan_type'], position,
+                             category[:100], name[:255], float(calories)))
+            except ValueError:
+                continue
+    for start in range(0, len(rows), 1000):
+        with db.connection() as connection:
+            cursor = connection.cursor()
+            try:
+                cursor.executemany(
+                    """INSERT IGNORE INTO daily_plan_items (user_id, date, plan_type, position, category, name, calories)
+                       VALUES (%s, %s, %s, %s, %s, %s, %s)""",
+                    rows[start:start + 1000]
+                )
+                connection.commit()
+            finally:
+                cursor.close()
+
+# (version, description, steps). A step is either a SQL string or a callable.
+# Append new migrations at the end; never edit one that has shipped.
+MIGRATIONS = [
+    (1, "core tables", CORE_TABLES),
+    (2, "composite (user_id, date) indexes on log tables", [log_date_indexes]),
+    (3, "daily_summaries rollup table", [DAILY_SUMMARIES]),
+    (4, "user_streaks table", [USER_STREAKS]),
+    (5, "plan_jobs queue table", [PLAN_JOBS]),
+    (6, "nutrition_cache table", [NUTRITION_CACHE]),
+    (7, "chat_summaries rolling chat summary table", [CHAT_SUMMARIES]),
+    (8, "sessions table for server-side sessions", [SESSIONS]),
+    (9, "daily_quotes shared quote pool", [DAILY_QUOTES]),
+    (10, "adaptive TDEE state and users.adaptive_calories", [TDEE_STATE, adaptive_calories_column]),
+    (11, "import_key dedupe columns on log tables", [import_key_columns]),
+    (12, "daily_plan_items structured plans (converts stored plan HTML)", [DAILY_PLAN_ITEMS, legacy_plan_items]),
+    (13, "daily_summaries.updated_at change stamp", [summary_updated_at_column]),
+    (14, "chat_summaries keyed per chat session", [chat_summary_sessions]),
+]
+
+
+def _ensure_version_table():
+    db.execute_query(
+        """CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT NOT NULL PRIMARY KEY,
+            description VARCHAR(255) NOT NULL,
+            applied_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )""",
+        commit=True
+    )
+
+
+def applied_versions():
+    _ensure_version_table()
+    rows = db.execute_query("SELECT version FROM schema_migrations", fetch_all=True) or []
+    return {row['version'] for row in rows}
+
+
+def migrate():
+    """Applies every pending migration in order. Returns the versions applied."""
+    done = applied_versions()
+    applied = []
+    for version, description, steps in MIGRATIONS:
+        if version in done:
+            continue
+        for step in steps:
+            if callable(step):
+                step()
+            else:
+                db.execute_query(step, commit=True)
+        db.execute_query(
+            "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+            (version, description), commit=True
+        )
+        applied.append(version)
+        print(f"Applied migration {version}: {description}")
+    return applied
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the FitTrack database schema.")
+    parser.add_argument('command', choices=['migrate', 'status', 'explain'])
+    args = parser.parse_args()
+
+    if args.command == 'migrate':
+        if not migrate():
+            print("Schema is up to date.")
+    elif args.command == 'status':
+        done = applied_versions()
+        for version, description, _ in MIGRATIONS:
+            print(f"[{'x' if version in done else ' '}] {version}: {description}")
+    else:
+        from queries import explain_hot_queries
+        problems = explain_hot_queries()
+        for name, row in problems:
+            print(f"FULL SCAN in {name}: table={row.get('table')} type={row.get('type')} key={row.get('key')}")
+        if problems:
+            raise SystemExit(1)
+        print("All hot queries use an index.")
+
+
+if __name__ == '__main__':
+    main()
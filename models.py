@@ -1,73 +1,186 @@
-from flask_login import UserMixin
+"""
+The user model and log helpers.
+
+`User` is what Flask-Login's user_loader returns on every authenticated
+request, so it is kept small: a `__slots__` object built from USER_COLUMNS
+only. The password hash and free-text medical fields (LAZY_COLUMNS) are read
+by a second query the first time one of them is accessed. Projected rows are
+cached in-process for USER_CACHE_TTL seconds; `User.save()` drops the entry,
+and other processes see a change within the TTL. Because a cached row can be
+that stale, `save()` writes only the fields assigned since the object was
+built, never the values it was loaded with.
+"""
+import threading
+import time
+from datetime import timedelta
+
 from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime
+
+from config import Config
 from database import db  # Your custom MySQL database helper
+import queries
 
-class User(UserMixin):
-    def __init__(self, user_data):
-        self.id = user_data.get('id')
-        self.email = user_data.get('email')
-        self.name = user_data.get('name')
-        self.password = user_data.get('password')
-        self.profile_photo = user_data.get('profile_photo')
-        self.age = user_data.get('age')
-        self.gender = user_data.get('gender')
-        self.height = user_data.get('height')
-        self.weight = user_data.get('weight')
-        self.goal_weight = user_data.get('goal_weight')
-        self.diet_preference = user_data.get('diet_preference')
-        self.fitness_goal = user_data.get('fitness_goal')
-        self.activity_level = user_data.get('activity_level')
-        self.daily_calories = user_data.get('daily_calories')
-        self.dark_mode = user_data.get('dark_mode', False)
-        self.created_at = user_data.get('created_at', datetime.utcnow())
+USER_COLUMNS = ('id', 'email', 'name', 'profile_photo', 'age', 'gender', 'height', 'weight', 'goal_weight',
+                'diet_preference', 'fitness_goal', 'activity_level', 'daily_calories', 'adaptive_calories',
+                'dark_mode', 'created_at')
+LAZY_COLUMNS = ('password', 'medical_conditions', 'past_surgeries')
+# Columns save() may write; each one only if it was assigned since loading.
+# profile_photo is not among them: photos.process is its only writer.
+SAVED_COLUMNS = ('name', 'email', 'gender', 'age', 'height', 'weight', 'goal_weight', 'diet_preference',
+                 'fitness_goal', 'activity_level', 'daily_calories', 'dark_mode',
+                 'adaptive_calories', 'medical_conditions', 'past_surgeries')
 
-    @staticmethod
-    def create(email, name, password):
-        hashed_pw = generate_password_hash(password)
+SELECT_USER = f"SELECT {', '.join(USER_COLUMNS)} FROM users"
+SELECT_USER_BY_ID = f"{SELECT_USER} WHERE id = %s"
+SELECT_USER_BY_EMAIL = f"{SELECT_USER} WHERE email = %s"
+SELECT_LOGIN = f"SELECT {', '.join(USER_COLUMNS)}, password FROM users WHERE email = %s"
+
+
+class UserCache:
+    """Projected user rows by id, each valid for `ttl` seconds."""
+
+    def __init__(self, ttl=30, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._rows = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._rows.get(user_id)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+        return None
+
+    def put(self, user_id, row):
+        if self.ttl <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if len(self._rows) >= self.max_entries:
+                self._rows = {key: entry for key, entry in self._rows.items() if entry[0] > now}
+                if len(self._rows) >= self.max_entries:
+                    self._rows.clear()
+            self._rows[user_id] = (now + self.ttl, row)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._rows.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._rows.clear()
+
+
+user_cache = UserCache(Config.USER_CACHE_TTL)
+
+
+class User:
+    __slots__ = USER_COLUMNS + LAZY_COLUMNS + ('_changed',)
+
+    def __init__(self, row):
+        # Loaded values go in through object.__setattr__ so they are not marked as changed.
+        object.__setattr__(self, '_changed', set())
+        for column in USER_COLUMNS:
+            object.__setattr__(self, column, row.get(column))
+        object.__setattr__(self, 'adaptive_calories', bool(self.adaptive_calories))
+        object.__setattr__(self, 'dark_mode', bool(self.dark_mode))
+        for column in LAZY_COLUMNS:
+            if column in row:
+                object.__setattr__(self, column, row[column])
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if name in SAVED_COLUMNS:
+            self._changed.add(name)
+
+    def __getattr__(self, name):
+        # Only reached for slots that are still unset, i.e. lazy columns not loaded yet.
+        if name not in LAZY_COLUMNS:
+            raise AttributeError(name)
+        row = db.execute_query(
+            f"SELECT {', '.join(LAZY_COLUMNS)} FROM users WHERE id = %s", (self.id,), fetch_one=True
+        ) or {}
+        for column in LAZY_COLUMNS:
+            if not self._loaded(column):
+                object.__setattr__(self, column, row.get(column))
+        return object.__getattribute__(self, name)
+
+    def _loaded(self, column):
+        try:
+            object.__getattribute__(self, column)
+            return True
+        except AttributeError:
+            return False
+
+    # Flask-Login's user interface (what UserMixin would provide).
+    @property
+    def is_authenticated(self):
+        return True
+
+    @property
+    def is_active(self):
+        return True
+
+    @property
+    def is_anonymous(self):
+        return False
+
+    def get_id(self):
+        return str(self.id)
+
+    def check_password(self, password):
+        return bool(self.password) and check_password_hash(self.password, password)
+
+    def save(self):
+        """Writes the fields assigned since this object was built, and nothing else."""
+        columns = [column for column in SAVED_COLUMNS if column in self._changed]
+        if not self.id or not columns:
+            return
         db.execute_query(
-            """INSERT INTO users (email, name, password) 
-               VALUES (%s, %s, %s)""",
-            (email, name, hashed_pw),
+            f"UPDATE users SET {', '.join(f'{column} = %s' for column in columns)} WHERE id = %s",
+            tuple(getattr(self, column) for column in columns) + (self.id,),
             commit=True
         )
-        return User.get_by_email(email)
+        self._changed.clear()
+        user_cache.invalidate(self.id)
 
     @staticmethod
-    def get_by_id(user_id):
-        user_data = db.execute_query(
-            "SELECT * FROM users WHERE id = %s",
-            (user_id,),
-            fetch_one=True
-        )
-        return User(user_data) if user_data else None
+    def get(user_id):
+        """The user_loader: a cached projected row, or one indexed read."""
+        try:
+            user_id = int(user_id)
+        except (TypeError, ValueError):
+            return None
+        row = user_cache.get(user_id)
+        if row is None:
+            row = db.execute_query(SELECT_USER_BY_ID, (user_id,), fetch_one=True)
+            if row is None:
+                return None
+            user_cache.put(user_id, row)
+        return User(row)
 
     @staticmethod
     def get_by_email(email):
-        user_data = db.execute_query(
-            "SELECT * FROM users WHERE email = %s",
-            (email,),
-            fetch_one=True
-        )
-        return User(user_data) if user_data else None
+        row = db.execute_query(SELECT_USER_BY_EMAIL, (email,), fetch_one=True)
+        return User(row) if row else None
+
+    @staticmethod
+    def authenticate(email, password):
+        """The user for these credentials, or None. Reads the hash in the same query."""
+        row = db.execute_query(SELECT_LOGIN, (email,), fetch_one=True)
+        if row and row['password'] and check_password_hash(row['password'], password):
+            return User(row)
+        return None
 
-    def update_profile(self):
+    @staticmethod
+    def create(email, name, password):
         db.execute_query(
-            """UPDATE users SET 
-               email=%s, name=%s, profile_photo=%s, age=%s, 
-               gender=%s, height=%s, weight=%s, goal_weight=%s,
-               diet_preference=%s, fitness_goal=%s, activity_level=%s,
-               daily_calories=%s, dark_mode=%s
-               WHERE id=%s""",
-            (self.email, self.name, self.profile_photo, self.age,
-             self.gender, self.height, self.weight, self.goal_weight,
-             self.diet_preference, self.fitness_goal, self.activity_level,
-             self.daily_calories, self.dark_mode, self.id),
+            "INSERT INTO users (name, email, password, created_at) VALUES (%s, %s, %s, %s)",
+            (name, email, generate_password_hash(password), queries.ist_now()),
             commit=True
         )
-
-    def check_password(self, password):
-        return check_password_hash(self.password, password)
+        return User.get_by_email(email)
 
 class MealLog:
     @staticmethod
@@ -82,13 +195,8 @@ class MealLog:
 
     @staticmethod
     def get_recent(user_id, days=7):
-        return db.execute_query(
-            """SELECT * FROM meal_logs 
-               WHERE user_id = %s AND date >= %s
-               ORDER BY date DESC""",
-            (user_id, datetime.utcnow() - timedelta(days=days)),
-            fetch_all=True
-        )
+        today = queries.ist_today()
+        return queries.meals_between(user_id, today - timedelta(days=days - 1), today)[::-1]
 
 class WorkoutLog:
     @staticmethod
@@ -103,13 +211,8 @@ class WorkoutLog:
 
     @staticmethod
     def get_recent(user_id, days=7):
-        return db.execute_query(
-            """SELECT * FROM workout_logs 
-               WHERE user_id = %s AND date >= %s
-               ORDER BY date DESC""",
-            (user_id, datetime.utcnow() - timedelta(days=days)),
-            fetch_all=True
-        )
+        today = queries.ist_today()
+        return queries.workouts_between(user_id, today - timedelta(days=days - 1), today)[::-1]
 
 class WeightLog:
     @staticmethod
@@ -124,10 +227,5 @@ class WeightLog:
 
     @staticmethod
     def get_history(user_id, days=30):
-        return db.execute_query(
-            """SELECT * FROM weight_logs 
-               WHERE user_id = %s AND date >= %s
-               ORDER BY date""",
-            (user_id, datetime.utcnow() - timedelta(days=days)),
-            fetch_all=True
-        )
\ No newline at end of file
+        today = queries.ist_today()
+        return queries.weights_between(user_id, today - timedelta(days=days - 1), today)
\ No newline at end of file
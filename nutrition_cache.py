@@ -0,0 +1,252 @@
+"""
+Two-tier cache for AI nutrition lookups.
+
+Descriptions are normalised (case, whitespace, plurals, unit spellings) and
+split into a quantity and a per-unit key, so "3 Eggs", "3 eggs " and "1 egg"
+all share the entry `|egg` and only the quantity differs. Values are stored
+per unit and scaled on the way out. Descriptions that cannot be scaled that
+way (no food name, or several foods such as "2 rotis with dal") bypass the
+cache.
+
+Tier 1 is an in-process LRU with a short TTL; tier 2 is the nutrition_cache
+MySQL table shared by all workers. Maintenance:
+
+    python nutrition_cache.py purge      # drop expired rows, cap the table size
+    python nutrition_cache.py stats
+"""
+import argparse
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from database import db
+
+NUTRIENTS = ('calories', 'protein', 'carbs', 'fat')
+
+MEMORY_TTL_SECONDS = 24 * 3600
+MEMORY_MAX_ENTRIES = 5000
+DB_TTL_DAYS = 90
+DB_MAX_ROWS = 200000
+
+NUMBER_WORDS = {
+    'a': 1, 'an': 1, 'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6,
+    'seven': 7, 'eight': 8, 'nine': 9, 'ten': 10, 'dozen': 12, 'half': 0.5, 'quarter': 0.25,
+}
+
+# spelling -> (canonical unit, multiplier into that unit)
+UNITS = {
+    'g': ('g', 1), 'gm': ('g', 1), 'gms': ('g', 1), 'gram': ('g', 1), 'grams': ('g', 1), 'gr': ('g', 1),
+    'kg': ('g', 1000), 'kgs': ('g', 1000), 'kilo': ('g', 1000), 'kilos': ('g', 1000),
+    'kilogram': ('g', 1000), 'kilograms': ('g', 1000),
+    'oz': ('g', 28.35), 'ounce': ('g', 28.35), 'ounces': ('g', 28.35),
+    'lb': ('g', 453.6), 'lbs': ('g', 453.6), 'pound': ('g', 453.6), 'pounds': ('g', 453.6),
+    'ml': ('ml', 1), 'millilitre': ('ml', 1), 'millilitres': ('ml', 1), 'milliliter': ('ml', 1), 'milliliters': ('ml', 1),
+    'l': ('ml', 1000), 'litre': ('ml', 1000), 'litres': ('ml', 1000), 'liter': ('ml', 1000), 'liters': ('ml', 1000),
+    'cup': ('cup', 1), 'cups': ('cup', 1),
+    'tbsp': ('tbsp', 1), 'tablespoon': ('tbsp', 1), 'tablespoons': ('tbsp', 1),
+    'tsp': ('tsp', 1), 'teaspoon': ('tsp', 1), 'teaspoons': ('tsp', 1),
+    'slice': ('slice', 1), 'slices': ('slice', 1),
+    'bowl': ('bowl', 1), 'bowls': ('bowl', 1),
+    'plate': ('plate', 1), 'plates': ('plate', 1),
+    'glass': ('glass', 1), 'glasses': ('glass', 1),
+    'piece': ('', 1), 'pieces': ('', 1), 'pc': ('', 1), 'pcs': ('', 1), 'nos': ('', 1), 'no': ('', 1),
+}
+
+_QUANTITY = re.compile(r'^(\d+(?:\.\d+)?(?:/\d+)?)\s*([a-z]+)?\b\s*(?:of\s+)?(.*)$')
+_WORD_QUANTITY = re.compile(r'^(' + '|'.join(NUMBER_WORDS) + r')\s+(?:([a-z]+)\s+)?(?:of\s+)?(.*)$')
+# A leading quantity only scales a single food, so these mark uncacheable dishes.
+_COMPONENT_SEPARATOR = re.compile(r'[,;&+]|\b(?:with|and|n)\b')
+
+
+def _singular(word):
+    if len(word) <= 3 or word.endswith('ss'):
+        return word
+    if word.endswith('ies'):
+        return word[:-3] + 'y'
+    if word.endswith('oes'):
+        return word[:-2]
+    if word.endswith(('ches', 'shes', 'xes')):
+        return word[:-2]
+    if word.endswith('s'):
+        return word[:-1]
+    return word
+
+
+def _parse_number(text):
+    if '/' in text:
+        numerator, denominator = text.split('/', 1)
+        return float(numerator) / float(denominator) if float(denominator) else 1.0
+    return float(text)
+
+
+def normalize(description):
+    """
+    Returns (cache_key, quantity). The key identifies one unit of the food,
+    e.g. "2 Boiled  Eggs" -> ("|boiled egg", 2.0), "250 grams rice" -> ("g|rice", 250.0).
+    The key is None when the description has no food name ("100", "2 g") or
+    more than one component ("2 rotis with dal", "1 egg 2 toast").
+    """
+    if _COMPONENT_SEPARATOR.search(description.lower()):
+        return None, 1.0
+    text = re.sub(r'[^a-z0-9./ ]+', ' ', description.lower())
+    text = re.sub(r'\s+', ' ', text).strip()
+
+    quantity, unit = 1.0, ''
+    match = _QUANTITY.match(text)
+    if match:
+        quantity = _parse_number(match.group(1))
+        word, rest = match.group(2), match.group(3)
+    else:
+        match = _WORD_QUANTITY.match(text)
+        if match:
+            quantity = NUMBER_WORDS[match.group(1)]
+            word, rest = match.group(2), match.group(3)
+        else:
+            word, rest = None, text
+    if word:
+        if word in UNITS:
+            unit, multiplier = UNITS[word]
+            quantity *= multiplier
+        else:
+            rest = f"{word} {rest}".strip()
+
+    food = ' '.join(_singular(token) for token in rest.split())
+    quantity = quantity if quantity > 0 else 1.0
+    if not re.search(r'[a-z]', food) or re.search(r'\d', food):
+        return None, quantity
+    return f"{unit}|{food}"[:255], quantity
+
+
+class NutritionCache:
+    def __init__(self, memory_ttl=MEMORY_TTL_SECONDS, max_entries=MEMORY_MAX_ENTRIES, db_ttl_days=DB_TTL_DAYS):
+        self.memory_ttl = memory_ttl
+        self.max_entries = max_entries
+        self.db_ttl_days = db_ttl_days
+        self._entries = OrderedDict()  # key -> (expires_at, per_unit)
+        self._lock = threading.Lock()
+        self.stats = {'memory_hits': 0, 'db_hits': 0, 'misses': 0, 'stores': 0, 'uncacheable': 0}
+
+    def _memory_get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            self.stats['memory_hits'] += 1
+            return entry[1]
+
+    def _memory_put(self, key, per_unit):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.memory_ttl, per_unit)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _db_get(self, key):
+        try:
+            row = db.execute_query(
+                """SELECT calories, protein, carbs, fat FROM nutrition_cache
+                   WHERE cache_key = %s AND expires_at > NOW()""",
+                (key,), fetch_one=True
+            )
+            if row:
+                db.execute_query("UPDATE nutrition_cache SET hits = hits + 1 WHERE cache_key = %s", (key,), commit=True)
+        except Exception as e:
+            print(f"Nutrition cache read failed: {e}")
+            return None
+        if not row:
+            return None
+        with self._lock:
+            self.stats['db_hits'] += 1
+        return {nutrient: float(row[nutrient]) for nutrient in NUTRIENTS}
+
+    def _db_put(self, key, per_unit, description):
+        try:
+            db.execute_query(
+                """INSERT INTO nutrition_cache (cache_key, calories, protein, carbs, fat, description, expires_at)
+                   VALUES (%s, %s, %s, %s, %s, %s, %s)
+                   ON DUPLICATE KEY UPDATE calories = VALUES(calories), protein = VALUES(protein),
+                       carbs = VALUES(carbs), fat = VALUES(fat), description = VALUES(description),
+                       expires_at = VALUES(expires_at)""",
+                (key, *(per_unit[nutrient] for nutrient in NUTRIENTS), description[:255],
+                 datetime.utcnow() + timedelta(days=self.db_ttl_days)),
+                commit=True
+            )
+        except Exception as e:
+            print(f"Nutrition cache write failed: {e}")
+
+    def lookup(self, description, fetch):
+        """
+        Returns nutrition for `description`, calling `fetch(description)` (the AI)
+        only on a miss. Returns {} when the AI gives nothing usable.
+        """
+        key, quantity = normalize(description)
+        if key is None:
+            with self._lock:
+                self.stats['uncacheable'] += 1
+            return fetch(description) or {}
+        per_unit = self._memory_get(key)
+        if per_unit is None:
+            per_unit = self._db_get(key)
+            if per_unit is not None:
+                self._memory_put(key, per_unit)
+        if per_unit is None:
+            with self._lock:
+                self.stats['misses'] += 1
+            result = fetch(description) or {}
+            try:
+                per_unit = {nutrient: float(result[nutrient]) / quantity for nutrient in NUTRIENTS}
+            except (KeyError, TypeError, ValueError):
+                return result
+            self._memory_put(key, per_unit)
+            self._db_put(key, per_unit, description)
+            with self._lock:
+                self.stats['stores'] += 1
+        return {nutrient: round(per_unit[nutrient] * quantity, 1) for nutrient in NUTRIENTS}
+
+    def info(self):
+        with self._lock:
+            lookups = self.stats['memory_hits'] + self.stats['db_hits'] + self.stats['misses']
+            hit_rate = (lookups - self.stats['misses']) / lookups if lookups else 0.0
+            return dict(self.stats, entries=len(self._entries), hit_rate=round(hit_rate, 3))
+
+
+def purge(max_rows=DB_MAX_ROWS):
+    """Deletes expired rows, then the least-used rows beyond `max_rows`."""
+    db.execute_query("DELETE FROM nutrition_cache WHERE expires_at <= NOW()", commit=True)
+    count = db.execute_query("SELECT COUNT(*) AS n FROM nutrition_cache", fetch_one=True)['n']
+    if count > max_rows:
+        db.execute_query(
+            "DELETE FROM nutrition_cache ORDER BY hits ASC, expires_at ASC LIMIT %s",
+            (count - max_rows,), commit=True
+        )
+    return max(0, count - max_rows)
+
+
+nutrition_cache = NutritionCache()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the nutrition lookup cache.")
+    parser.add_argument('command', choices=['purge', 'stats'])
+    parser.add_argument('--max-rows', type=int, default=DB_MAX_ROWS)
+    args = parser.parse_args()
+
+    if args.command == 'purge':
+        trimmed = purge(args.max_rows)
+        print(f"Purged expired entries and trimmed {trimmed} least-used rows.")
+    else:
+        row = db.execute_query(
+            "SELECT COUNT(*) AS entries, COALESCE(SUM(hits), 0) AS hits FROM nutrition_cache WHERE expires_at > NOW()",
+            fetch_one=True
+        )
+        print(f"{row['entries']} live entries, {row['hits']} database hits recorded.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,251 @@
+"""
+Profile photo processing.
+
+An upload is checked synchronously (it must decode as an image and be at most
+PHOTO_MAX_BYTES), then a background pool re-encodes it: EXIF orientation is
+applied, everything else in the file (EXIF, GPS, comments, ICC) is dropped,
+and each size in SIZES is written as a square-cropped JPEG and WebP under a
+content-hashed name such as `u42-3f9a0c1d2e4b5a69-thumb.webp`. Only then is
+`users.profile_photo` pointed at the new key (`u42-3f9a0c1d2e4b5a69`), so pages
+never reference files that do not exist yet, and once the row reads back with
+that key the user's superseded files are deleted. This is the only code that
+writes the column; `User.save()` never does. Because names change whenever
+the content does, the files are served with a one-year immutable Cache-Control.
+
+Older rows hold a plain uploaded filename; `photo_url` serves those as-is until
+they are converted:
+
+    python photos.py convert    # re-encode legacy uploads still in use
+    python photos.py gc         # delete files no user references
+"""
+import argparse
+import hashlib
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from flask import url_for
+from PIL import Image, ImageOps
+
+from config import Config
+from database import db
+from models import user_cache
+
+# variant -> square edge in pixels (about 2x the largest size it is shown at)
+SIZES = {'thumb': 96, 'large': 400}
+FORMATS = {'jpg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+           'webp': ('WEBP', {'quality': 80, 'method': 6})}
+MAX_PIXELS = 40_000_000
+# Files younger than this are never collected: another worker may be mid-upload.
+GC_GRACE_SECONDS = 300
+CACHE_MAX_AGE = 365 * 24 * 3600
+
+_KEY = re.compile(r'^u(\d+)-[0-9a-f]{16}$')
+_FILE = re.compile(r'^u(\d+)-[0-9a-f]{16}-[a-z]+\.[a-z]+$')
+_LEGACY = re.compile(r'^user_(\d+)[_.]')
+
+Image.MAX_IMAGE_PIXELS = MAX_PIXELS
+
+_photo_pool = ThreadPoolExecutor(max_workers=Config.PHOTO_WORKERS, thread_name_prefix='photo')
+_commit_lock = threading.Lock()
+
+
+def variant_name(key, size, fmt):
+    return f"{key}-{size}.{fmt}"
+
+
+def is_processed(name):
+    return bool(name and _KEY.match(name))
+
+
+def is_variant(filename):
+    return bool(_FILE.match(filename))
+
+
+def photo_url(name, size='thumb', webp=False):
+    """
+    URL of a profile photo variant, for templates. Legacy uploads have no WebP
+    variant (returns None for webp=True) and are served at their original size.
+    """
+    if not name:
+        return None
+    if is_processed(name):
+        return url_for('profile_photo_file', filename=variant_name(name, size, 'webp' if webp else 'jpg'))
+    if webp:
+        return None
+    return url_for('static', filename='images/profile_photos/' + name)
+
+
+def init_app(app):
+    app.add_template_global(photo_url)
+
+
+def _read_upload(file):
+    data = file.read(Config.PHOTO_MAX_BYTES + 1)
+    if len(data) > Config.PHOTO_MAX_BYTES:
+        raise ValueError(f"Photo is larger than {Config.PHOTO_MAX_BYTES // (1024 * 1024)} MB.")
+    try:
+        with Image.open(BytesIO(data)) as image:
+            width, height = image.size
+            image.verify()
+    except Exception:
+        raise ValueError("Photo could not be read as an image.")
+    # Pillow only refuses images above twice MAX_IMAGE_PIXELS, and verify() does
+    # not decode, so the limit is enforced here before the pool decodes anything.
+    if width * height > MAX_PIXELS:
+        raise ValueError(f"Photo is larger than {MAX_PIXELS // 1_000_000} megapixels.")
+    return data
+
+
+def _render(data):
+    """Yields (size, fmt, bytes) for every variant of the image in `data`."""
+    with Image.open(BytesIO(data)) as image:
+        if image.size[0] * image.size[1] > MAX_PIXELS:  # legacy files reach here without _read_upload
+            raise ValueError(f"image is {image.size[0]}x{image.size[1]}, over MAX_PIXELS")
+        image.seek(0)
+        image = ImageOps.exif_transpose(image)
+        if image.mode in ('RGBA', 'LA', 'P'):
+            image = image.convert('RGBA')
+            flat = Image.new('RGB', image.size, (255, 255, 255))
+            flat.paste(image, mask=image.getchannel('A'))
+            image = flat
+        else:
+            image = image.convert('RGB')
+        for size, edge in SIZES.items():
+            # Saved without exif/icc_profile/info, so none of the original metadata survives.
+            variant = ImageOps.fit(image, (edge, edge), Image.LANCZOS)
+            for fmt, (encoder, options) in FORMATS.items():
+                out = BytesIO()
+                variant.save(out, encoder, **options)
+                yield size, fmt, out.getvalue()
+
+
+def _write(path, content):
+    tmp = f"{path}.tmp{threading.get_ident()}"
+    with open(tmp, 'wb') as f:
+        f.write(content)
+    os.replace(tmp, path)
+
+
+def _owned_files(user_id):
+    """Filenames in the upload folder that belong to `user_id` (processed or legacy)."""
+    for filename in os.listdir(Config.UPLOAD_FOLDER):
+        match = _FILE.match(filename) or _LEGACY.match(filename)
+        if match and int(match.group(1)) == user_id:
+            yield filename
+
+
+def _unused(filename, keep, now):
+    if filename == keep or filename.startswith(f"{keep}-"):
+        return False
+    path = os.path.join(Config.UPLOAD_FOLDER, filename)
+    return now - os.path.getmtime(path) > GC_GRACE_SECONDS
+
+
+def _remove(filename):
+    try:
+        os.remove(os.path.join(Config.UPLOAD_FOLDER, filename))
+        return 1
+    except FileNotFoundError:
+        return 0
+
+
+def collect_user(user_id, expected=None):
+    """
+    Deletes the user's files other than the ones their current photo uses.
+    With `expected`, deletes nothing unless the stored photo is that key.
+    Returns how many.
+    """
+    row = db.execute_query("SELECT profile_photo FROM users WHERE id = %s", (user_id,), fetch_one=True)
+    keep = row['profile_photo'] if row else None
+    if expected is not None and keep != expected:
+        return 0
+    now = time.time()
+    return sum(_remove(filename) for filename in list(_owned_files(user_id)) if _unused(filename, keep, now))
+
+
+def process(user_id, data, key):
+    """Writes every variant of `data` under `key`, then makes it the user's photo."""
+    for size, fmt, content in _render(data):
+        path = os.path.join(Config.UPLOAD_FOLDER, variant_name(key, size, fmt))
+        if not os.path.exists(path):
+            _write(path, content)
+    with _commit_lock:
+        db.execute_query("UPDATE users SET profile_photo = %s WHERE id = %s", (key, user_id), commit=True)
+        user_cache.invalidate(user_id)
+        # Re-read before deleting: if the row does not show `key` (a newer upload
+        # won, or the user is gone), the old files may still be the ones in use.
+        collect_user(user_id, expected=key)
+
+
+def _process_in_background(user_id, data, key):
+    try:
+        process(user_id, data, key)
+    except Exception as e:
+        print(f"Photo processing failed for user {user_id}: {e}")
+
+
+def submit(user_id, file):
+    """
+    Validates an uploaded file and queues its processing. Returns the photo key
+    the user will have once it is done; raises ValueError for unusable uploads.
+    """
+    data = _read_upload(file)
+    key = f"u{user_id}-{hashlib.sha256(data).hexdigest()[:16]}"
+    _photo_pool.submit(_process_in_background, user_id, data, key)
+    return key
+
+
+def convert_legacy():
+    """Re-encodes legacy uploads that users still reference. Returns (converted, failed)."""
+    rows = db.execute_query(
+        "SELECT id, profile_photo FROM users WHERE profile_photo IS NOT NULL AND profile_photo != ''",
+        fetch_all=True
+    ) or []
+    converted = failed = 0
+    for row in rows:
+        if is_processed(row['profile_photo']):
+            continue
+        path = os.path.join(Config.UPLOAD_FOLDER, os.path.basename(row['profile_photo']))
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            process(row['id'], data, f"u{row['id']}-{hashlib.sha256(data).hexdigest()[:16]}")
+            converted += 1
+        except Exception as e:
+            print(f"Could not convert {row['profile_photo']} for user {row['id']}: {e}")
+            failed += 1
+    return converted, failed
+
+
+def collect_all():
+    """Deletes per-user files that no user's current photo uses. Returns how many."""
+    rows = db.execute_query("SELECT id, profile_photo FROM users", fetch_all=True) or []
+    current = {row['id']: row['profile_photo'] for row in rows}
+    now = time.time()
+    removed = 0
+    for filename in os.listdir(Config.UPLOAD_FOLDER):
+        match = _FILE.match(filename) or _LEGACY.match(filename)
+        if match and _unused(filename, current.get(int(match.group(1))), now):
+            removed += _remove(filename)
+    return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain processed profile photos.")
+    parser.add_argument('command', choices=['convert', 'gc'])
+    args = parser.parse_args()
+
+    os.makedirs(Config.UPLOAD_FOLDER, exist_ok=True)
+    if args.command == 'convert':
+        converted, failed = convert_legacy()
+        print(f"Converted {converted} photos ({failed} failed).")
+    else:
+        print(f"Removed {collect_all()} unused files.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+"""
+Background generation of daily AI plans, so the dashboard never waits on Groq.
+
+`plan_queue.request()` returns a stored plan straight away, or queues its
+generation and reports it as pending; the dashboard shows a placeholder and
+polls /api/plans/<plan_type> until the plan is ready. Concurrent requests for
+the same (user, date, plan_type) share one job.
+
+PLAN_QUEUE_MODE selects where jobs run:
+  inprocess - a thread pool inside each web worker (default)
+  external  - rows in the plan_jobs table, drained by a separate process:
+
+    python plan_jobs.py worker [--threads N]
+"""
+import argparse
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import plans
+from database import db
+from models import User
+
+# A failed generation is reported as failed (not retried) for this long.
+RETRY_AFTER_SECONDS = 60
+# An 'external' job stuck in 'running' this long is assumed orphaned by a dead worker.
+STALE_RUNNING_SECONDS = 600
+
+
+def _generate(user, date, plan_type):
+    # request() checks for a stored plan before taking the queue's lock, so a
+    # job that just finished can be queued again; check once more before Groq.
+    return plans.get_plan_items(user.id, date, plan_type) or plans.generate_plan_items(user, date, plan_type)
+
+
+class PlanJobQueue:
+    def __init__(self, mode='inprocess', workers=4):
+        self.mode = mode
+        self.workers = workers
+        self.user_loader = None
+        self._executor = None
+        self._pending = {}  # (user_id, date, plan_type) -> Future
+        self._failed = {}   # (user_id, date, plan_type) -> monotonic time of failure
+        self._lock = threading.Lock()
+
+    def init_app(self, app, user_loader):
+        self.mode = app.config.get('PLAN_QUEUE_MODE', self.mode)
+        self.workers = app.config.get('PLAN_WORKERS', self.workers)
+        self.user_loader = user_loader
+
+    def _get_executor(self):
+        # Created lazily so each forked gunicorn worker gets its own threads.
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='plan-job')
+        return self._executor
+
+    def request(self, user, date, plan_type):
+        """
+        Returns (status, items) where status is 'ready', 'pending' or 'failed'.
+        Queues a generation job when the plan is missing and none is in flight.
+        """
+        items = plans.get_plan_items(user.id, date, plan_type)
+        if items:
+            return 'ready', items
+        if self.mode == 'external':
+            return self._request_external(user.id, date, plan_type), None
+        return self._request_inprocess(user, date, plan_type)
+
+    # --- in-process mode ----------------------------------------------------
+
+    def _request_inprocess(self, user, date, plan_type):
+        key = (user.id, date, plan_type)
+        with self._lock:
+            if key in self._pending:
+                return 'pending', None
+            failed_at = self._failed.get(key)
+            if failed_at is not None and time.monotonic() - failed_at < RETRY_AFTER_SECONDS:
+                return 'failed', None
+            self._failed.pop(key, None)
+            future = self._get_executor().submit(_generate, user, date, plan_type)
+            self._pending[key] = future
+        # Outside the lock: the callback runs right here if the job already finished.
+        future.add_done_callback(lambda done: self._finished(key, done))
+        return 'pending', None
+
+    def _finished(self, key, future):
+        # Drops the Future (and its items) as soon as the job ends; a stored plan
+        # is served from the database from then on.
+        error = future.exception()
+        if error is not None:
+            print(f"Plan job {key} failed: {error}")
+        failed = error is not None or not future.result()
+        now = time.monotonic()
+        with self._lock:
+            if self._pending.get(key) is future:
+                del self._pending[key]
+            if failed:
+                self._failed = {k: at for k, at in self._failed.items() if now - at < RETRY_AFTER_SECONDS}
+                self._failed[key] = now
+
+    # --- external mode ------------------------------------------------------
+
+    def _request_external(self, user_id, date, plan_type):
+        # INSERT IGNORE on the unique key dedupes across every web process.
+        db.execute_query(
+            "INSERT IGNORE INTO plan_jobs (user_id, date, plan_type, status) VALUES (%s, %s, %s, 'queued')",
+            (user_id, date, plan_type), commit=True
+        )
+        job = db.execute_query(
+            """SELECT status, TIMESTAMPDIFF(SECOND, updated_at, NOW()) AS age
+               FROM plan_jobs WHERE user_id = %s AND date = %s AND plan_type = %s""",
+            (user_id, date, plan_type), fetch_one=True
+        )
+        if job and job['status'] == 'failed':
+            if job['age'] < RETRY_AFTER_SECONDS:
+                return 'failed'
+            db.execute_query(
+                "UPDATE plan_jobs SET status = 'queued' WHERE user_id = %s AND date = %s AND plan_type = %s AND status = 'failed'",
+                (user_id, date, plan_type), commit=True
+            )
+        elif job and job['status'] == 'done':
+            # The plan items were removed or came back empty; generate them again.
+            db.execute_query(
+                "UPDATE plan_jobs SET status = 'queued' WHERE user_id = %s AND date = %s AND plan_type = %s AND status = 'done'",
+                (user_id, date, plan_type), commit=True
+            )
+        return 'pending'
+
+    def _claim_external(self, worker_name):
+        """Atomically moves one queued (or orphaned) job to 'running'. Returns it or None."""
+        job = db.execute_query(
+            """SELECT id, user_id, date, plan_type FROM plan_jobs
+               WHERE status = 'queued'
+                  OR (status = 'running' AND updated_at < NOW() - INTERVAL %s SECOND)
+               ORDER BY id LIMIT 1""",
+            (STALE_RUNNING_SECONDS,), fetch_one=True
+        )
+        if not job:
+            return None
+        with db.connection() as connection:
+            cursor = connection.cursor()
+            try:
+                cursor.execute(
+                    """UPDATE plan_jobs SET status = 'running', worker = %s
+                       WHERE id = %s AND (status = 'queued' OR (status = 'running' AND updated_at < NOW() - INTERVAL %s SECOND))""",
+                    (worker_name, job['id'], STALE_RUNNING_SECONDS)
+                )
+                connection.commit()
+                claimed = cursor.rowcount == 1
+            finally:
+                cursor.close()
+        return job if claimed else None
+
+    def run_external_worker(self, threads=2, poll_interval=1.0):
+        """Drains the plan_jobs table forever using `threads` concurrent jobs."""
+        worker_name = f"{socket.gethostname()}:{os.getpid()}"
+
+        def loop():
+            while True:
+                job = self._claim_external(worker_name)
+                if not job:
+                    time.sleep(poll_interval)
+                    continue
+                status = 'failed'
+                try:
+                    user = self.user_loader(job['user_id'])
+                    if user and _generate(user, job['date'], job['plan_type']):
+                        status = 'done'
+                except Exception as e:
+                    print(f"Plan job {job['id']} failed: {e}")
+                db.execute_query("UPDATE plan_jobs SET status = %s WHERE id = %s", (status, job['id']), commit=True)
+
+        print(f"Plan worker {worker_name} started with {threads} threads.")
+        pool = [threading.Thread(target=loop, daemon=True) for _ in range(threads)]
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+
+
+plan_queue = PlanJobQueue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate daily plans queued by the web app.")
+    parser.add_argument('command', choices=['worker'])
+    parser.add_argument('--threads', type=int, default=2)
+    args = parser.parse_args()
+
+    plan_queue.user_loader = User.get
+    plan_queue.run_external_worker(threads=args.threads)
+
+
+if __name__ == '__main__':
+    main()
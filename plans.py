@@ -0,0 +1,121 @@
+"""
+Daily AI diet/workout plans: stored items, lookups and (slow) generation.
+
+A plan is a list of rows in `daily_plan_items` (category, name, calories,
+checked) for one (user, date, plan_type); templates/components/plan_items.html
+renders them and the exports read them directly. Generation makes a Groq
+round-trip, so request handlers should go through plan_jobs, which runs it
+off the request path.
+"""
+from ai_integration import get_ai_diet_suggestion, get_ai_workout_plan
+from database import db
+
+PLAN_TYPES = ('diet', 'workout')
+# plan_type -> log type an item becomes when checked off
+ITEM_TYPES = {'diet': 'meal', 'workout': 'workout'}
+
+ITEM_COLUMNS = "id, plan_type, position, category, name, calories, checked"
+SELECT_PLAN_ITEMS = f"""SELECT {ITEM_COLUMNS} FROM daily_plan_items
+                        WHERE user_id = %s AND date = %s AND plan_type = %s ORDER BY position"""
+
+
+def parse_plan_response(text):
+    """Parses the AI's "Category:Name:Calories;..." format into (category, name, calories) tuples."""
+    items = []
+    for item in (text or "").split(';'):
+        parts = item.split(':')
+        if len(parts) != 3:
+            continue
+        category, name, calories = (part.strip() for part in parts)
+        try:
+            items.append((category[:100], name[:255], float(calories)))
+        except ValueError:
+            continue
+    return items
+
+
+def get_plan_items(user_id, date, plan_type):
+    """Returns the stored items in order, or None if the plan has not been generated yet."""
+    rows = db.execute_query(SELECT_PLAN_ITEMS, (user_id, date, plan_type), fetch_all=True)
+    return rows or None
+
+
+def store_plan_items(user_id, date, plan_type, items):
+    """
+    Stores a plan's items ((category, name, calories) tuples) unless the plan
+    already exists; a stored plan is never replaced, since its items may be
+    checked off already. Returns True if these items were stored.
+
+    Position 0 acts as the plan's header: the unique key lets exactly one
+    concurrent writer insert it (the others wait, then insert nothing), and
+    the rest of the items go in within the same transaction.
+    """
+    if not items:
+        return False
+    rows = [(user_id, date, plan_type, position, category, name, calories)
+            for position, (category, name, calories) in enumerate(items)]
+    with db.connection() as connection:
+        cursor = connection.cursor()
+        try:
+            cursor.execute(
+                """INSERT IGNORE INTO daily_plan_items (user_id, date, plan_type, position, category, name, calories)
+                   VALUES (%s, %s, %s, %s, %s, %s, %s)""",
+                rows[0]
+            )
+            if cursor.rowcount != 1:
+                connection.rollback()
+                return False
+            if len(rows) > 1:
+                cursor.executemany(
+                    """INSERT INTO daily_plan_items (user_id, date, plan_type, position, category, name, calories)
+                       VALUES (%s, %s, %s, %s, %s, %s, %s)""",
+                    rows[1:]
+                )
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            cursor.close()
+    return True
+
+
+def generate_plan_items(user, date, plan_type):
+    """
+    Asks the AI for a plan, stores it and returns the stored items ([] when
+    the response has no usable items). If another writer stored the plan
+    first, its items are returned and this response is dropped. AI and
+    database errors propagate, so callers can tell a failure from an empty plan.
+    """
+    if plan_type == 'diet':
+        items = parse_plan_response(get_ai_diet_suggestion(user))
+    elif plan_type == 'workout':
+        items = parse_plan_response(get_ai_workout_plan(user))
+    else:
+        return []
+    if not items:
+        return []
+    store_plan_items(user.id, date, plan_type, items)
+    return get_plan_items(user.id, date, plan_type) or []
+
+
+def get_item(user_id, item_id):
+    return db.execute_query(
+        f"SELECT {ITEM_COLUMNS} FROM daily_plan_items WHERE id = %s AND user_id = %s",
+        (item_id, user_id), fetch_one=True
+    )
+
+
+def check_item(user_id, item_id):
+    """Marks an item done. Returns True only for the request that flipped it, so it is logged once."""
+    with db.connection() as connection:
+        cursor = connection.cursor()
+        try:
+            cursor.execute(
+                "UPDATE daily_plan_items SET checked = TRUE WHERE id = %s AND user_id = %s AND checked = FALSE",
+                (item_id, user_id)
+            )
+            connection.commit()
+            return cursor.rowcount == 1
+        finally:
+            cursor.close()
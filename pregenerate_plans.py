@@ -0,0 +1,166 @@
+"""
+Nightly bulk pre-generation of daily plans for recently active users.
+
+Run shortly after IST midnight (e.g. cron `5 0 * * *` with TZ=Asia/Kolkata) so
+the morning's first dashboard loads find their plans already stored:
+
+    python pregenerate_plans.py [--date YYYY-MM-DD] [--active-days 14]
+                                [--concurrency 4] [--rpm 30]
+                                [--checkpoint PATH]
+
+Plans that already exist are skipped. Finished (user, plan_type) pairs are
+appended to a checkpoint file so an interrupted run resumes where it stopped.
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date as date_cls, timedelta
+
+import plans
+import queries
+from database import db
+from models import User
+
+
+class RateLimiter:
+    """Token bucket shared by all worker threads: at most `per_minute` acquisitions per minute."""
+
+    def __init__(self, per_minute):
+        self.capacity = max(1, per_minute)
+        self.tokens = float(self.capacity)
+        self.refill_per_second = per_minute / 60.0
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_per_second)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.refill_per_second
+            time.sleep(wait)
+
+
+class Checkpoint:
+    """Append-only record of finished "user_id:plan_type" keys for one plan date."""
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path) as f:
+                self.done = {line.strip() for line in f if line.strip()}
+
+    def mark(self, key):
+        with self._lock:
+            self.done.add(key)
+            with open(self.path, 'a') as f:
+                f.write(key + "\n")
+
+
+def active_user_ids(since_day):
+    rows = db.execute_query(
+        """SELECT DISTINCT s.user_id FROM daily_summaries s
+           JOIN users u ON u.id = s.user_id
+           WHERE s.day >= %s AND u.age IS NOT NULL AND u.height IS NOT NULL
+             AND u.weight IS NOT NULL AND u.daily_calories IS NOT NULL""",
+        (since_day,), fetch_all=True
+    ) or []
+    return [row['user_id'] for row in rows]
+
+
+def existing_plans(plan_date):
+    rows = db.execute_query(
+        "SELECT DISTINCT user_id, plan_type FROM daily_plan_items WHERE date = %s",
+        (plan_date,), fetch_all=True
+    ) or []
+    return {f"{row['user_id']}:{row['plan_type']}" for row in rows}
+
+
+def run(plan_date, active_days=14, concurrency=4, rpm=30, checkpoint_path=None):
+    checkpoint = Checkpoint(checkpoint_path or f".plan_pregen_{plan_date.isoformat()}.log")
+    skip = existing_plans(plan_date) | checkpoint.done
+    user_ids = active_user_ids(plan_date - timedelta(days=active_days))
+    tasks = [(user_id, plan_type) for user_id in user_ids for plan_type in plans.PLAN_TYPES
+             if f"{user_id}:{plan_type}" not in skip]
+    limiter = RateLimiter(rpm)
+    stats = {'users': len(user_ids), 'queued': len(tasks), 'generated': 0, 'empty': 0, 'failed': 0,
+             'skipped': len(user_ids) * len(plans.PLAN_TYPES) - len(tasks)}
+    failures = []
+    # Loaded up front: the worker threads only read this dict.
+    users = {user_id: User.get(user_id) for user_id in {user_id for user_id, _ in tasks}}
+
+    def job(user_id, plan_type):
+        """Returns the generated items, or None if the plan was stored meanwhile."""
+        if users[user_id] is None:
+            raise LookupError("user not found")
+        # The skip set is from startup; a dashboard job may have stored the plan since.
+        if plans.get_plan_items(user_id, plan_date, plan_type):
+            return None
+        limiter.acquire()
+        return plans.generate_plan_items(users[user_id], plan_date, plan_type)
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {pool.submit(job, user_id, plan_type): (user_id, plan_type) for user_id, plan_type in tasks}
+        for i, future in enumerate(as_completed(futures), 1):
+            user_id, plan_type = futures[future]
+            try:
+                items = future.result()
+                if items is None:
+                    stats['skipped'] += 1
+                    checkpoint.mark(f"{user_id}:{plan_type}")
+                elif items:
+                    stats['generated'] += 1
+                    checkpoint.mark(f"{user_id}:{plan_type}")
+                else:
+                    stats['empty'] += 1
+                    failures.append((user_id, plan_type, "empty AI response"))
+            except Exception as e:
+                stats['failed'] += 1
+                failures.append((user_id, plan_type, str(e)))
+            if i % 50 == 0:
+                elapsed = time.monotonic() - started
+                print(f"  {i}/{len(tasks)} done, {i / elapsed * 60:.1f} plans/min")
+
+    elapsed = time.monotonic() - started
+    stats['seconds'] = round(elapsed, 1)
+    stats['plans_per_minute'] = round(len(tasks) / elapsed * 60, 1) if elapsed and tasks else 0
+    return stats, failures
+
+
+def _positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError("must be at least 1")
+    return number
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-generate daily AI plans for active users.")
+    parser.add_argument('--date', type=date_cls.fromisoformat, help="Plan date (default: today in IST)")
+    parser.add_argument('--active-days', type=int, default=14, help="Users with any log in this many days")
+    parser.add_argument('--concurrency', type=_positive_int, default=4, help="Simultaneous Groq requests")
+    parser.add_argument('--rpm', type=_positive_int, default=30, help="Global Groq requests-per-minute budget")
+    parser.add_argument('--checkpoint', help="Checkpoint file (default: .plan_pregen_<date>.log)")
+    args = parser.parse_args()
+
+    plan_date = args.date or queries.ist_today()
+    stats, failures = run(plan_date, args.active_days, args.concurrency, args.rpm, args.checkpoint)
+    for user_id, plan_type, reason in failures:
+        print(f"FAILED user {user_id} {plan_type}: {reason}")
+    print(json.dumps(stats))
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""
+Date-range query layer for the log tables.
+
+Log rows store IST wall-clock datetimes. Filtering with `DATE(date) = ?` hides
+the column behind a function, so MySQL cannot use the (user_id, date) index.
+Everything here turns IST calendar days into half-open `[start, end)` datetime
+ranges instead, and every hot query is registered in hot_queries() so
+`python migrations.py explain` can verify it still uses an index.
+"""
+from datetime import datetime, time, timedelta
+
+import pytz
+
+from database import db
+
+IST = pytz.timezone('Asia/Kolkata')
+
+
+def ist_now():
+    return datetime.now(IST)
+
+
+def ist_today():
+    return ist_now().date()
+
+
+def day_range(first_day, last_day=None):
+    """Half-open datetime bounds covering the IST days first_day..last_day inclusive."""
+    last_day = last_day or first_day
+    return datetime.combine(first_day, time.min), datetime.combine(last_day + timedelta(days=1), time.min)
+
+
+def last_days_range(days, today=None):
+    """Bounds covering the last `days` IST days, today included."""
+    today = today or ist_today()
+    return day_range(today - timedelta(days=days - 1), today)
+
+
+MEALS_IN_RANGE = """SELECT * FROM meal_logs WHERE user_id = %s AND date >= %s AND date < %s ORDER BY date"""
+WORKOUTS_IN_RANGE = """SELECT * FROM workout_logs WHERE user_id = %s AND date >= %s AND date < %s ORDER BY date"""
+WEIGHTS_IN_RANGE = """SELECT * FROM weight_logs WHERE user_id = %s AND date >= %s AND date < %s ORDER BY date"""
+
+RECENT_MEALS = """SELECT name, calories FROM meal_logs
+                  WHERE user_id = %s AND date >= %s AND date < %s ORDER BY date DESC LIMIT %s"""
+RECENT_WORKOUTS = """SELECT type, duration FROM workout_logs
+                     WHERE user_id = %s AND date >= %s AND date < %s ORDER BY date DESC LIMIT %s"""
+WORKOUT_MINUTES_BY_DAY = """SELECT DATE(date) AS day, SUM(duration) AS minutes FROM workout_logs
+                            WHERE user_id = %s AND date >= %s AND date < %s GROUP BY DATE(date)"""
+
+LATEST_LOGS = {
+    'meal_logs': "SELECT * FROM meal_logs WHERE user_id = %s ORDER BY date DESC LIMIT %s",
+    'workout_logs': "SELECT * FROM workout_logs WHERE user_id = %s ORDER BY date DESC LIMIT %s",
+    'weight_logs': "SELECT * FROM weight_logs WHERE user_id = %s ORDER BY date DESC LIMIT %s",
+}
+
+
+def meals_between(user_id, first_day, last_day=None):
+    return db.execute_query(MEALS_IN_RANGE, (user_id, *day_range(first_day, last_day)), fetch_all=True) or []
+
+
+def workouts_between(user_id, first_day, last_day=None):
+    return db.execute_query(WORKOUTS_IN_RANGE, (user_id, *day_range(first_day, last_day)), fetch_all=True) or []
+
+
+def weights_between(user_id, first_day, last_day=None):
+    return db.execute_query(WEIGHTS_IN_RANGE, (user_id, *day_range(first_day, last_day)), fetch_all=True) or []
+
+
+def workout_minutes_by_day(user_id, first_day, last_day=None):
+    return db.execute_query(WORKOUT_MINUTES_BY_DAY, (user_id, *day_range(first_day, last_day)), fetch_all=True) or []
+
+
+def recent_meal_names(user_id, days, limit=10):
+    return db.execute_query(RECENT_MEALS, (user_id, *last_days_range(days), limit), fetch_all=True) or []
+
+
+def recent_workout_types(user_id, days, limit=10):
+    return db.execute_query(RECENT_WORKOUTS, (user_id, *last_days_range(days), limit), fetch_all=True) or []
+
+
+def latest_logs(table, user_id, limit=5):
+    return db.execute_query(LATEST_LOGS[table], (user_id, limit), fetch_all=True) or []
+
+
+def _sample_range():
+    return day_range(ist_today() - timedelta(days=6), ist_today())
+
+
+# name -> (sql, sample params) for the query constants above. Hot queries that
+# live in other modules are added by hot_queries(), which registers their own
+# constants so the checked SQL is always the SQL that runs.
+HOT_QUERIES = {
+    'meals_between': (MEALS_IN_RANGE, lambda: (1, *_sample_range())),
+    'workouts_between': (WORKOUTS_IN_RANGE, lambda: (1, *_sample_range())),
+    'weights_between': (WEIGHTS_IN_RANGE, lambda: (1, *_sample_range())),
+    'workout_minutes_by_day': (WORKOUT_MINUTES_BY_DAY, lambda: (1, *_sample_range())),
+    'recent_meal_names': (RECENT_MEALS, lambda: (1, *_sample_range(), 10)),
+    'recent_workout_types': (RECENT_WORKOUTS, lambda: (1, *_sample_range(), 10)),
+    'latest_meal_logs': (LATEST_LOGS['meal_logs'], lambda: (1, 5)),
+    'latest_workout_logs': (LATEST_LOGS['workout_logs'], lambda: (1, 5)),
+    'latest_weight_logs': (LATEST_LOGS['weight_logs'], lambda: (1, 5)),
+}
+
+
+def hot_queries():
+    """
+    HOT_QUERIES plus the hot queries other modules own, registered by the
+    constants those modules actually run. Imported here rather than at the
+    top because models imports this module.
+    """
+    import models
+    import plans
+    import streaks
+    import summaries
+
+    recent = lambda: (1, ist_today() - timedelta(days=29), ist_today())
+    return {
+        **HOT_QUERIES,
+        'daily_summaries_range': (summaries.SELECT_RANGE, recent),
+        'daily_summaries_updated': (summaries.SELECT_LAST_UPDATED, lambda: (1,)),
+        'daily_plan_items': (plans.SELECT_PLAN_ITEMS, lambda: (1, ist_today(), 'diet')),
+        'user_streak': (streaks.SELECT_STREAK, lambda: (1,)),
+        'user_by_id': (models.SELECT_USER_BY_ID, lambda: (1,)),
+        'user_by_email': (models.SELECT_USER_BY_EMAIL, lambda: ('someone@example.com',)),
+        'user_login': (models.SELECT_LOGIN, lambda: ('someone@example.com',)),
+    }
+
+
+def explain_hot_queries():
+    """
+    Runs EXPLAIN on every hot query and returns [(name, plan_row)] for each
+    plan step that reads a whole table (type ALL) or uses no index.
+    """
+    problems = []
+    for name, (sql, sample_params) in hot_queries().items():
+        for row in db.execute_query("EXPLAIN " + sql, sample_params(), fetch_all=True) or []:
+            # 'const'/'system' lookups and optimized-away steps report no key by design.
+            if row.get('type') == 'ALL' or (row.get('key') is None and row.get('type') not in (None, 'const', 'system')):
+                problems.append((name, row))
+    return problems
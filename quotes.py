@@ -0,0 +1,132 @@
+"""
+Daily motivational quotes, generated once per IST day for everyone.
+
+A pool of QUOTE_POOL_SIZE quotes is stored per day in the daily_quotes table
+and each user sees slot `user_id % pool size`, so the dashboard only ever
+reads. If today's pool does not exist yet, the dashboard shows the fallback
+quote and one background thread per process generates it (not retried for
+RETRY_AFTER_SECONDS after a run that stored nothing, so an outage does not
+turn every dashboard load into Groq calls). Run the generation ahead of time
+alongside the nightly plan pre-generation:
+
+    python quotes.py generate [--date YYYY-MM-DD] [--pool 5]
+"""
+import argparse
+import threading
+import time
+from datetime import date as date_cls
+
+import queries
+from ai_integration import QUOTE_FALLBACK, get_daily_quote
+from config import Config
+from database import db
+
+# Don't re-query an empty day more often than this (seconds).
+MISS_RECHECK_SECONDS = 60
+# After a generation that stored nothing (Groq down or only fallbacks), wait this long before retrying.
+RETRY_AFTER_SECONDS = 300
+
+
+class QuoteStore:
+    def __init__(self, pool_size=5):
+        self.pool_size = pool_size
+        self._day = None
+        self._pool = []
+        self._checked_at = 0.0
+        self._generating = set()
+        self._failed = {}  # day -> monotonic time of the last generation that stored nothing
+        self._lock = threading.Lock()
+
+    def _load(self, day):
+        rows = db.execute_query(
+            "SELECT quote FROM daily_quotes WHERE quote_date = %s ORDER BY slot", (day,), fetch_all=True
+        ) or []
+        return [row['quote'] for row in rows]
+
+    def pool(self, day):
+        """Returns the stored quotes for `day`, cached in memory once found."""
+        with self._lock:
+            if self._day == day and (self._pool or time.monotonic() - self._checked_at < MISS_RECHECK_SECONDS):
+                return self._pool
+        try:
+            pool = self._load(day)
+        except Exception as e:
+            print(f"Quote load failed: {e}")
+            pool = []
+        with self._lock:
+            self._day, self._pool, self._checked_at = day, pool, time.monotonic()
+        return pool
+
+    def generate(self, day, pool_size=None):
+        """Asks the AI for the day's pool and stores it. Returns how many quotes were stored."""
+        quotes = []
+        for _ in range(pool_size or self.pool_size):
+            quote = get_daily_quote().strip().strip('"')
+            if quote and quote != QUOTE_FALLBACK and quote not in quotes:
+                quotes.append(quote[:500])
+        if quotes:
+            # INSERT IGNORE: whichever process finishes first wins each slot.
+            db.execute_query(
+                "INSERT IGNORE INTO daily_quotes (quote_date, slot, quote) VALUES " +
+                ", ".join(["(%s, %s, %s)"] * len(quotes)),
+                tuple(value for slot, quote in enumerate(quotes) for value in (day, slot, quote)),
+                commit=True
+            )
+            with self._lock:
+                if self._day == day:
+                    self._checked_at = 0.0
+        return len(quotes)
+
+    def _generate_in_background(self, day):
+        with self._lock:
+            if day in self._generating:
+                return
+            failed_at = self._failed.get(day)
+            if failed_at is not None and time.monotonic() - failed_at < RETRY_AFTER_SECONDS:
+                return
+            self._failed.pop(day, None)
+            self._generating.add(day)
+
+        def job():
+            stored = 0
+            try:
+                stored = self.generate(day)
+            except Exception as e:
+                print(f"Quote generation failed: {e}")
+            finally:
+                with self._lock:
+                    self._generating.discard(day)
+                    if not stored:
+                        # Only the current day is ever requested, so older entries can go.
+                        self._failed = {day: time.monotonic()}
+
+        threading.Thread(target=job, name='quote-generate', daemon=True).start()
+
+    def quote_for(self, user_id, day):
+        """Today's quote for this user, or the fallback while the pool is being generated."""
+        pool = self.pool(day)
+        if not pool:
+            self._generate_in_background(day)
+            return QUOTE_FALLBACK
+        return pool[user_id % len(pool)]
+
+
+quote_store = QuoteStore(Config.QUOTE_POOL_SIZE)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate the shared daily quote pool.")
+    parser.add_argument('command', choices=['generate'])
+    parser.add_argument('--date', type=date_cls.fromisoformat, help="Quote date (default: today in IST)")
+    parser.add_argument('--pool', type=int, default=Config.QUOTE_POOL_SIZE, help="Quotes to generate")
+    args = parser.parse_args()
+
+    day = args.date or queries.ist_today()
+    stored = quote_store.generate(day, args.pool)
+    print(f"Stored {stored} quotes for {day.isoformat()}.")
+    if not stored:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
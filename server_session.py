@@ -0,0 +1,293 @@
+"""
+Server-side session storage.
+
+With SESSION_BACKEND set to 'sqlite' (one node) or 'mysql' (several nodes),
+the session cookie carries only a signed session id and the data lives in the
+store. Data is loaded on first access, written back only when the session was
+modified, and rows idle longer than their TTL are garbage-collected. A
+signed id whose record is gone is treated as a new session, and `regenerate()`
+(called on login and logout) moves the data to a fresh id, so a planted
+cookie cannot fix a victim's session id:
+
+    python server_session.py gc
+
+SESSION_BACKEND=cookie (the default) keeps Flask's signed-cookie sessions.
+"""
+import argparse
+import secrets
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from flask import session
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import BadSignature, URLSafeSerializer
+
+from database import db
+
+# How often (seconds) a web process deletes expired sessions on its own.
+GC_INTERVAL_SECONDS = 600
+
+
+class ServerSideSession(SessionMixin):
+    """Session mapping (SessionMixin is a MutableMapping) fetched from the store on first use."""
+
+    def __init__(self, sid=None, loader=None):
+        self.sid = sid
+        self.new = sid is None
+        self.modified = False
+        self.accessed = False
+        self.expires_at = None
+        self._loader = loader
+        self._data = None
+        self.replaced_sid = None  # record to delete on save, set by regenerate()
+
+    @property
+    def loaded(self):
+        return self._data is not None
+
+    @property
+    def data(self):
+        self.accessed = True
+        if self._data is None:
+            record = self._loader(self.sid) if self._loader and self.sid else None
+            self._data, self.expires_at = record if record else ({}, None)
+            if record is None and self.sid is not None:
+                # Expired, deleted or never issued by us: never adopt a client-chosen id.
+                self.sid, self.new = None, True
+        return self._data
+
+    def regenerate(self):
+        """Keeps the data but gives the session a new id; the old record is deleted on save."""
+        self.data  # load before the id changes
+        if self.sid is not None:
+            self.replaced_sid = self.sid
+        self.sid, self.new, self.modified = None, True, True
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __setitem__(self, key, value):
+        self.data[key] = value
+        self.modified = True
+
+    def __delitem__(self, key):
+        del self.data[key]
+        self.modified = True
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __len__(self):
+        return len(self.data)
+
+
+class SQLiteSessionStore:
+    """Sessions in a local SQLite file; suitable for a single application node."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._conn().execute(
+            """CREATE TABLE IF NOT EXISTS sessions (
+                   sid TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL)"""
+        )
+        self._conn().execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions (expires_at)")
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def load(self, sid):
+        row = self._conn().execute(
+            "SELECT data, expires_at FROM sessions WHERE sid = ? AND expires_at > ?", (sid, time.time())
+        ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def save(self, sid, data, expires_at):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO sessions (sid, data, expires_at) VALUES (?, ?, ?)", (sid, data, expires_at)
+        )
+
+    def touch(self, sid, expires_at):
+        self._conn().execute("UPDATE sessions SET expires_at = ? WHERE sid = ?", (expires_at, sid))
+
+    def delete(self, sid):
+        self._conn().execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+
+    def gc(self):
+        return self._conn().execute("DELETE FROM sessions WHERE expires_at <= ?", (time.time(),)).rowcount
+
+
+class MySQLSessionStore:
+    """Sessions in the shared `sessions` table (migration 8); works across nodes."""
+
+    def load(self, sid):
+        row = db.execute_query(
+            "SELECT data, expires_at FROM sessions WHERE sid = %s AND expires_at > UTC_TIMESTAMP()",
+            (sid,), fetch_one=True
+        )
+        return (row['data'], row['expires_at'].timestamp()) if row else None
+
+    def save(self, sid, data, expires_at):
+        db.execute_query(
+            """INSERT INTO sessions (sid, data, expires_at) VALUES (%s, %s, %s)
+               ON DUPLICATE KEY UPDATE data = VALUES(data), expires_at = VALUES(expires_at)""",
+            (sid, data, datetime.utcfromtimestamp(expires_at)), commit=True
+        )
+
+    def touch(self, sid, expires_at):
+        db.execute_query(
+            "UPDATE sessions SET expires_at = %s WHERE sid = %s",
+            (datetime.utcfromtimestamp(expires_at), sid), commit=True
+        )
+
+    def delete(self, sid):
+        db.execute_query("DELETE FROM sessions WHERE sid = %s", (sid,), commit=True)
+
+    def gc(self):
+        expired = db.execute_query(
+            "SELECT COUNT(*) AS n FROM sessions WHERE expires_at <= UTC_TIMESTAMP()", fetch_one=True
+        )['n']
+        db.execute_query("DELETE FROM sessions WHERE expires_at <= UTC_TIMESTAMP()", commit=True)
+        return expired
+
+
+class ServerSessionInterface(SessionInterface):
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, store, ttl):
+        self.store = store
+        self.ttl = ttl
+        self._last_gc = time.monotonic()
+
+    def _signer(self, app):
+        return URLSafeSerializer(app.secret_key, salt='session-id')
+
+    def _loader(self, sid):
+        try:
+            record = self.store.load(sid)
+        except Exception as e:
+            print(f"Session load failed: {e}")
+            return None
+        if record is None:
+            return None
+        return self.serializer.loads(record[0]), record[1]
+
+    def _lifetime(self, app, session):
+        return app.permanent_session_lifetime.total_seconds() if session.permanent else self.ttl
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                return ServerSideSession(self._signer(app).loads(cookie), self._loader)
+            except BadSignature:
+                pass
+        return ServerSideSession(loader=self._loader)
+
+    def save_session(self, app, session, response):
+        if not session.loaded:
+            return  # never touched during this request
+        response.vary.add('Cookie')
+        name, domain, path = self.get_cookie_name(app), self.get_cookie_domain(app), self.get_cookie_path(app)
+
+        if session.replaced_sid:
+            try:
+                self.store.delete(session.replaced_sid)
+            except Exception as e:
+                print(f"Session delete failed: {e}")
+            session.replaced_sid = None
+            if not session:
+                response.delete_cookie(name, domain=domain, path=path)
+                return
+
+        if not session:
+            if session.sid and session.modified:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        now = time.time()
+        lifetime = self._lifetime(app, session)
+        try:
+            if session.modified or session.new:
+                session.sid = session.sid or secrets.token_urlsafe(32)
+                self.store.save(session.sid, self.serializer.dumps(dict(session)), now + lifetime)
+            elif session.expires_at is not None and session.expires_at - now < lifetime / 2:
+                # Sliding expiry without rewriting the data.
+                self.store.touch(session.sid, now + lifetime)
+            else:
+                return
+        except Exception as e:
+            print(f"Session save failed: {e}")
+            return
+        finally:
+            self._maybe_gc()
+
+        if session.new or session.permanent:
+            response.set_cookie(
+                name, self._signer(app).dumps(session.sid),
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app), domain=domain, path=path,
+                secure=self.get_cookie_secure(app), samesite=self.get_cookie_samesite(app),
+            )
+
+    def _maybe_gc(self):
+        if time.monotonic() - self._last_gc < GC_INTERVAL_SECONDS:
+            return
+        self._last_gc = time.monotonic()
+        try:
+            self.store.gc()
+        except Exception as e:
+            print(f"Session GC failed: {e}")
+
+
+def regenerate():
+    """
+    Issues a new session id for the current session (login, logout). Cookie
+    sessions have no server-side id to fix, so they are left alone.
+    """
+    if isinstance(session, ServerSideSession):
+        session.regenerate()
+
+
+def make_store(backend, sqlite_path=None):
+    if backend == 'sqlite':
+        return SQLiteSessionStore(sqlite_path)
+    if backend == 'mysql':
+        return MySQLSessionStore()
+    raise ValueError(f"Unknown SESSION_BACKEND: {backend}")
+
+
+def init_app(app):
+    """Installs the server-side session interface unless SESSION_BACKEND is 'cookie'."""
+    backend = app.config.get('SESSION_BACKEND', 'cookie')
+    if backend == 'cookie':
+        return
+    store = make_store(backend, app.config.get('SESSION_SQLITE_PATH'))
+    app.session_interface = ServerSessionInterface(store, app.config.get('SESSION_TTL', 7 * 24 * 3600))
+
+
+def main():
+    from config import Config
+
+    parser = argparse.ArgumentParser(description="Maintain the server-side session store.")
+    parser.add_argument('command', choices=['gc'])
+    parser.parse_args()
+
+    if Config.SESSION_BACKEND == 'cookie':
+        print("SESSION_BACKEND is 'cookie'; nothing is stored server-side.")
+        return
+    removed = make_store(Config.SESSION_BACKEND, Config.SESSION_SQLITE_PATH).gc()
+    print(f"Removed {removed} expired sessions.")
+
+
+if __name__ == '__main__':
+    main()
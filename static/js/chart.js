@@ -2,10 +2,8 @@ document.addEventListener('DOMContentLoaded', function () {
     // Initialize all charts on the page
     const charts = document.querySelectorAll('.chart-container canvas');
 
-    charts.forEach(chartElement => {
+    function drawChart(chartElement, chartType, chartData, title) {
         const ctx = chartElement.getContext('2d');
-        const chartType = chartElement.dataset.chartType || 'line';
-        const chartData = JSON.parse(chartElement.dataset.chartData || '{}');
 
         new Chart(ctx, {
             type: chartType,
@@ -13,12 +11,42 @@ document.addEventListener('DOMContentLoaded', function () {
             options: {
                 responsive: true,
                 maintainAspectRatio: false,
+                plugins: {
+                    title: { display: Boolean(title), text: title }
+                },
                 scales: {
                     y: {
-                        beginAtZero: false
+                        beginAtZero: chartType === 'bar'
                     }
                 }
             }
         });
+    }
+
+    // Charts with a data-chart-url load their series as JSON from /api/charts/<series>.
+    // The browser revalidates with If-None-Match, so unchanged data costs a 304.
+    function loadChart(chartElement) {
+        fetch(chartElement.dataset.chartUrl, { credentials: 'same-origin' })
+            .then(response => response.json())
+            .then(chart => {
+                if (chart.empty) {
+                    const placeholder = chartElement.parentElement.querySelector('.chart-empty');
+                    chartElement.style.display = 'none';
+                    if (placeholder) placeholder.style.display = 'block';
+                    return;
+                }
+                drawChart(chartElement, chart.type, chart.data, chart.title);
+            })
+            .catch(error => console.error('Chart error:', error));
+    }
+
+    charts.forEach(chartElement => {
+        if (chartElement.dataset.chartUrl) {
+            loadChart(chartElement);
+            return;
+        }
+        const chartType = chartElement.dataset.chartType || 'line';
+        const chartData = JSON.parse(chartElement.dataset.chartData || '{}');
+        drawChart(chartElement, chartType, chartData);
     });
-});
\ No newline at end of file
+});
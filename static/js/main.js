@@ -120,6 +120,10 @@ document.addEventListener('DOMContentLoaded', function () {
         addMessage('...', 'assistant', true);
 
         try {
+            if (window.ReadableStream && window.TextDecoder) {
+                await streamReply(prompt);
+                return;
+            }
             const response = await fetch('/api/chat', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
@@ -132,12 +136,116 @@ document.addEventListener('DOMContentLoaded', function () {
             addMessage(data.reply, 'assistant');
 
         } catch (error) {
-            document.querySelector('.typing-indicator').remove();
+            const typing = document.querySelector('.typing-indicator');
+            if (typing) typing.remove();
             addMessage('Error connecting to the assistant.', 'assistant');
             console.error('Chat error:', error);
         }
     });
 
+    // Reads the Server-Sent Events from /api/chat/stream, rendering the Markdown
+    // as it grows, then swaps in the server's HTML and stores the reply in history.
+    async function streamReply(prompt) {
+        const response = await fetch('/api/chat/stream', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ prompt: prompt })
+        });
+        if (!response.ok || !response.body) throw new Error('HTTP ' + response.status);
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let markdown = '';
+        let messageDiv = null;
+        let renderFrame = null;
+
+        const render = () => {
+            renderFrame = null;
+            messageDiv.innerHTML = renderMarkdown(markdown);
+            messagesContainer.scrollTop = messagesContainer.scrollHeight;
+        };
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const rawEvent = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                const eventName = (rawEvent.match(/^event: (.*)$/m) || [])[1] || 'message';
+                const dataLine = (rawEvent.match(/^data: (.*)$/m) || [])[1];
+                if (!dataLine) continue;
+                const payload = JSON.parse(dataLine);
+
+                if (!messageDiv) {
+                    document.querySelector('.typing-indicator').remove();
+                    messageDiv = addMessage('', 'assistant');
+                }
+                if (eventName === 'done') {
+                    // A frame still queued would overwrite the server's HTML with the approximation.
+                    if (renderFrame !== null) cancelAnimationFrame(renderFrame);
+                    renderFrame = null;
+                    messageDiv.innerHTML = payload.html;
+                    fetch('/api/chat/history', {
+                        method: 'POST',
+                        headers: { 'Content-Type': 'application/json' },
+                        body: JSON.stringify({ receipt: payload.receipt })
+                    });
+                } else {
+                    markdown += payload.token;
+                    if (renderFrame === null) {
+                        renderFrame = requestAnimationFrame(render);
+                    }
+                }
+            }
+        }
+    }
+
+    // Minimal incremental Markdown renderer for partial replies: paragraphs,
+    // headings, bullet/numbered lists, bold, italics and inline code.
+    function renderMarkdown(source) {
+        const escape = (text) => text.replace(/&/g, '&amp;').replace(/</g, '&lt;').replace(/>/g, '&gt;');
+        const inline = (text) => escape(text)
+            .replace(/`([^`]+)`/g, '<code>$1</code>')
+            .replace(/\*\*([^*]+)\*\*/g, '<strong>$1</strong>')
+            .replace(/\*([^*]+)\*/g, '<em>$1</em>');
+
+        let html = '';
+        let listTag = null;
+        const closeList = () => {
+            if (listTag) html += `</${listTag}>`;
+            listTag = null;
+        };
+
+        source.split('\n').forEach(line => {
+            const bullet = line.match(/^\s*[-*+]\s+(.*)$/);
+            const numbered = line.match(/^\s*\d+[.)]\s+(.*)$/);
+            const heading = line.match(/^(#{1,6})\s+(.*)$/);
+            if (bullet || numbered) {
+                const tag = bullet ? 'ul' : 'ol';
+                if (listTag !== tag) {
+                    closeList();
+                    html += `<${tag}>`;
+                    listTag = tag;
+                }
+                html += `<li>${inline((bullet || numbered)[1])}</li>`;
+            } else if (heading) {
+                closeList();
+                html += `<h${heading[1].length}>${inline(heading[2])}</h${heading[1].length}>`;
+            } else if (line.trim()) {
+                closeList();
+                html += `<p>${inline(line)}</p>`;
+            } else {
+                closeList();
+            }
+        });
+        closeList();
+        return html;
+    }
+
     function addMessage(text, role, isTyping = false) {
         const messageDiv = document.createElement('div');
         messageDiv.className = `ai-chat-message ${role}`;
@@ -153,5 +261,6 @@ document.addEventListener('DOMContentLoaded', function () {
 
         messagesContainer.appendChild(messageDiv);
         messagesContainer.scrollTop = messagesContainer.scrollHeight;
+        return messageDiv;
     }
 });
\ No newline at end of file
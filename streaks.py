@@ -0,0 +1,110 @@
+"""
+Stored activity streaks, so the dashboard never scans a user's full log history.
+
+A `user_streaks` row keeps the run of consecutive active IST days ending on
+`last_active_date` plus the longest run ever seen. Meal and workout inserts call
+`record_activity`; backfills and deletes go through `recompute`:
+
+    python streaks.py recompute [--user ID]
+"""
+import argparse
+from datetime import timedelta
+
+from database import db
+from migrations import migrate
+
+SELECT_STREAK = "SELECT current_streak, longest_streak, last_active_date FROM user_streaks WHERE user_id = %s"
+
+
+def _save(user_id, current, longest, last_active):
+    db.execute_query(
+        """INSERT INTO user_streaks (user_id, current_streak, longest_streak, last_active_date)
+           VALUES (%s, %s, %s, %s)
+           ON DUPLICATE KEY UPDATE current_streak = VALUES(current_streak),
+               longest_streak = VALUES(longest_streak), last_active_date = VALUES(last_active_date)""",
+        (user_id, current, longest, last_active), commit=True
+    )
+
+
+def _runs(dates):
+    """Given active dates newest-first, returns (run ending at dates[0], longest run)."""
+    if not dates:
+        return 0, 0
+    current, longest, run = None, 1, 1
+    for newer, older in zip(dates, dates[1:]):
+        if newer - older == timedelta(days=1):
+            run += 1
+        else:
+            if current is None:
+                current = run
+            run = 1
+        longest = max(longest, run)
+    return (run if current is None else current), longest
+
+
+def recompute(user_id):
+    """Rebuilds a user's streak row from the raw logs. Use after backfills or deletes."""
+    query = """
+        (SELECT DISTINCT DATE(date) as log_date FROM meal_logs WHERE user_id = %s)
+        UNION
+        (SELECT DISTINCT DATE(date) as log_date FROM workout_logs WHERE user_id = %s)
+        ORDER BY log_date DESC;
+    """
+    dates = [row['log_date'] for row in db.execute_query(query, (user_id, user_id), fetch_all=True) or []]
+    current, longest = _runs(dates)
+    last_active = dates[0] if dates else None
+    _save(user_id, current, longest, last_active)
+    return {'current_streak': current, 'longest_streak': longest, 'last_active_date': last_active}
+
+
+def _load(user_id):
+    return db.execute_query(SELECT_STREAK, (user_id,), fetch_one=True)
+
+
+def record_activity(user_id, day):
+    """Advances the stored streak for an activity logged on `day` (an IST date)."""
+    try:
+        state = _load(user_id)
+        if not state:
+            recompute(user_id)
+            return
+        last_active = state['last_active_date']
+        if last_active is not None and day < last_active:
+            # Back-dated entry: it may bridge an old gap, so rebuild from the logs.
+            recompute(user_id)
+            return
+        if last_active == day:
+            return
+        current = state['current_streak'] + 1 if last_active == day - timedelta(days=1) else 1
+        _save(user_id, current, max(state['longest_streak'], current), day)
+    except Exception as e:
+        print(f"Streak update failed: {e}")
+
+
+def get_streak(user_id, today):
+    """
+    Returns the streak shown on the dashboard: the run ending on the last active
+    day, provided that day is today or yesterday, otherwise 0.
+    """
+    state = _load(user_id) or recompute(user_id)
+    last_active = state['last_active_date']
+    if last_active in (today, today - timedelta(days=1)):
+        return state['current_streak']
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the user_streaks table.")
+    parser.add_argument('command', choices=['recompute'])
+    parser.add_argument('--user', type=int, help="Limit to a single user id")
+    args = parser.parse_args()
+
+    migrate()
+    user_ids = [args.user] if args.user else [row['id'] for row in db.execute_query("SELECT id FROM users", fetch_all=True) or []]
+    for user_id in user_ids:
+        recompute(user_id)
+    print(f"Recomputed streaks for {len(user_ids)} users.")
+
+
+if __name__ == '__main__':
+    main()
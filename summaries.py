@@ -0,0 +1,197 @@
+"""
+Per-user, per-day rollups of the meal, workout and weight logs.
+
+Every log write bumps the matching `daily_summaries` row, so the dashboard can
+read a small date range instead of aggregating the raw log tables. Run this
+module directly to backfill/rebuild the table or to check it against the logs:
+
+    python summaries.py rebuild [--user ID]
+    python summaries.py check [--user ID] [--fix]
+"""
+import argparse
+
+from database import db
+from migrations import migrate
+
+SUMMARY_COLUMNS = ('calories_in', 'calories_burned', 'protein', 'carbs', 'fat',
+                   'meal_count', 'workout_count', 'weight_count', 'last_weight')
+
+SELECT_RANGE = f"""SELECT day, {', '.join(SUMMARY_COLUMNS)} FROM daily_summaries
+                   WHERE user_id = %s AND day BETWEEN %s AND %s ORDER BY day"""
+SELECT_LAST_UPDATED = "SELECT MAX(updated_at) AS updated_at FROM daily_summaries WHERE user_id = %s"
+
+
+def _apply(query, params):
+    # The log row is already committed at this point; a failed rollup must not
+    # turn a successful log into an error page. `check --fix` repairs drift.
+    try:
+        db.execute_query(query, params, commit=True)
+    except Exception as e:
+        print(f"Daily summary update failed: {e}")
+
+
+def record_meal(user_id, log_time, calories, protein=None, carbs=None, fat=None):
+    _apply(
+        """INSERT INTO daily_summaries (user_id, day, calories_in, protein, carbs, fat, meal_count)
+           VALUES (%s, %s, %s, %s, %s, %s, 1)
+           ON DUPLICATE KEY UPDATE
+               calories_in = calories_in + VALUES(calories_in),
+               protein = protein + VALUES(protein),
+               carbs = carbs + VALUES(carbs),
+               fat = fat + VALUES(fat),
+               meal_count = meal_count + 1""",
+        (user_id, log_time.date(), float(calories or 0), float(protein or 0), float(carbs or 0), float(fat or 0))
+    )
+
+
+def record_workout(user_id, log_time, calories_burned):
+    _apply(
+        """INSERT INTO daily_summaries (user_id, day, calories_burned, workout_count)
+           VALUES (%s, %s, %s, 1)
+           ON DUPLICATE KEY UPDATE
+               calories_burned = calories_burned + VALUES(calories_burned),
+               workout_count = workout_count + 1""",
+        (user_id, log_time.date(), float(calories_burned or 0))
+    )
+
+
+def record_weight(user_id, log_time, weight):
+    _apply(
+        """INSERT INTO daily_summaries (user_id, day, last_weight, weight_count)
+           VALUES (%s, %s, %s, 1)
+           ON DUPLICATE KEY UPDATE
+               last_weight = VALUES(last_weight),
+               weight_count = weight_count + 1""",
+        (user_id, log_time.date(), float(weight))
+    )
+
+
+def get_range(user_id, start_day, end_day):
+    """Returns {day: summary_row} for start_day..end_day inclusive (missing days are absent)."""
+    rows = db.execute_query(SELECT_RANGE, (user_id, start_day, end_day), fetch_all=True) or []
+    return {row['day']: row for row in rows}
+
+
+def last_updated(user_id):
+    """When any of the user's summary rows last changed (None if they have none)."""
+    row = db.execute_query(SELECT_LAST_UPDATED, (user_id,), fetch_one=True)
+    return row['updated_at'] if row else None
+
+
+def empty_summary():
+    summary = {column: 0 for column in SUMMARY_COLUMNS}
+    summary['last_weight'] = None
+    return summary
+
+
+# --- Backfill / consistency -------------------------------------------------
+
+# Aggregates computed straight from the raw logs, one row per (user, day).
+RAW_AGGREGATES = {
+    'meals': """SELECT user_id, DATE(date) AS day, SUM(calories) AS calories_in,
+                       SUM(COALESCE(protein, 0)) AS protein, SUM(COALESCE(carbs, 0)) AS carbs,
+                       SUM(COALESCE(fat, 0)) AS fat, COUNT(*) AS meal_count
+                FROM meal_logs {where} GROUP BY user_id, DATE(date)""",
+    'workouts': """SELECT user_id, DATE(date) AS day, SUM(COALESCE(calories_burned, 0)) AS calories_burned,
+                          COUNT(*) AS workout_count
+                   FROM workout_logs {where} GROUP BY user_id, DATE(date)""",
+    'weights': """SELECT user_id, DATE(date) AS day, COUNT(*) AS weight_count,
+                         CAST(SUBSTRING_INDEX(GROUP_CONCAT(weight ORDER BY date DESC), ',', 1) AS DECIMAL(6,2)) AS last_weight
+                  FROM weight_logs {where} GROUP BY user_id, DATE(date)""",
+}
+
+
+def _raw_aggregates(user_id=None):
+    where, params = ("WHERE user_id = %s", (user_id,)) if user_id else ("", ())
+    merged = {}
+    for query in RAW_AGGREGATES.values():
+        for row in db.execute_query(query.format(where=where), params, fetch_all=True) or []:
+            key = (row.pop('user_id'), row.pop('day'))
+            merged.setdefault(key, empty_summary()).update(row)
+    return merged
+
+
+def rebuild(user_id=None):
+    """Recomputes daily_summaries from the raw logs for one user or everyone."""
+    aggregates = _raw_aggregates(user_id)
+    with db.connection() as connection:
+        cursor = connection.cursor()
+        try:
+            if user_id:
+                cursor.execute("DELETE FROM daily_summaries WHERE user_id = %s", (user_id,))
+            else:
+                cursor.execute("DELETE FROM daily_summaries")
+            rows = [(uid, day) + tuple(summary[column] for column in SUMMARY_COLUMNS)
+                    for (uid, day), summary in aggregates.items()]
+            if rows:
+                cursor.executemany(
+                    f"""INSERT INTO daily_summaries (user_id, day, {', '.join(SUMMARY_COLUMNS)})
+                        VALUES ({', '.join(['%s'] * (len(SUMMARY_COLUMNS) + 2))})""",
+                    rows
+                )
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            cursor.close()
+    return len(aggregates)
+
+
+def _differs(expected, actual):
+    for column in SUMMARY_COLUMNS:
+        a, b = expected.get(column), actual.get(column)
+        if a is None or b is None:
+            if a != b:
+                return True
+        elif abs(float(a) - float(b)) > 0.01:
+            return True
+    return False
+
+
+def check(user_id=None):
+    """Returns [(user_id, day, expected, actual)] for every summary row that disagrees with the logs."""
+    expected = _raw_aggregates(user_id)
+    where, params = ("WHERE user_id = %s", (user_id,)) if user_id else ("", ())
+    stored = {
+        (row.pop('user_id'), row.pop('day')): row
+        for row in db.execute_query(
+            f"SELECT user_id, day, {', '.join(SUMMARY_COLUMNS)} FROM daily_summaries {where}",
+            params, fetch_all=True
+        ) or []
+    }
+    mismatches = []
+    for key in sorted(set(expected) | set(stored)):
+        exp, act = expected.get(key, empty_summary()), stored.get(key, empty_summary())
+        if _differs(exp, act):
+            mismatches.append((key[0], key[1], exp, act))
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the daily_summaries rollup table.")
+    parser.add_argument('command', choices=['rebuild', 'check'])
+    parser.add_argument('--user', type=int, help="Limit to a single user id")
+    parser.add_argument('--fix', action='store_true', help="With 'check', rebuild users that have drifted")
+    args = parser.parse_args()
+
+    migrate()
+    if args.command == 'rebuild':
+        count = rebuild(args.user)
+        print(f"Rebuilt {count} daily summary rows.")
+        return
+
+    mismatches = check(args.user)
+    for uid, day, exp, act in mismatches:
+        print(f"user {uid} {day}: expected {exp} got {act}")
+    print(f"{len(mismatches)} inconsistent daily summary rows.")
+    if args.fix:
+        for uid in sorted({uid for uid, *_ in mismatches}):
+            rebuild(uid)
+        print("Rebuilt affected users.")
+    if mismatches and not args.fix:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,251 @@
+"""
+Adaptive maintenance-calorie (TDEE) estimates from what users log.
+
+Each completed IST day with logged meals gives one observation:
+
+    expenditure = intake - change in smoothed weight trend x 7700 kcal/kg
+
+and the estimate is an exponential moving average of those observations,
+seeded from the profile formula. The weight trend is itself an exponential
+moving average of weigh-ins, so a single noisy reading barely moves it.
+
+The `tdee_state` row per user holds the estimate, the trend and the last day
+folded in; `record_log` only folds in days completed since then, so a log
+costs one small daily_summaries range read. Users who set
+`adaptive_calories` get `daily_calories` = estimate + goal adjustment once
+MIN_LOGGED_DAYS days have been folded in. After a model change:
+
+    python tdee.py recompute [--user ID]
+"""
+import argparse
+from datetime import timedelta
+from types import SimpleNamespace
+
+import queries
+from analytics import KCAL_PER_KG
+from database import db
+from migrations import migrate
+from models import user_cache
+
+ACTIVITY_MULTIPLIERS = {'sedentary': 1.2, 'light': 1.375, 'moderate': 1.55, 'active': 1.725, 'very_active': 1.9}
+GOAL_ADJUSTMENTS = {'lose': -500, 'maintain': 0, 'gain': 500}
+DEFAULT_MAINTENANCE = 2000
+
+TREND_ALPHA = 0.1        # weight trend smoothing per weigh-in
+EXPENDITURE_DAYS = 21    # span of the expenditure moving average
+MIN_LOGGED_DAYS = 14     # before the adaptive estimate replaces the formula
+MIN_LOGGED_KCAL = 800    # days logged below this are treated as incomplete
+ESTIMATE_BOUNDS = (1000, 5000)
+
+
+def formula_maintenance(user):
+    """Harris-Benedict BMR x activity multiplier, or None if the profile is incomplete."""
+    if not all([user.age, user.height, user.weight, user.gender, user.activity_level]):
+        return None
+    if user.gender.lower() == 'male':
+        bmr = 88.362 + (13.397 * float(user.weight)) + (4.799 * float(user.height)) - (5.677 * int(user.age))
+    else:
+        bmr = 447.593 + (9.247 * float(user.weight)) + (3.098 * float(user.height)) - (4.330 * int(user.age))
+    return bmr * ACTIVITY_MULTIPLIERS.get(user.activity_level, 1.2)
+
+
+def daily_target(maintenance, fitness_goal):
+    return int(maintenance + GOAL_ADJUSTMENTS.get(fitness_goal, 0))
+
+
+def _advance(state, rows, first_day, last_day):
+    """Folds the days first_day..last_day into `state` in place. `rows` maps day -> summary row."""
+    day = first_day
+    while day <= last_day:
+        row = rows.get(day)
+        previous_trend = state['trend_weight']
+        if row and row['last_weight'] is not None:
+            weight = float(row['last_weight'])
+            state['trend_weight'] = weight if previous_trend is None else previous_trend + TREND_ALPHA * (weight - previous_trend)
+        # Only a fully logged day with a trend on both sides says anything about
+        # expenditure; trend movement across unlogged days is not attributed.
+        if row and row['meal_count'] and float(row['calories_in']) >= MIN_LOGGED_KCAL and previous_trend is not None:
+            observed = float(row['calories_in']) - (state['trend_weight'] - previous_trend) * KCAL_PER_KG
+            estimate = state['maintenance'] + (observed - state['maintenance']) / EXPENDITURE_DAYS
+            state['maintenance'] = min(max(estimate, ESTIMATE_BOUNDS[0]), ESTIMATE_BOUNDS[1])
+            state['logged_days'] += 1
+        state['last_day'] = day
+        day += timedelta(days=1)
+    return state
+
+
+def _summaries(user_id, first_day, last_day):
+    rows = db.execute_query(
+        """SELECT day, calories_in, meal_count, last_weight FROM daily_summaries
+           WHERE user_id = %s AND day BETWEEN %s AND %s""",
+        (user_id, first_day, last_day), fetch_all=True
+    ) or []
+    return {row['day']: row for row in rows}
+
+
+def _load(user_id):
+    return db.execute_query(
+        "SELECT maintenance, trend_weight, last_day, logged_days FROM tdee_state WHERE user_id = %s",
+        (user_id,), fetch_one=True
+    )
+
+
+def _save(user_id, state):
+    db.execute_query(
+        """INSERT INTO tdee_state (user_id, maintenance, trend_weight, last_day, logged_days)
+           VALUES (%s, %s, %s, %s, %s)
+           ON DUPLICATE KEY UPDATE maintenance = VALUES(maintenance), trend_weight = VALUES(trend_weight),
+               last_day = VALUES(last_day), logged_days = VALUES(logged_days)""",
+        (user_id, state['maintenance'], state['trend_weight'], state['last_day'], state['logged_days']),
+        commit=True
+    )
+
+
+def _profile(user_id):
+    row = db.execute_query(
+        """SELECT age, height, weight, gender, activity_level, fitness_goal, adaptive_calories
+           FROM users WHERE id = %s""",
+        (user_id,), fetch_one=True
+    )
+    return SimpleNamespace(**row) if row else None
+
+
+def _initial_state(user):
+    return {'maintenance': formula_maintenance(user) or DEFAULT_MAINTENANCE,
+            'trend_weight': None, 'last_day': None, 'logged_days': 0}
+
+
+def _apply_target(user_id, user, state):
+    if user.adaptive_calories and state['logged_days'] >= MIN_LOGGED_DAYS:
+        db.execute_query(
+            "UPDATE users SET daily_calories = %s WHERE id = %s",
+            (daily_target(state['maintenance'], user.fitness_goal), user_id), commit=True
+        )
+        user_cache.invalidate(user_id)
+
+
+def recompute(user_id, today=None):
+    """Refits a user's state from their whole history. Use after backfills or model changes."""
+    user = _profile(user_id)
+    if user is None:
+        return None
+    yesterday = (today or queries.ist_today()) - timedelta(days=1)
+    first = db.execute_query("SELECT MIN(day) AS day FROM daily_summaries WHERE user_id = %s",
+                             (user_id,), fetch_one=True)['day']
+    state = _initial_state(user)
+    if first is not None and first <= yesterday:
+        _advance(state, _summaries(user_id, first, yesterday), first, yesterday)
+    state['last_day'] = state['last_day'] or yesterday
+    _save(user_id, state)
+    _apply_target(user_id, user, state)
+    return state
+
+
+def record_log(user_id, day, today=None):
+    """Folds in any days completed since the last update; a log dated before that triggers a refit."""
+    try:
+        today = today or queries.ist_today()
+        state = _load(user_id)
+        if not state or day <= state['last_day']:
+            recompute(user_id, today)
+            return
+        yesterday = today - timedelta(days=1)
+        if state['last_day'] >= yesterday:
+            return
+        state = {'maintenance': float(state['maintenance']), 'logged_days': state['logged_days'],
+                 'trend_weight': None if state['trend_weight'] is None else float(state['trend_weight']),
+                 'last_day': state['last_day']}
+        first = state['last_day'] + timedelta(days=1)
+        _advance(state, _summaries(user_id, first, yesterday), first, yesterday)
+        _save(user_id, state)
+        user = _profile(user_id)
+        if user:
+            _apply_target(user_id, user, state)
+    except Exception as e:
+        print(f"TDEE update failed: {e}")
+
+
+def adaptive_maintenance(user_id):
+    """The stored estimate once it is trustworthy, else None."""
+    state = _load(user_id)
+    if state and state['logged_days'] >= MIN_LOGGED_DAYS:
+        return float(state['maintenance'])
+    return None
+
+
+def recompute_all(today=None):
+    """
+    Refits every user in one pass: one streamed read of daily_summaries in
+    (user_id, day) order and one batched write of the state rows.
+    """
+    yesterday = (today or queries.ist_today()) - timedelta(days=1)
+    users = {row['id']: SimpleNamespace(**row) for row in db.execute_query(
+        "SELECT id, age, height, weight, gender, activity_level, fitness_goal, adaptive_calories FROM users",
+        fetch_all=True
+    ) or []}
+    states = {user_id: _initial_state(user) for user_id, user in users.items()}
+
+    rows = db.stream(
+        """SELECT user_id, day, calories_in, meal_count, last_weight FROM daily_summaries
+           WHERE day <= %s ORDER BY user_id, day""",
+        (yesterday,)
+    )
+    for row in rows:
+        state = states.get(row['user_id'])
+        if state is None:
+            continue
+        first = state['last_day'] + timedelta(days=1) if state['last_day'] else row['day']
+        # Days between summary rows have nothing logged; fold them as empty.
+        if first < row['day']:
+            _advance(state, {}, first, row['day'] - timedelta(days=1))
+        _advance(state, {row['day']: row}, row['day'], row['day'])
+
+    for state in states.values():
+        if state['last_day'] is not None and state['last_day'] < yesterday:
+            _advance(state, {}, state['last_day'] + timedelta(days=1), yesterday)
+        state['last_day'] = state['last_day'] or yesterday
+
+    targets = [(daily_target(states[user_id]['maintenance'], user.fitness_goal), user_id)
+               for user_id, user in users.items()
+               if user.adaptive_calories and states[user_id]['logged_days'] >= MIN_LOGGED_DAYS]
+    with db.connection() as connection:
+        cursor = connection.cursor()
+        try:
+            if states:
+                cursor.executemany(
+                    """INSERT INTO tdee_state (user_id, maintenance, trend_weight, last_day, logged_days)
+                       VALUES (%s, %s, %s, %s, %s)
+                       ON DUPLICATE KEY UPDATE maintenance = VALUES(maintenance), trend_weight = VALUES(trend_weight),
+                           last_day = VALUES(last_day), logged_days = VALUES(logged_days)""",
+                    [(user_id, s['maintenance'], s['trend_weight'], s['last_day'], s['logged_days'])
+                     for user_id, s in states.items()]
+                )
+            if targets:
+                cursor.executemany("UPDATE users SET daily_calories = %s WHERE id = %s", targets)
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            cursor.close()
+    if targets:
+        user_cache.clear()
+    return len(states)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain adaptive TDEE estimates.")
+    parser.add_argument('command', choices=['recompute'])
+    parser.add_argument('--user', type=int, help="Only this user (default: everyone)")
+    args = parser.parse_args()
+
+    migrate()
+    if args.user:
+        state = recompute(args.user)
+        print(state if state else f"No user {args.user}.")
+    else:
+        print(f"Recomputed {recompute_all()} users.")
+
+
+if __name__ == '__main__':
+    main()
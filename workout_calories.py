@@ -0,0 +1,99 @@
+"""
+Local workout calorie estimates from a MET table.
+
+kcal = MET x intensity factor x body weight (kg) x duration (h)
+
+`estimate` parses a free-text description ("brisk walking 45 min") into an
+activity, duration and intensity and reports how confident the parse is;
+callers fall back to the AI only when confidence is low. `estimate_many`
+scores a batch of descriptions with one vectorised NumPy pass.
+"""
+import re
+
+import numpy as np
+
+# Compendium of Physical Activities values (moderate effort).
+MET_TABLE = {
+    'running': 9.8, 'jogging': 7.0, 'sprinting': 12.0, 'treadmill': 9.0,
+    'walking': 3.5, 'brisk walking': 4.3, 'hiking': 6.0, 'stair climbing': 8.8,
+    'cycling': 7.5, 'stationary bike': 6.8, 'spinning': 8.5,
+    'swimming': 8.0, 'rowing': 7.0, 'elliptical': 5.0, 'jump rope': 12.3,
+    'weight lifting': 5.0, 'strength training': 5.0, 'calisthenics': 3.8, 'push ups': 3.8,
+    'squats': 5.0, 'plank': 3.8, 'crossfit': 8.0, 'hiit': 8.0, 'circuit training': 8.0,
+    'aerobics': 6.5, 'zumba': 6.5, 'dancing': 5.0, 'boxing': 7.8, 'martial arts': 10.3,
+    'yoga': 2.5, 'pilates': 3.0, 'stretching': 2.3,
+    'basketball': 6.5, 'football': 7.0, 'cricket': 4.8, 'badminton': 5.5, 'tennis': 7.3,
+    'volleyball': 4.0, 'table tennis': 4.0,
+}
+
+# Other spellings -> MET_TABLE key. Longer phrases are matched first.
+ALIASES = {
+    'run': 'running', 'ran': 'running', 'jog': 'jogging', 'sprint': 'sprinting', 'sprints': 'sprinting',
+    'walk': 'walking', 'walked': 'walking', 'brisk walk': 'brisk walking', 'hike': 'hiking',
+    'stairs': 'stair climbing', 'stairmaster': 'stair climbing',
+    'cycle': 'cycling', 'bike': 'cycling', 'biking': 'cycling', 'bicycle': 'cycling', 'exercise bike': 'stationary bike',
+    'swim': 'swimming', 'swam': 'swimming', 'row': 'rowing', 'rower': 'rowing', 'skipping': 'jump rope',
+    'weights': 'weight lifting', 'weightlifting': 'weight lifting', 'lifting': 'weight lifting', 'gym': 'weight lifting',
+    'strength': 'strength training', 'resistance training': 'strength training', 'bodyweight': 'calisthenics',
+    'pushups': 'push ups', 'push-ups': 'push ups', 'squat': 'squats', 'planks': 'plank',
+    'circuit': 'circuit training', 'dance': 'dancing', 'kickboxing': 'boxing', 'karate': 'martial arts',
+    'soccer': 'football', 'ping pong': 'table tennis',
+}
+
+INTENSITY = {
+    'light': 0.8, 'easy': 0.8, 'slow': 0.8, 'gentle': 0.8, 'leisurely': 0.8,
+    'moderate': 1.0, 'steady': 1.0,
+    'brisk': 1.15, 'fast': 1.25, 'hard': 1.25, 'intense': 1.25, 'vigorous': 1.25, 'heavy': 1.2,
+}
+
+CONFIDENT = 0.7
+DEFAULT_WEIGHT_KG = 70.0
+
+_PHRASES = sorted(list(MET_TABLE) + list(ALIASES), key=len, reverse=True)
+_ACTIVITY = re.compile(r'\b(' + '|'.join(re.escape(p) for p in _PHRASES) + r')\b')
+_HOURS = re.compile(r'(\d+(?:\.\d+)?)\s*(?:hours?|hrs?|h)\b')
+_MINUTES = re.compile(r'(\d+(?:\.\d+)?)\s*(?:minutes?|mins?|m)\b')
+_WORD_DURATIONS = {'half an hour': 30, 'an hour': 60, 'one hour': 60, 'quarter of an hour': 15}
+
+
+def parse(description):
+    """Returns (met, intensity_factor, minutes, confidence) for one description."""
+    text = description.lower().replace('-', ' ')
+
+    activity = _ACTIVITY.search(text)
+    met = MET_TABLE[ALIASES.get(activity.group(1), activity.group(1))] if activity else 0.0
+
+    minutes = sum(float(h) * 60 for h in _HOURS.findall(text)) + sum(float(m) for m in _MINUTES.findall(text))
+    if not minutes:
+        minutes = next((value for phrase, value in _WORD_DURATIONS.items() if phrase in text), 0.0)
+
+    # Words inside the matched phrase ('brisk' in 'brisk walking') are already in its MET value.
+    rest = text[:activity.start()] + ' ' + text[activity.end():] if activity else text
+    factors = [INTENSITY[word] for word in re.findall(r'[a-z]+', rest) if word in INTENSITY]
+    intensity = max(factors) if factors else 1.0
+
+    if activity and minutes:
+        confidence = 1.0
+    elif activity:
+        confidence = 0.4
+    else:
+        confidence = 0.0
+    return met, intensity, minutes, confidence
+
+
+def estimate_many(descriptions, weight_kg=DEFAULT_WEIGHT_KG):
+    """
+    Vectorised estimate for a batch. `weight_kg` is a scalar or one weight per
+    description. Returns (calories ndarray, confidence ndarray).
+    """
+    parsed = np.array([parse(d) for d in descriptions], dtype=float).reshape(-1, 4)
+    met, intensity, minutes, confidence = parsed.T
+    weight = np.broadcast_to(np.asarray(weight_kg, dtype=float), met.shape)
+    calories = np.rint(met * intensity * weight * minutes / 60.0)
+    return calories, confidence
+
+
+def estimate(description, weight_kg=None):
+    """Returns {'calories_burned': int, 'confidence': float} for one description."""
+    calories, confidence = estimate_many([description], float(weight_kg or DEFAULT_WEIGHT_KG))
+    return {'calories_burned': int(calories[0]), 'confidence': float(confidence[0])}